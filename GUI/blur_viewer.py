@@ -1,38 +1,61 @@
 import os
-from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QProgressBar, QPushButton, QMessageBox, QComboBox
+import time
+import threading
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton, QMessageBox, \
+    QComboBox, QDoubleSpinBox, QListWidget, QListWidgetItem, QAbstractItemView
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from Utils.blur import BlurInspector
 from Utils.colors_handler import ColorHandler
 
 
+# Minimalny odstęp między aktualizacjami okna (w sekundach) - szybkie foldery nie zalewają pętli zdarzeń Qt
+UPDATE_INTERVAL = 0.1
+
+
 class BlurInspectorThread(QThread):
     progress = pyqtSignal(int)
     update_label = pyqtSignal(str)  # Sygnał do aktualizacji wyświetlanej nazwy zdjęcia
-    finished = pyqtSignal(list)
+    partial_result = pyqtSignal(list)  # Kolejne wyniki: lista par (nazwa pliku, prawdopodobieństwo rozmycia)
+    finished = pyqtSignal(dict)  # Prawdopodobieństwo rozmycia dla każdego zdjęcia (tylko po pełnej analizie)
 
     def __init__(self, directory):
         super().__init__()
         self.directory = directory
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        Przerywa analizę. Wątek kończy się po bieżącym zdjęciu, a zadania czekające w puli są anulowane.
+        """
+        self._cancel_event.set()
 
     def run(self):
         inspector = BlurInspector(self.directory)
-        image_files = [
-            f for f in os.listdir(self.directory)
-            if os.path.isfile(os.path.join(self.directory, f)) and
-               f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.arw', '.nef', '.cr2', '.dng', '.raw'))
-        ]
+        image_files = inspector.list_image_files()
 
         total_files = len(image_files)
-        for i, file_name in enumerate(image_files):
-            file_path = os.path.join(self.directory, file_name)
-            self.update_label.emit(file_name)
-            is_blurred = inspector.is_blurred(file_path)
-            if is_blurred:
-                inspector.blurred_images.append(file_name)
-            progress_value = int(((i + 1) / total_files) * 100)
-            self.progress.emit(progress_value)
-
-        self.finished.emit(inspector.blurred_images)
+        pending = []
+        last_update = time.monotonic()
+        for i, (file_name, probability) in enumerate(
+                inspector.iter_results(image_files, cancel_callback=self._cancel_event.is_set)):
+            inspector.scores[file_name] = probability
+            pending.append((file_name, probability))
+            now = time.monotonic()
+            if now - last_update >= UPDATE_INTERVAL:
+                last_update = now
+                self._emit_update(pending, file_name, i + 1, total_files)
+                pending = []
+
+        if self._cancel_event.is_set():
+            return
+        if pending:
+            self._emit_update(pending, pending[-1][0], total_files, total_files)
+        self.finished.emit(inspector.scores)
+
+    def _emit_update(self, results, file_name, done, total_files):
+        self.partial_result.emit(results)
+        self.update_label.emit(file_name)
+        self.progress.emit(int(done / total_files * 100))
 
 
 class BlurInspectorWindow(QDialog):
@@ -42,6 +65,7 @@ class BlurInspectorWindow(QDialog):
         self.setGeometry(100, 100, 400, 200)
         self.directory = directory
         self.color_handler = color_handler
+        self.scores = {}  # Wyniki otrzymane do tej pory
         self.initUI()
 
     def initUI(self):
@@ -56,8 +80,34 @@ class BlurInspectorWindow(QDialog):
         self.progress_bar = QProgressBar(self)
         layout.addWidget(self.progress_bar)
 
+        # Próg prawdopodobieństwa rozmycia - stosowany do gotowych wyników, bez ponownej analizy
+        threshold_layout = QHBoxLayout()
+        threshold_layout.addWidget(QLabel("Próg rozmycia:"))
+        self.threshold_spin = QDoubleSpinBox(self)
+        self.threshold_spin.setRange(0.0, 0.99)
+        self.threshold_spin.setSingleStep(0.05)
+        self.threshold_spin.setValue(0.5)
+        self.threshold_spin.valueChanged.connect(self.refresh_blurred_list)
+        threshold_layout.addWidget(self.threshold_spin)
+        layout.addLayout(threshold_layout)
+
+        # Nieostre zdjęcia pojawiają się na liście na bieżąco i można je oznaczać jeszcze w trakcie analizy
+        self.blurred_list = QListWidget(self)
+        self.blurred_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        layout.addWidget(self.blurred_list)
+
+        tag_layout = QHBoxLayout()
+        self.color_combo = QComboBox(self)
+        self.color_combo.addItems(["red", "green", "blue", "yellow", "purple"])
+        tag_layout.addWidget(self.color_combo)
+        tag_button = QPushButton("Oznacz zaznaczone", self)
+        tag_button.clicked.connect(self.tag_selected)
+        tag_layout.addWidget(tag_button)
+        layout.addLayout(tag_layout)
+
         self.thread = BlurInspectorThread(self.directory)
         self.thread.progress.connect(self.update_progress)
+        self.thread.partial_result.connect(self.add_results)
         self.thread.update_label.connect(self.update_image_label)  # Połącz sygnał z funkcją aktualizującą nazwę zdjęcia
         self.thread.finished.connect(self.analysis_finished)
         self.thread.start()
@@ -68,36 +118,41 @@ class BlurInspectorWindow(QDialog):
     def update_image_label(self, image_name):
         self.current_image_label.setText(f"Aktualnie analizowane zdjęcie: {image_name}")
 
-    def analysis_finished(self, blurred_images):
+    def add_results(self, results):
+        threshold = self.threshold_spin.value()
+        for file_name, probability in results:
+            self.scores[file_name] = probability
+            if probability > threshold:
+                self.add_blurred_item(file_name)
+
+    def add_blurred_item(self, file_name):
+        item = QListWidgetItem(f"{file_name} ({self.scores[file_name] * 100:.0f}%)")
+        item.setData(Qt.UserRole, file_name)
+        self.blurred_list.addItem(item)
+
+    def refresh_blurred_list(self):
+        self.blurred_list.clear()
+        threshold = self.threshold_spin.value()
+        for file_name, probability in self.scores.items():
+            if probability > threshold:
+                self.add_blurred_item(file_name)
+
+    def tag_selected(self):
+        color = self.color_combo.currentText()
+        for item in self.blurred_list.selectedItems():
+            self.color_handler.set_color(os.path.join(self.directory, item.data(Qt.UserRole)), color)
+            item.setText(f"{item.data(Qt.UserRole)} ({self.scores[item.data(Qt.UserRole)] * 100:.0f}%) - {color}")
+
+    def done(self, result):
+        # Zamknięcie okna (także klawiszem Esc) przerywa analizę i zwalnia procesor
+        self.thread.cancel()
+        self.thread.wait()
+        super().done(result)
+
+    def analysis_finished(self, scores):
         self.progress_bar.setValue(100)
-        if blurred_images:
-            blurred_list = "\n".join(blurred_images)
-            msg = f"Znaleziono nieostre zdjęcia:\n{blurred_list}\n\nCzy chcesz je oznaczyć kolorem?"
-            choice = QMessageBox.question(self, 'Oznaczenie kolorami', msg, QMessageBox.Yes | QMessageBox.No)
-
-            if choice == QMessageBox.Yes:
-                color_choice = self.choose_color()
-                if color_choice:
-                    for image in blurred_images:
-                        self.color_handler.set_color(os.path.join(self.directory, image), color_choice)
-        else:
+        if self.blurred_list.count() == 0:
             QMessageBox.information(self, "Wynik", "Nie znaleziono nieostrych zdjęć.")
-
-        self.close()
-
-    def choose_color(self):
-        dialog = QDialog(self)
-        dialog.setWindowTitle("Wybierz kolor")
-        dialog.setGeometry(100, 100, 200, 100)
-
-        layout = QVBoxLayout(dialog)
-        combo = QComboBox(dialog)
-        combo.addItems(["red", "green", "blue", "yellow", "purple"])
-        layout.addWidget(combo)
-
-        button = QPushButton("OK", dialog)
-        button.clicked.connect(dialog.accept)
-        layout.addWidget(button)
-
-        dialog.exec_()
-        return combo.currentText()
+            self.close()
+            return
+        self.current_image_label.setText(f"Analiza zakończona. Nieostre zdjęcia: {self.blurred_list.count()}")
@@ -1,8 +1,86 @@
 import os
+import threading
 from PyQt5.QtWidgets import QListView, QFileSystemModel
-from PyQt5.QtCore import QDir, QSortFilterProxyModel, Qt
+from PyQt5.QtCore import QDir, QSortFilterProxyModel, Qt, QThread, pyqtSignal
 from Utils.colors_handler import ColorHandler
-from Utils.exif_handler import extract_camera_model, extract_lens_model
+from Utils.library_index import LibraryIndex, scan_directory
+
+# Filtry EXIF okna przeglądania -> kolumny indeksu metadanych
+EXIF_FILTER_COLUMNS = {
+    "camera": "camera",
+    "lens": "lens",
+    "serial": "serial",
+    "iso": "iso",
+    "aperture": "aperture",
+    "exposure": "exposure",
+}
+
+# Sortowanie po kolumnach QFileSystemModel (nazwa, typ, data) i po metadanych z indeksu
+FILE_SORT_COLUMNS = {"name": 0, "type": 2, "date": 3}
+INDEX_SORT_COLUMNS = {"captured": "captured", "camera": "camera", "iso": "iso", "aperture": "aperture",
+                      "exposure": "exposure"}
+
+
+class LibraryScanThread(QThread):
+    finished = pyqtSignal(str)  # Folder, którego skanowanie się zakończyło
+
+    def __init__(self, index, directory):
+        super().__init__()
+        self.index = index
+        self.directory = directory
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            for _ in scan_directory(self.index, self.directory, cancel_callback=self._cancel_event.is_set):
+                pass
+        except OSError:
+            pass  # Folder zniknął albo nie ma do niego dostępu - filtr pokaże to, co jest w indeksie
+        if not self._cancel_event.is_set():
+            self.finished.emit(self.directory)
+
+
+class LibraryFilterProxyModel(QSortFilterProxyModel):
+    """
+    Filtruje i sortuje pliki folderu według wyniku jednego zapytania do indeksu metadanych,
+    więc filterAcceptsRow i lessThan nie otwierają plików.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root_path = None
+        self.accepted_paths = None  # None - bez filtra
+        self.sort_ranks = None  # {ścieżka: pozycja} przy sortowaniu po metadanych
+
+    def set_accepted_paths(self, paths):
+        self.accepted_paths = set(paths) if paths is not None else None
+        self.invalidateFilter()
+
+    def set_sort_order(self, paths):
+        self.sort_ranks = {path: rank for rank, path in enumerate(paths)} if paths is not None else None
+        self.invalidate()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.accepted_paths is None:
+            return True
+        model = self.sourceModel()
+        # Filtr dotyczy tylko plików wyświetlanego folderu, nie folderów nadrzędnych w modelu
+        if os.path.abspath(model.filePath(source_parent)) != self.root_path:
+            return True
+        return os.path.abspath(model.filePath(model.index(source_row, 0, source_parent))) in self.accepted_paths
+
+    def lessThan(self, left, right):
+        if self.sort_ranks is None:
+            return super().lessThan(left, right)
+        model = self.sourceModel()
+        # Pliki bez wpisu w indeksie trafiają na koniec
+        last = len(self.sort_ranks)
+        return (self.sort_ranks.get(os.path.abspath(model.filePath(left)), last) <
+                self.sort_ranks.get(os.path.abspath(model.filePath(right)), last))
+
 
 class BrowseWindow(QListView):
     def __init__(self, color_handler):
@@ -10,7 +88,7 @@ class BrowseWindow(QListView):
         self.color_handler = color_handler
         self.file_model = QFileSystemModel()
         self.file_model.setFilter(QDir.Files | QDir.NoDotAndDotDot)
-        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model = LibraryFilterProxyModel(self)
         self.proxy_model.setSourceModel(self.file_model)
         self.proxy_model.setFilterCaseSensitivity(False)
         self.proxy_model.setSortCaseSensitivity(False)
@@ -19,10 +97,37 @@ class BrowseWindow(QListView):
         self.current_filter_exif = None
         self.current_exif_value = None
         self.current_sort_criteria = "name"
+        self.root_path = None
+        self.library_index = LibraryIndex.shared()
+        self.scan_thread = None
 
     def setRootPath(self, path):
+        self.root_path = os.path.abspath(path)
+        self.proxy_model.root_path = self.root_path
         self.file_model.setRootPath(path)
         self.setRootIndex(self.proxy_model.mapFromSource(self.file_model.index(path)))
+        self.scan_library()
+        self.invalidate_filter()
+
+    def scan_library(self):
+        # Indeks folderu jest uzupełniany w tle; po zakończeniu filtr i sortowanie są odświeżane
+        self.stop_scan()
+        if self.library_index is None:
+            return
+        self.scan_thread = LibraryScanThread(self.library_index, self.root_path)
+        self.scan_thread.finished.connect(self.on_scan_finished)
+        self.scan_thread.start()
+
+    def stop_scan(self):
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
+            self.scan_thread.wait()
+            self.scan_thread = None
+
+    def on_scan_finished(self, directory):
+        if directory == self.root_path:
+            self.invalidate_filter()
+            self.sort_files()
 
     def set_filter_color(self, color):
         self.current_filter_color = color
@@ -38,40 +143,31 @@ class BrowseWindow(QListView):
         self.sort_files()
 
     def sort_files(self):
-        if self.current_sort_criteria == "name":
+        if self.current_sort_criteria in INDEX_SORT_COLUMNS and self.library_index is not None:
+            self.proxy_model.set_sort_order(self.library_index.query(
+                self.root_path, order_by=INDEX_SORT_COLUMNS[self.current_sort_criteria]))
             self.proxy_model.sort(0, Qt.AscendingOrder)
-        elif self.current_sort_criteria == "date":
-            self.proxy_model.sort(3, Qt.AscendingOrder)
-        elif self.current_sort_criteria == "type":
-            self.proxy_model.sort(2, Qt.AscendingOrder)
+        elif self.current_sort_criteria in FILE_SORT_COLUMNS:
+            self.proxy_model.set_sort_order(None)
+            self.proxy_model.sort(FILE_SORT_COLUMNS[self.current_sort_criteria], Qt.AscendingOrder)
 
     def invalidate_filter(self):
-        self.proxy_model.setFilterKeyColumn(-1)  # Ustawia filtrowanie na wszystkie kolumny
-        self.proxy_model.setFilterFixedString("")
-        self.proxy_model.invalidateFilter()
+        filters = {}
+        if self.current_filter_color:
+            # Kolory są zapisywane w colors.json folderu - przed zapytaniem przenosimy je do indeksu
+            self.color_handler.load_colors(self.root_path)
+            if self.library_index is not None:
+                self.library_index.set_colors(self.root_path, self.color_handler.colors)
+            filters["color"] = self.current_filter_color
+        if self.current_filter_exif in EXIF_FILTER_COLUMNS:
+            filters[EXIF_FILTER_COLUMNS[self.current_filter_exif]] = self.current_exif_value
 
-    def filterAcceptsRow(self, source_row, source_parent):
-        index = self.file_model.index(source_row, 0, source_parent)
-        file_path = self.file_model.filePath(index)
+        if not filters or self.root_path is None or self.library_index is None:
+            # Bez indeksu (np. katalog domowy tylko do odczytu) filtry nie działają
+            self.proxy_model.set_accepted_paths(None)
+        else:
+            self.proxy_model.set_accepted_paths(self.library_index.query(self.root_path, filters))
 
-        # Filtrowanie według koloru
-        if self.current_filter_color:
-            color = self.color_handler.get_color(file_path)
-            if color != self.current_filter_color:
-                return False
-
-        # Filtrowanie według danych EXIF
-        if self.current_filter_exif:
-            exif_data = self.get_exif_data(file_path)
-            if self.current_filter_exif == "camera" and exif_data.get('CameraModel') != self.current_exif_value:
-                return False
-            if self.current_filter_exif == "lens" and exif_data.get('LensModel') != self.current_exif_value:
-                return False
-
-        return True
-
-    def get_exif_data(self, file_path):
-        # Pseudo-funkcja, która zwraca dane EXIF (do zastąpienia przez prawdziwą analizę EXIF)
-        camera_model = extract_camera_model(file_path)
-        lens_model = extract_lens_model(file_path)
-        return {"CameraModel": camera_model, "LensModel": lens_model}
+    def closeEvent(self, event):
+        self.stop_scan()
+        super().closeEvent(event)
@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton, QMessageBox, \
+    QLineEdit, QSpinBox, QFileDialog
+from PyQt5.QtCore import QThread, pyqtSignal
+from Utils.export_handler import export_images, DEFAULT_QUALITY
+
+
+# Minimalny odstęp między aktualizacjami okna (w sekundach)
+UPDATE_INTERVAL = 0.1
+
+
+class ExportThread(QThread):
+    progress = pyqtSignal(int)
+    update_label = pyqtSignal(str)  # Sygnał do aktualizacji nazwy ostatnio wyeksportowanego zdjęcia
+    finished = pyqtSignal(list)  # Lista par (ścieżka, komunikat błędu) dla plików, których nie udało się wyeksportować
+
+    def __init__(self, image_paths, output_dir, max_size, quality):
+        super().__init__()
+        self.image_paths = image_paths
+        self.output_dir = output_dir
+        self.max_size = max_size
+        self.quality = quality
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        Przerywa eksport. Zadania czekające w puli są anulowane.
+        """
+        self._cancel_event.set()
+
+    def run(self):
+        total_files = len(self.image_paths)
+        errors = []
+        last_update = time.monotonic()
+        try:
+            results = export_images(self.image_paths, self.output_dir, self.max_size, self.quality,
+                                    cancel_callback=self._cancel_event.is_set)
+            for i, (path, _, error) in enumerate(results):
+                if error is not None:
+                    errors.append((path, error))
+                now = time.monotonic()
+                if now - last_update >= UPDATE_INTERVAL or i + 1 == total_files:
+                    last_update = now
+                    self.update_label.emit(os.path.basename(path))
+                    self.progress.emit(int((i + 1) / total_files * 100))
+        except (OSError, ValueError) as e:
+            errors.append((self.output_dir, str(e)))
+
+        if not self._cancel_event.is_set():
+            self.finished.emit(errors)
+
+
+class ExportWindow(QDialog):
+    """
+    Okno eksportu zdjęć do JPEG w osobnym folderze: zmniejszanie, wywoływanie RAW i ponowne kodowanie.
+    Oryginały pozostają bez zmian.
+    """
+
+    def __init__(self, image_paths, parent=None):
+        """
+        :param image_paths: Lista ścieżek do eksportowanych zdjęć.
+        :param parent: Okno nadrzędne.
+        """
+        super().__init__(parent)
+        self.setWindowTitle("Eksport zdjęć")
+        self.setGeometry(100, 100, 500, 200)
+        self.image_paths = image_paths
+        self.thread = None
+        self.initUI()
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+
+        layout.addWidget(QLabel(f"Liczba zdjęć do eksportu: {len(self.image_paths)}"))
+
+        output_layout = QHBoxLayout()
+        output_layout.addWidget(QLabel("Folder wynikowy:"))
+        source_dir = os.path.dirname(self.image_paths[0]) if self.image_paths else ""
+        self.output_edit = QLineEdit(os.path.join(source_dir, "export"))
+        output_layout.addWidget(self.output_edit)
+        browse_button = QPushButton("Wybierz...")
+        browse_button.clicked.connect(self.choose_output_dir)
+        output_layout.addWidget(browse_button)
+        layout.addLayout(output_layout)
+
+        # Wymiary 0 oznaczają pełną rozdzielczość
+        size_layout = QHBoxLayout()
+        size_layout.addWidget(QLabel("Maksymalny rozmiar (0 - bez zmian):"))
+        self.width_spin = QSpinBox()
+        self.width_spin.setRange(0, 20000)
+        self.width_spin.setValue(2048)
+        size_layout.addWidget(self.width_spin)
+        size_layout.addWidget(QLabel("x"))
+        self.height_spin = QSpinBox()
+        self.height_spin.setRange(0, 20000)
+        self.height_spin.setValue(2048)
+        size_layout.addWidget(self.height_spin)
+        layout.addLayout(size_layout)
+
+        quality_layout = QHBoxLayout()
+        quality_layout.addWidget(QLabel("Jakość JPEG:"))
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(1, 100)
+        self.quality_spin.setValue(DEFAULT_QUALITY)
+        quality_layout.addWidget(self.quality_spin)
+        layout.addLayout(quality_layout)
+
+        self.current_image_label = QLabel("")
+        layout.addWidget(self.current_image_label)
+
+        self.progress_bar = QProgressBar(self)
+        layout.addWidget(self.progress_bar)
+
+        button_layout = QHBoxLayout()
+        self.start_button = QPushButton("Eksportuj")
+        self.start_button.clicked.connect(self.start_export)
+        button_layout.addWidget(self.start_button)
+        self.cancel_button = QPushButton("Anuluj")
+        self.cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+
+    def choose_output_dir(self):
+        directory = QFileDialog.getExistingDirectory(self, "Wybierz folder wynikowy", self.output_edit.text())
+        if directory:
+            self.output_edit.setText(directory)
+
+    def start_export(self):
+        if not self.image_paths:
+            return
+        width, height = self.width_spin.value(), self.height_spin.value()
+        max_size = (width or 100000, height or 100000) if width or height else None
+
+        self.start_button.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.thread = ExportThread(self.image_paths, self.output_edit.text(), max_size, self.quality_spin.value())
+        self.thread.progress.connect(self.progress_bar.setValue)
+        self.thread.update_label.connect(self.update_image_label)
+        self.thread.finished.connect(self.export_finished)
+        self.thread.start()
+
+    def update_image_label(self, image_name):
+        self.current_image_label.setText(f"Wyeksportowano: {image_name}")
+
+    def done(self, result):
+        # Zamknięcie okna (także klawiszem Esc) przerywa eksport
+        if self.thread is not None:
+            self.thread.cancel()
+            self.thread.wait()
+        super().done(result)
+
+    def export_finished(self, errors):
+        self.start_button.setEnabled(True)
+        if errors:
+            details = "\n".join(f"{os.path.basename(path)}: {error}" for path, error in errors[:10])
+            QMessageBox.warning(self, "Eksport", f"Nie udało się wyeksportować {len(errors)} plik(ów):\n{details}")
+        else:
+            QMessageBox.information(self, "Eksport", f"Wyeksportowano zdjęcia do folderu {self.output_edit.text()}.")
+        self.current_image_label.setText("Eksport zakończony.")
@@ -2,19 +2,96 @@ import os
 import sys
 import traceback
 import json
+import numpy as np
+from functools import partial
 from PyQt5.QtWidgets import QMainWindow, QGraphicsView, QGraphicsScene, QVBoxLayout, QWidget, QPushButton, QHBoxLayout, \
     QComboBox, QAction, QDockWidget, QTableWidget, QTableWidgetItem, QApplication
-from PyQt5.QtGui import QPixmap, QImage, QColor
-from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QPixmap, QColor, QPen, QTransform
+from PyQt5.QtCore import Qt, QRectF, QTimer
 from PIL import Image
-from Utils.image_handler import rotate_image, resize_image, get_image_with_orientation
+from Utils.image_handler import load_preview, load_fitted, to_qimage, orientation_transform, \
+    is_transposed, RAW_PREVIEW, RAW_FAST, RAW_FULL
+from Utils.image_formats import is_raw_file, image_extensions
+from Utils.image_cache import ImageCache, DEFAULT_MAX_BYTES
 from Utils.exif_handler import get_exif_data
 from Utils.colors_handler import ColorHandler
+from Utils.blur import sharpness_map
 from GUI.exif_viewer import create_exif_table
+from GUI.tiled_image_item import TiledImageItem
+from GUI.export_viewer import ExportWindow
+
+
+# Liczba zdjęć wczytywanych z wyprzedzeniem w kierunku przeglądania
+PREFETCH_AHEAD = 3
+
+# Najmniejszy rozmiar szybkiego podglądu wyświetlanego przed pełnym zdjęciem
+PREVIEW_SIZE = (800, 600)
+
+# Po tylu milisekundach bez zmiany zdjęcia podgląd jest zastępowany obrazem w rozdzielczości ekranu
+SCREEN_QUALITY_DELAY_MS = 300
+
+# Limit pamięci na szybkie podglądy (w bajtach)
+PREVIEW_CACHE_MAX_BYTES = 128 * 2 ** 20
+
+# Limit pamięci na zdjęcia w pełnej rozdzielczości, wczytywane tylko do powiększeń (w bajtach).
+# Większe zdjęcie nie jest odrzucane - zostaje w pamięci podręcznej samo (patrz ImageCache)
+FULL_CACHE_MAX_BYTES = 512 * 2 ** 20
+
+# Górna granica pamięci na obraz do powiększeń razem z piramidą kafelków (w bajtach). Zdjęcia,
+# które w pełnej rozdzielczości by jej nie zmieściły (np. panoramy gigapikselowe), są dekodowane
+# zmniejszone dwu-, cztero- lub więcej krotnie
+DETAIL_MAX_BYTES = 2 ** 30
+
+# Szacunek pamięci na piksel obrazu do powiększeń: 3 bajty RGB i ok. 1/3 tego na poziomy piramidy
+DETAIL_BYTES_PER_PIXEL = 4
+
+# Limit pamięci na mapy ostrości kafelków (każda to kilkaset bajtów)
+SHARPNESS_CACHE_MAX_BYTES = 2 ** 20
+
+# Poziomy szczegółowości wyświetlanego obrazu (HALF - zmniejszony obraz do powiększeń, np. szybkie wywołanie RAW)
+PREVIEW, SCREEN, HALF, FULL = range(4)
+
+
+def load_display_image(image_path, max_size=None, raw_tier=RAW_FULL):
+    """
+    Wczytuje zdjęcie jako gotowy do wyświetlenia QImage, w orientacji aparatu - orientację EXIF
+    uwzględnia dopiero widok. Funkcja może działać poza wątkiem GUI.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :param max_size: Rozmiar, w którym ma się zmieścić zdjęcie (np. rozmiar ekranu); None - pełna rozdzielczość.
+    :param raw_tier: Jakość wywołania plików RAW.
+    :return: Krotka (QImage, rozmiar pełnego zdjęcia przed obrotem, orientacja EXIF).
+    """
+    image, full_size, orientation = load_fitted(image_path, max_size, raw_tier)
+    return to_qimage(image), full_size, orientation
+
+
+def load_detail_image(key):
+    # Klucz pamięci podręcznej szczegółów: (ścieżka, jakość wywołania RAW, rozmiar po obrocie lub None)
+    image_path, raw_tier, max_size = key
+    return load_display_image(image_path, max_size, raw_tier)
+
+
+def load_display_preview(image_path):
+    """
+    Wczytuje szybki podgląd zdjęcia (zmniejszony JPEG lub osadzony podgląd RAW).
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :return: Krotka (QImage podglądu, rozmiar pełnego zdjęcia przed obrotem, orientacja EXIF)
+             lub None, jeśli format nie ma taniego podglądu.
+    """
+    image, full_size, orientation = load_preview(image_path, PREVIEW_SIZE)
+    if image is None:
+        return None
+    return to_qimage(image), full_size, orientation
+
+
+def image_bytes(entry):
+    return entry[0].sizeInBytes()
 
 
 class ImageViewer(QMainWindow):
-    def __init__(self, image_path, color_handler):
+    def __init__(self, image_path, color_handler, cache_max_bytes=DEFAULT_MAX_BYTES):
         super().__init__()
         self.setWindowTitle('Image Viewer')
         self.setGeometry(100, 100, 800, 600)
@@ -27,15 +104,46 @@ class ImageViewer(QMainWindow):
         self.show_exif = False
         self.color_handler = color_handler
         self.color_buttons = {}
+        self.show_sharpness = False
+        self.sharpness_map = None  # Mapa ostrości kafelków bieżącego zdjęcia (liczona w tle przy pierwszym pokazaniu)
+        self.rotation = 0  # Liczba obrotów o 90 stopni wykonanych przyciskiem Rotate (obraca widok, nie piksele)
+        self.orientation = None  # Orientacja EXIF bieżącego zdjęcia, uwzględniana przez przekształcenie elementów
+        self.direction = 1  # Kierunek przeglądania (1 - do przodu, -1 - do tyłu)
+        # Zdjęcia są dekodowane w rozdzielczości ekranu; pełna rozdzielczość tylko przy powiększeniu
+        screen = QApplication.primaryScreen()
+        ratio = screen.devicePixelRatio()
+        self.display_size = (int(screen.size().width() * ratio), int(screen.size().height() * ratio))
+        # Zdekodowane zdjęcia (bieżące i wczytane z wyprzedzeniem), z limitem pamięci
+        # Na ekranie wystarcza osadzony podgląd RAW (lub szybkie wywołanie, gdy go brak)
+        self.image_cache = ImageCache(partial(load_display_image, max_size=self.display_size, raw_tier=RAW_PREVIEW),
+                                      image_bytes, cache_max_bytes)
+        self.preview_cache = ImageCache(load_display_preview, image_bytes, PREVIEW_CACHE_MAX_BYTES, workers=1)
+        self.full_cache = ImageCache(load_detail_image, image_bytes, FULL_CACHE_MAX_BYTES, workers=1)
+        # Mapa ostrości wymaga dekodowania zdjęcia, więc też jest liczona w tle
+        self.sharpness_cache = ImageCache(sharpness_map, lambda tiles: tiles.nbytes, SHARPNESS_CACHE_MAX_BYTES,
+                                          workers=1)
+        self.image_level = None  # Szczegółowość wyświetlanego obrazu (PREVIEW, SCREEN, HALF lub FULL)
+        self.detail_key = None  # Klucz obrazu wczytywanego w tle do powiększenia
+        self.detail_timer = QTimer(self)
+        self.detail_timer.setSingleShot(True)
+        self.detail_timer.timeout.connect(self.show_detail)
+        self.pixmap_item = None
+        self.tiled_item = None  # Kafelki pełnej rozdzielczości nad obrazem w rozdzielczości ekranu
+        self.full_size = None  # Rozmiar zdjęcia w pełnej rozdzielczości, w orientacji aparatu
+        self.scene_size = None  # Rozmiar zdjęcia w pełnej rozdzielczości po obrocie EXIF (współrzędne sceny)
+        self.screen_quality_timer = QTimer(self)
+        self.screen_quality_timer.setSingleShot(True)
+        self.screen_quality_timer.timeout.connect(self.show_screen_quality)
+        self.sharpness_timer = QTimer(self)
+        self.sharpness_timer.setSingleShot(True)
+        self.sharpness_timer.timeout.connect(self.show_sharpness_map)
 
         self.initUI()
         self.showMaximized()
         self.load_image()
 
     def get_image_files(self):
-        supported_extensions = (
-        '.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff', '.arw', '.nef', '.cr2', '.dng', '.raw')
-        return [f for f in os.listdir(self.image_folder) if f.lower().endswith(supported_extensions)]
+        return [f for f in os.listdir(self.image_folder) if f.lower().endswith(image_extensions())]
 
     def initUI(self):
         central_widget = QWidget()
@@ -61,14 +169,18 @@ class ImageViewer(QMainWindow):
         rotate_button.clicked.connect(self.rotate_image)
         button_layout.addWidget(rotate_button)
 
-        resize_button = QPushButton('Resize')
-        resize_button.clicked.connect(self.resize_image)
-        button_layout.addWidget(resize_button)
+        export_button = QPushButton('Export')
+        export_button.clicked.connect(self.export_image)
+        button_layout.addWidget(export_button)
 
         exif_button = QPushButton('Show EXIF Data')
         exif_button.clicked.connect(self.toggle_exif_data)
         button_layout.addWidget(exif_button)
 
+        sharpness_button = QPushButton('Sharpness Map')
+        sharpness_button.clicked.connect(self.toggle_sharpness_map)
+        button_layout.addWidget(sharpness_button)
+
         self.zoom_combo = QComboBox()
         self.zoom_combo.addItems(["50%", "100%", "150%", "200%", "Fit to Screen"])
         self.zoom_combo.currentIndexChanged.connect(self.zoom_image)
@@ -101,15 +213,31 @@ class ImageViewer(QMainWindow):
 
     def load_image(self):
         try:
-            self.current_image = get_image_with_orientation(self.image_path)
-            if self.current_image:
-                if self.current_image.mode != 'RGBA':
-                    self.current_image = self.current_image.convert('RGBA')
-                data = self.current_image.tobytes("raw", "RGBA")
-                q_image = QImage(data, self.current_image.width, self.current_image.height, QImage.Format_RGBA8888)
-                self.display_image(q_image)
+            self.sharpness_map = None
+            self.rotation = 0
+            self.screen_quality_timer.stop()
+            self.detail_timer.stop()
+            self.sharpness_timer.stop()
+            self.detail_key = None
+            # Zdjęcie w rozdzielczości ekranu jest dekodowane w tle, a w tym czasie wyświetlany jest szybki podgląd
+            self.prefetch_neighbours()
+            entry, level = self.image_cache.peek(self.image_path), SCREEN
+            if entry is None:
+                entry, level = self.preview_cache.get(self.image_path), PREVIEW
+            if entry is None:
+                entry, level = self.image_cache.get(self.image_path), SCREEN
+
+            if entry is not None:
+                self.current_image, self.full_size, self.orientation = entry
+                self.image_level = FULL if self.current_image.width() == self.full_size[0] else level
+                self.display_image(self.current_image)
+                if self.image_level == PREVIEW:
+                    self.screen_quality_timer.start(SCREEN_QUALITY_DELAY_MS)
             else:
+                self.current_image = None
+                self.release_tiles()
                 self.scene.clear()
+                self.pixmap_item = None
                 self.scene.addText("Unable to load image")
 
             if self.show_exif:
@@ -121,51 +249,193 @@ class ImageViewer(QMainWindow):
             traceback.print_exc()
 
     def display_image(self, q_image):
+        """
+        Wyświetla zdjęcie dopasowane do okna.
+
+        Scena ma rozmiar pełnego zdjęcia po obrocie EXIF. Obraz (pełny lub podgląd) jest do niej
+        dopasowywany przekształceniem elementu, więc po podmianie na dokładniejszy obraz powiększenie
+        i mapa ostrości się zgadzają, a orientacja nie wymaga kopiowania pikseli.
+
+        :param q_image: Obraz do wyświetlenia, w orientacji aparatu.
+        """
         try:
-            pixmap = QPixmap.fromImage(q_image)
+            self.release_tiles()
             self.scene.clear()
-            self.scene.addPixmap(pixmap)
+            full_width, full_height = self.full_size
+            if is_transposed(self.orientation):
+                self.scene_size = (full_height, full_width)
+            else:
+                self.scene_size = (full_width, full_height)
+            image_width, image_height = self.scene_size
+            if self.image_level >= HALF and self.exceeds_display(q_image):
+                # Duże zdjęcie w pełnej rozdzielczości: pod kafelkami leży jego zmniejszona kopia
+                self.add_tiled_item(q_image)
+                q_image = q_image.scaled(self.display_size[0], self.display_size[1], Qt.KeepAspectRatio)
+            self.pixmap_item = self.scene.addPixmap(QPixmap.fromImage(q_image))
+            self.pixmap_item.setTransformationMode(Qt.SmoothTransformation)
+            self.place_image_item(self.pixmap_item, q_image.width())
+            if self.show_sharpness:
+                self.draw_sharpness_map(image_width, image_height)
+
+            self.view.setSceneRect(QRectF(0, 0, image_width, image_height))
+            self.fit_view()
+        except Exception as e:
+            print(f"Error in display_image: {e}")
+            traceback.print.exc()
 
-            self.view.resetTransform()
-            self.view.setSceneRect(QRectF(pixmap.rect()))
+    def place_image_item(self, item, image_width):
+        """
+        Rozciąga element z obrazem do rozmiaru pełnego zdjęcia i obraca go zgodnie z orientacją EXIF.
+
+        :param item: Element sceny z obrazem w orientacji aparatu.
+        :param image_width: Szerokość obrazu w elemencie.
+        """
+        scale = self.full_size[0] / image_width
+        item.setTransform(QTransform.fromScale(scale, scale) * orientation_transform(self.orientation, *self.full_size))
+
+    def fit_view(self):
+        """
+        Dopasowuje widok do okna, z uwzględnieniem obrotu przyciskiem Rotate.
+        """
+        image_width, image_height = self.scene_size
+        if self.rotation % 2:
+            image_width, image_height = image_height, image_width
+
+        screen_size = self.view.viewport().size()
+        screen_width = screen_size.width()
+        screen_height = screen_size.height()
+
+        if image_width > screen_width or image_height > screen_height:
+            self.scale_factor = min(screen_width / image_width, screen_height / image_height)
+        else:
+            self.scale_factor = 1.0
 
-            screen_size = self.view.viewport().size()
-            screen_width = screen_size.width()
-            screen_height = screen_size.height()
-            image_width = q_image.width()
-            image_height = q_image.height()
+        self.set_view_scale(self.scale_factor)
+        self.view.centerOn(self.scene.sceneRect().center())
 
-            if image_width > screen_width or image_height > screen_height:
-                self.scale_factor = min(screen_width / image_width, screen_height / image_height)
-            else:
-                self.scale_factor = 1.0
+    def set_view_scale(self, scale):
+        # Obrót przyciskiem Rotate (przeciwnie do ruchu wskazówek zegara) jest częścią przekształcenia widoku
+        self.view.setTransform(QTransform().rotate(-90 * self.rotation).scale(scale, scale))
 
-            if self.scale_factor != 1.0:
-                self.view.scale(self.scale_factor, self.scale_factor)
+    def show_screen_quality(self):
+        """
+        Zastępuje podgląd zdjęciem w rozdzielczości ekranu, gdy tylko zostanie zdekodowane w tle.
+        """
+        try:
+            if self.image_level != PREVIEW:
+                return
+            entry = self.image_cache.peek(self.image_path)
+            if entry is None:
+                if self.image_cache.is_pending(self.image_path):
+                    self.screen_quality_timer.start(50)
+                    return
+                entry = self.image_cache.get(self.image_path)
+            self.replace_image(entry, SCREEN)
+        except Exception as e:
+            print(f"Error loading screen quality image: {e}")
+            traceback.print_exc()
 
-            self.view.centerOn(self.scene.itemsBoundingRect().center())
+    def request_detail(self, zoom):
+        """
+        Zleca wczytanie w tle obrazu w rozdzielczości potrzebnej dla powiększenia. Do czasu jego
+        podmiany widoczny jest obraz mniej dokładny.
+
+        Przy powiększeniu do 50% wystarcza obraz w połowie rozdzielczości: pliki RAW są wywoływane
+        szybko, a JPEG dekodowany od razu w zmniejszonej skali. Zdjęcie, które w pełnej rozdzielczości
+        przekroczyłoby DETAIL_MAX_BYTES, jest zmniejszane dalej - pamięć pozostaje ograniczona kosztem
+        ostrości przy największych powiększeniach. Wywołania RAW są zapamiętywane na dysku.
+
+        :param zoom: Docelowe powiększenie.
+        """
+        if self.pixmap_item is None:
+            return
+        reduction = 2 if zoom <= 0.5 else 1
+        width, height = self.scene_size
+        while (width // reduction) * (height // reduction) * DETAIL_BYTES_PER_PIXEL > DETAIL_MAX_BYTES:
+            reduction *= 2
+        raw_tier = RAW_FAST if reduction > 1 and is_raw_file(self.image_path) else RAW_FULL
+        max_size = (max(1, width // reduction), max(1, height // reduction)) if reduction > 1 else None
+        self.detail_key = (self.image_path, raw_tier, max_size)
+        self.full_cache.prefetch([self.detail_key])
+        self.show_detail()
+
+    def show_detail(self):
+        try:
+            if self.detail_key is None or self.detail_key[0] != self.image_path:
+                return
+            entry = self.full_cache.peek(self.detail_key)
+            if entry is None:
+                if self.full_cache.is_pending(self.detail_key):
+                    self.detail_timer.start(50)
+                return
+            reduced = self.detail_key[1] == RAW_FAST or self.detail_key[2] is not None
+            self.replace_image(entry, HALF if reduced else FULL)
         except Exception as e:
-            print(f"Error in display_image: {e}")
-            traceback.print.exc()
+            print(f"Error loading full resolution image: {e}")
+            traceback.print_exc()
+
+    def replace_image(self, entry, level):
+        """
+        Podmienia wyświetlany obraz na dokładniejszy, zachowując powiększenie i położenie widoku.
+
+        :param entry: Krotka (QImage, rozmiar pełnego zdjęcia).
+        :param level: Szczegółowość nowego obrazu.
+        """
+        if entry is None:
+            return
+        image, full_size, _ = entry
+        if image.width() == full_size[0]:
+            level = FULL
+        if level <= self.image_level:
+            return
+
+        self.current_image = image
+        self.image_level = level
+        if level >= HALF and self.exceeds_display(image):
+            # Obraz w rozdzielczości ekranu zostaje pod kafelkami, dopóki nie zostaną przygotowane
+            self.add_tiled_item(image)
+        else:
+            self.pixmap_item.setPixmap(QPixmap.fromImage(image))
+            self.place_image_item(self.pixmap_item, image.width())
+
+    def exceeds_display(self, q_image):
+        width, height = q_image.width(), q_image.height()
+        if is_transposed(self.orientation):
+            width, height = height, width
+        return width > self.display_size[0] or height > self.display_size[1]
+
+    def add_tiled_item(self, q_image):
+        self.release_tiles()
+        self.tiled_item = TiledImageItem(q_image)
+        self.tiled_item.setZValue(1)
+        self.place_image_item(self.tiled_item, q_image.width())
+        self.scene.addItem(self.tiled_item)
+
+    def release_tiles(self):
+        if self.tiled_item is not None:
+            self.tiled_item.release()
+            self.scene.removeItem(self.tiled_item)
+            self.tiled_item = None
 
     def rotate_image(self):
         try:
-            if self.current_image:
-                self.current_image = rotate_image(self.current_image, 90)
-                data = self.current_image.tobytes("raw", "RGBA")
-                q_image = QImage(data, self.current_image.width, self.current_image.height, QImage.Format_RGBA8888)
-                self.display_image(q_image)
+            if self.current_image is not None:
+                # Obrót o 90 stopni przeciwnie do ruchu wskazówek zegara obraca tylko widok - piksele, kafelki
+                # i mapa ostrości pozostają bez zmian
+                self.rotation = (self.rotation + 1) % 4
+                self.fit_view()
         except Exception as e:
             print(f"Error rotating image: {e}")
             traceback.print.exc()
 
-    def resize_image(self):
+    def export_image(self):
+        # Zmniejszona kopia trafia do osobnego folderu - oryginał i pamięć podręczna pozostają bez zmian
         try:
-            resize_image(self.image_path, (800, 600))
-            self.load_image()
+            export_window = ExportWindow([self.image_path], self)
+            export_window.exec_()
         except Exception as e:
-            print(f"Error resizing image: {e}")
-            traceback.print.exc()
+            print(f"Error exporting image: {e}")
+            traceback.print_exc()
 
     def show_exif_data(self):
         try:
@@ -195,10 +465,68 @@ class ImageViewer(QMainWindow):
         else:
             self.exif_dock.hide()
 
+    def toggle_sharpness_map(self):
+        self.show_sharpness = not self.show_sharpness
+        if self.current_image is not None:
+            self.display_image(self.current_image)
+
+    def draw_sharpness_map(self, width, height):
+        """
+        Nakłada na zdjęcie półprzezroczystą mapę ostrości: zielone kafelki są ostre, czerwone rozmyte.
+        Jeśli mapa nie jest jeszcze gotowa, zleca jej wyznaczenie w tle - zostanie narysowana po wczytaniu.
+
+        :param width: Szerokość sceny (zdjęcie po obrocie EXIF).
+        :param height: Wysokość sceny (zdjęcie po obrocie EXIF).
+        """
+        try:
+            if self.sharpness_map is None:
+                self.sharpness_map = self.sharpness_cache.peek(self.image_path)
+            if self.sharpness_map is None:
+                self.sharpness_cache.prefetch([self.image_path])
+                self.sharpness_timer.start(50)
+                return
+
+            # Mapa jest liczona po obrocie EXIF, tak jak scena; obrót przyciskiem Rotate wykonuje widok
+            tiles = self.sharpness_map
+            levels = np.log1p(tiles)
+            span = levels.max() - levels.min()
+            levels = (levels - levels.min()) / span if span > 0 else np.ones_like(levels)
+
+            rows, cols = tiles.shape
+            tile_width = width / cols
+            tile_height = height / rows
+            for row in range(rows):
+                for col in range(cols):
+                    level = levels[row, col]
+                    color = QColor(int(255 * (1 - level)), int(255 * level), 0, 90)
+                    rect = self.scene.addRect(QRectF(col * tile_width, row * tile_height, tile_width, tile_height),
+                                              QPen(Qt.NoPen), color)
+                    rect.setZValue(2)
+        except Exception as e:
+            print(f"Error drawing sharpness map: {e}")
+            traceback.print_exc()
+
+    def show_sharpness_map(self):
+        try:
+            if not self.show_sharpness or self.scene_size is None:
+                return
+            tiles = self.sharpness_cache.peek(self.image_path)
+            if tiles is None:
+                # Po nieudanym wyznaczeniu mapy zadanie znika z kolejki - wtedy przestajemy czekać
+                if self.sharpness_cache.is_pending(self.image_path):
+                    self.sharpness_timer.start(50)
+                return
+            self.sharpness_map = tiles
+            self.draw_sharpness_map(*self.scene_size)
+        except Exception as e:
+            print(f"Error loading sharpness map: {e}")
+            traceback.print_exc()
+
     def show_prev_image(self):
         try:
             if self.current_index > 0:
                 self.current_index -= 1
+                self.direction = -1
                 self.image_path = os.path.join(self.image_folder, self.image_files[self.current_index])
                 self.load_image()
         except Exception as e:
@@ -209,12 +537,22 @@ class ImageViewer(QMainWindow):
         try:
             if self.current_index < len(self.image_files) - 1:
                 self.current_index += 1
+                self.direction = 1
                 self.image_path = os.path.join(self.image_folder, self.image_files[self.current_index])
                 self.load_image()
         except Exception as e:
             print(f"Error showing next image: {e}")
             traceback.print_exc()
 
+    def prefetch_neighbours(self):
+        """
+        Zleca wczytanie w tle bieżącego zdjęcia, kolejnych zdjęć w kierunku przeglądania i jednego zdjęcia za bieżącym.
+        """
+        indexes = [self.current_index + self.direction * step for step in range(PREFETCH_AHEAD + 1)]
+        indexes.append(self.current_index - self.direction)
+        self.image_cache.prefetch([os.path.join(self.image_folder, self.image_files[i])
+                                   for i in indexes if 0 <= i < len(self.image_files)])
+
     def zoom_image(self, index):
         try:
             zoom_levels = {
@@ -225,11 +563,15 @@ class ImageViewer(QMainWindow):
                 4: "fit"
             }
             zoom = zoom_levels[index]
-            self.view.resetTransform()
+            if zoom != "fit" and self.current_image is not None and \
+                    self.current_image.width() < min(zoom, 1.0) * self.full_size[0]:
+                # Obraz w rozdzielczości ekranu jest za mały dla tego powiększenia
+                self.request_detail(zoom)
+            self.set_view_scale(1.0)
             if zoom == "fit":
-                self.view.fitInView(self.scene.itemsBoundingRect(), Qt.KeepAspectRatio)
+                self.view.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
             else:
-                self.view.scale(zoom, zoom)
+                self.set_view_scale(zoom)
         except Exception as e:
             print(f"Error in zoom_image: {e}")
             traceback.print.exc()
@@ -259,6 +601,15 @@ class ImageViewer(QMainWindow):
             self.color_buttons[color].setStyleSheet(
                 f"background-color: {color}; border: 3px solid black; width: 30px; height: 30px;")
 
+    def closeEvent(self, event):
+        self.screen_quality_timer.stop()
+        self.detail_timer.stop()
+        self.sharpness_timer.stop()
+        self.release_tiles()
+        for cache in (self.image_cache, self.preview_cache, self.full_cache, self.sharpness_cache):
+            cache.shutdown()
+        super().closeEvent(event)
+
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Right:
             self.show_next_image()
@@ -282,6 +633,8 @@ class ImageViewer(QMainWindow):
             self.close()
         elif event.key() == Qt.Key_P:
             self.toggle_exif_data()
+        elif event.key() == Qt.Key_S:
+            self.toggle_sharpness_map()
         else:
             super().keyPressEvent(event)
 
@@ -4,10 +4,14 @@ import shutil
 import json
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTreeView, QFileSystemModel, QVBoxLayout, QWidget, QLabel, \
     QSplitter, QListView, QHBoxLayout, QPushButton, QComboBox, QMessageBox
-from PyQt5.QtCore import Qt, QDir, QSortFilterProxyModel
+from PyQt5.QtCore import Qt, QDir, QSortFilterProxyModel, QSize, QPoint, QTimer
 from GUI.image_viewer import ImageViewer
 from GUI.file_continuity_viewer import FileContinuityCheckerWindow
 from GUI.blur_viewer import BlurInspectorWindow
+from GUI.export_viewer import ExportWindow
+from GUI.thumbnail_loader import ThumbnailLoader, THUMBNAIL_SIZE, THUMBNAIL_EXTENSIONS
+from Utils.export_handler import EXPORT_EXTENSIONS
+from Utils.image_formats import image_extensions
 from Utils.colors_handler import ColorHandler, ColorDelegate
 
 
@@ -16,6 +20,15 @@ class ColorSortProxyModel(QSortFilterProxyModel):
         super(ColorSortProxyModel, self).__init__(*args, **kwargs)
         self.color_handler = color_handler
         self.color_filter = None
+        self.thumbnail_loader = None  # Ustawiany w trybie siatki miniatur
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DecorationRole and self.thumbnail_loader is not None:
+            file_path = self.sourceModel().filePath(self.mapToSource(index))
+            if file_path.lower().endswith(THUMBNAIL_EXTENSIONS):
+                # Dopóki miniatura nie jest gotowa, widoczne jest puste pole
+                return self.thumbnail_loader.pixmap(file_path) or self.thumbnail_loader.placeholder
+        return super().data(index, role)
 
     def set_color_filter(self, color):
         self.color_filter = color
@@ -47,6 +60,13 @@ class MainWindow(QMainWindow):
         self.color_handler = ColorHandler()
         self.clipboard = []  # Lista przechowująca pliki do skopiowania lub wycięcia
         self.cut_mode = False  # Tryb oznaczający, czy pliki są wycinane (True) czy kopiowane (False)
+        self.thumbnail_loader = ThumbnailLoader(parent=self)
+        self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+        # Widoczne miniatury są ustalane po krótkiej przerwie w przewijaniu, a nie przy każdym ruchu paska
+        self.thumbnail_timer = QTimer(self)
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(30)
+        self.thumbnail_timer.timeout.connect(self.request_visible_thumbnails)
         self.initUI()
 
     def initUI(self):
@@ -75,6 +95,11 @@ class MainWindow(QMainWindow):
         blur_button.clicked.connect(self.open_blur_inspector)
         nav_layout.addWidget(blur_button)
 
+        # Dodanie przycisku eksportu zaznaczonych zdjęć (lub całego folderu) do osobnego folderu
+        export_button = QPushButton("Eksportuj")
+        export_button.clicked.connect(self.open_export)
+        nav_layout.addWidget(export_button)
+
         # Dodanie przycisków kopiowania, wycinania, wklejania i usuwania
         copy_button = QPushButton("Kopiuj")
         copy_button.clicked.connect(self.copy_files)
@@ -112,6 +137,12 @@ class MainWindow(QMainWindow):
         self.color_combobox.currentIndexChanged.connect(self.sort_by_selected_color)
         nav_layout.addWidget(self.color_combobox)
 
+        # Przełącznik widoku siatki miniatur
+        self.thumbnails_button = QPushButton("Miniatury")
+        self.thumbnails_button.setCheckable(True)
+        self.thumbnails_button.toggled.connect(self.toggle_thumbnails)
+        nav_layout.addWidget(self.thumbnails_button)
+
         main_layout.addLayout(nav_layout)
 
         # Tworzenie rozdzielacza
@@ -140,6 +171,11 @@ class MainWindow(QMainWindow):
         self.file_list.setSelectionMode(QListView.ExtendedSelection)  # Pozwala na zaznaczanie wielu plików
         self.file_list.clicked.connect(self.on_file_clicked)
         self.file_list.doubleClicked.connect(self.on_file_double_clicked)
+        # Każda zmiana widocznego fragmentu listy zleca wczytanie miniatur
+        self.file_list.verticalScrollBar().valueChanged.connect(self.schedule_thumbnails)
+        self.file_list.verticalScrollBar().rangeChanged.connect(self.schedule_thumbnails)
+        self.file_model.directoryLoaded.connect(self.schedule_thumbnails)
+        self.proxy_model.layoutChanged.connect(self.schedule_thumbnails)
 
         # Tworzenie obszaru szczegółów
         self.detail_label = QLabel("Wybierz plik, aby zobaczyć szczegóły")
@@ -191,14 +227,89 @@ class MainWindow(QMainWindow):
             self.update_sort_by_color_combobox(path)  # Ustaw rozwijaną listę sortowania po kolorze
         else:
             # Jeśli to plik graficzny, otwórz go
-            supported_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.raw', '.nef', '.cr2', '.arw', '.dng', '.tiff']
-            if any(path.lower().endswith(ext) for ext in supported_extensions):
+            if path.lower().endswith(image_extensions()):
                 try:
                     self.image_viewer = ImageViewer(path, self.color_handler)
                     self.image_viewer.show()
                 except Exception as e:
                     self.detail_label.setText(f"Error: {str(e)}")
 
+    def toggle_thumbnails(self, enabled):
+        # Tryb siatki: duże ikony z miniaturami w stałych komórkach (jednakowy rozmiar przyspiesza układanie)
+        if enabled:
+            self.file_list.setViewMode(QListView.IconMode)
+            self.file_list.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            self.file_list.setGridSize(QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 40))
+            self.file_list.setResizeMode(QListView.Adjust)
+            self.file_list.setMovement(QListView.Static)
+            self.file_list.setUniformItemSizes(True)
+            self.file_list.setWordWrap(True)
+            self.proxy_model.thumbnail_loader = self.thumbnail_loader
+            self.schedule_thumbnails()
+        else:
+            self.thumbnail_loader.cancel_all()
+            self.proxy_model.thumbnail_loader = None
+            self.file_list.setViewMode(QListView.ListMode)
+            self.file_list.setIconSize(QSize())
+            self.file_list.setGridSize(QSize())
+            self.file_list.setUniformItemSizes(False)
+            self.file_list.setWordWrap(False)
+        self.file_list.doItemsLayout()
+
+    def schedule_thumbnails(self, *args):
+        if self.proxy_model.thumbnail_loader is not None:
+            self.thumbnail_timer.start()
+
+    def request_visible_thumbnails(self):
+        """
+        Zleca wczytanie miniatur widocznych zdjęć oraz (z niższym priorytetem) tych z sąsiednich ekranów.
+        Miniatury, które wyszły poza ten zakres, a jeszcze czekają w kolejce, są anulowane.
+        """
+        if self.proxy_model.thumbnail_loader is None:
+            return
+        root = self.file_list.rootIndex()
+        row_count = self.proxy_model.rowCount(root)
+        if row_count == 0:
+            self.thumbnail_loader.cancel_all()
+            return
+
+        # Widoczne wiersze ustalamy, sprawdzając środki komórek siatki w oknie - bez przeglądania całego folderu
+        grid = self.file_list.gridSize()
+        viewport = self.file_list.viewport().rect()
+        rows = set()
+        for y in range(grid.height() // 2, viewport.height() + grid.height() // 2, grid.height()):
+            for x in range(grid.width() // 2, viewport.width(), grid.width()):
+                index = self.file_list.indexAt(QPoint(x, min(y, viewport.height() - 1)))
+                if index.isValid():
+                    rows.add(index.row())
+        if not rows:
+            return
+        first, last = min(rows), max(rows)
+        page = last - first + 1
+
+        def paths(row_range):
+            return [self.file_model.filePath(self.proxy_model.mapToSource(self.proxy_model.index(row, 0, root)))
+                    for row in row_range]
+
+        visible = paths(range(first, last + 1))
+        # Z wyprzedzeniem: dwa ekrany w dół i jeden w górę
+        prefetch = paths(range(last + 1, min(row_count, last + 1 + 2 * page))) + \
+            paths(range(max(0, first - page), first))
+        self.thumbnail_loader.request(
+            [path for path in visible if path.lower().endswith(THUMBNAIL_EXTENSIONS)],
+            [path for path in prefetch if path.lower().endswith(THUMBNAIL_EXTENSIONS)])
+
+    def on_thumbnail_ready(self, file_path):
+        if self.proxy_model.thumbnail_loader is None:
+            return
+        index = self.proxy_model.mapFromSource(self.file_model.index(file_path))
+        if index.isValid():
+            self.proxy_model.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def closeEvent(self, event):
+        self.thumbnail_loader.shutdown()
+        super().closeEvent(event)
+
     def update_tree_and_list(self, path):
         # Aktualizuj root dla listy plików
         self.file_list.setRootIndex(self.proxy_model.mapFromSource(self.file_model.setRootPath(path)))
@@ -251,6 +362,22 @@ class MainWindow(QMainWindow):
         blur_inspector_window = BlurInspectorWindow(current_directory, self.color_handler)
         blur_inspector_window.exec_()
 
+    def open_export(self):
+        # Eksportowane są zaznaczone zdjęcia, a gdy nic nie jest zaznaczone - wszystkie zdjęcia z bieżącego folderu
+        selected_indexes = self.file_list.selectedIndexes()
+        paths = [self.file_model.filePath(self.proxy_model.mapToSource(index)) for index in selected_indexes]
+        if not paths:
+            current_directory = self.model.filePath(self.tree.currentIndex())
+            if not os.path.isdir(current_directory):
+                return
+            paths = [os.path.join(current_directory, f) for f in sorted(os.listdir(current_directory))]
+        paths = [path for path in paths if os.path.isfile(path) and path.lower().endswith(EXPORT_EXTENSIONS)]
+        if not paths:
+            QMessageBox.information(self, "Eksport", "Brak zdjęć do eksportu.")
+            return
+        export_window = ExportWindow(paths, self)
+        export_window.exec_()
+
     def update_sort_by_color_combobox(self, directory):
         # Sprawdź, czy plik colors.json istnieje w bieżącym katalogu
         colors_json_path = os.path.join(directory, "colors.json")
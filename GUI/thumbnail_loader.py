@@ -0,0 +1,152 @@
+import os
+import logging
+from collections import OrderedDict
+from PyQt5.QtGui import QPixmap, QImage, QColor
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from Utils.image_handler import load_thumbnail_image
+from Utils.image_formats import image_extensions
+
+# Rozmiar miniatur w widoku siatki (w pikselach)
+THUMBNAIL_SIZE = 128
+
+# Rozszerzenia plików, dla których tworzone są miniatury - wszystkie formaty z rejestru dekoderów
+THUMBNAIL_EXTENSIONS = image_extensions()
+
+# Liczba miniatur trzymanych w pamięci (ok. 64 kB każda)
+THUMBNAIL_CACHE_SIZE = 2000
+
+# Priorytety zadań w puli wątków - widoczne miniatury przed wczytywanymi z wyprzedzeniem
+VISIBLE_PRIORITY = 1
+PREFETCH_PRIORITY = 0
+
+
+class _ThumbnailSignals(QObject):
+    # Sygnały z wątków puli są dostarczane w wątku GUI (połączenie kolejkowane)
+    loaded = pyqtSignal(str, QImage)
+    failed = pyqtSignal(str)
+
+
+class _ThumbnailTask(QRunnable):
+    def __init__(self, image_path, size, signals):
+        super().__init__()
+        self.image_path = image_path
+        self.size = size
+        self.signals = signals
+        # Zadanie jest usuwane przez ThumbnailLoader, który trzyma do niego referencję
+        self.setAutoDelete(False)
+
+    def run(self):
+        try:
+            image = load_thumbnail_image(self.image_path, (self.size, self.size))
+        except Exception as e:
+            logging.debug(f"Nie udało się utworzyć miniatury {self.image_path}: {e}")
+            self.signals.failed.emit(self.image_path)
+            return
+        self.signals.loaded.emit(self.image_path, image)
+
+
+class ThumbnailLoader(QObject):
+    """
+    Wczytuje miniatury zdjęć w puli wątków Qt i trzyma gotowe w pamięci podręcznej LRU.
+
+    Widok przekazuje listę widocznych plików i listę plików do wczytania z wyprzedzeniem;
+    widoczne mają wyższy priorytet, a zadania dla plików, które zniknęły z obu list i jeszcze
+    się nie zaczęły, są anulowane. Miniatury są odczytywane z pamięci podręcznej na dysku,
+    więc ponowne otwarcie folderu nie dekoduje zdjęć.
+    """
+
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, size=THUMBNAIL_SIZE, cache_size=THUMBNAIL_CACHE_SIZE, parent=None):
+        """
+        :param size: Rozmiar miniatur (dłuższy bok w pikselach).
+        :param cache_size: Liczba miniatur trzymanych w pamięci.
+        :param parent: Obiekt nadrzędny.
+        """
+        super().__init__(parent)
+        self.size = size
+        self.cache_size = cache_size
+        self._pixmaps = OrderedDict()  # {ścieżka: QPixmap}
+        self._tasks = {}  # {ścieżka: (zadanie w puli, priorytet)}
+        # Pliki, z których nie udało się utworzyć miniatury, z czasem modyfikacji z chwili błędu
+        self._failed = {}
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max(1, (os.cpu_count() or 2) - 1))  # Jeden rdzeń zostaje dla interfejsu
+        self._signals = _ThumbnailSignals()
+        self._signals.loaded.connect(self._loaded)
+        self._signals.failed.connect(self._failed_task)
+        self.placeholder = QPixmap(size, size)
+        self.placeholder.fill(QColor(220, 220, 220))
+
+    def pixmap(self, image_path):
+        """
+        Zwraca gotową miniaturę albo None - nigdy nie czeka na wczytanie.
+
+        :param image_path: Ścieżka do pliku graficznego.
+        :return: Obiekt QPixmap lub None.
+        """
+        pixmap = self._pixmaps.get(image_path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(image_path)
+        return pixmap
+
+    def request(self, visible_paths, prefetch_paths=()):
+        """
+        Zleca wczytanie miniatur: najpierw widocznych, potem pozostałych z listy.
+
+        :param visible_paths: Ścieżki plików widocznych w oknie.
+        :param prefetch_paths: Ścieżki plików do wczytania z wyprzedzeniem, w kolejności ważności.
+        """
+        wanted = set(visible_paths) | set(prefetch_paths)
+        for image_path in [path for path in self._tasks if path not in wanted]:
+            # tryTake usuwa tylko zadania, które jeszcze czekają w kolejce
+            if self._pool.tryTake(self._tasks[image_path][0]):
+                del self._tasks[image_path]
+
+        for paths, priority in ((visible_paths, VISIBLE_PRIORITY), (prefetch_paths, PREFETCH_PRIORITY)):
+            for image_path in paths:
+                if image_path in self._pixmaps:
+                    continue
+                if image_path in self._failed:
+                    # Plik zmieniony od błędu (np. kopiowany w chwili pierwszej próby) dostaje kolejną szansę
+                    if self._failed[image_path] == _mtime_ns(image_path):
+                        continue
+                    del self._failed[image_path]
+                if image_path in self._tasks:
+                    task, queued_priority = self._tasks[image_path]
+                    # Miniatura wczytywana z wyprzedzeniem, która stała się widoczna, przechodzi na początek kolejki
+                    if queued_priority >= priority or not self._pool.tryTake(task):
+                        continue
+                task = _ThumbnailTask(image_path, self.size, self._signals)
+                self._tasks[image_path] = (task, priority)
+                self._pool.start(task, priority)
+
+    def cancel_all(self):
+        """
+        Anuluje wszystkie zadania, które jeszcze się nie zaczęły (np. po zmianie folderu).
+        """
+        self.request(())
+
+    def shutdown(self):
+        self.cancel_all()
+        self._pool.waitForDone()
+        self._pixmaps.clear()
+
+    def _loaded(self, image_path, image):
+        self._tasks.pop(image_path, None)
+        self._pixmaps[image_path] = QPixmap.fromImage(image)
+        self._pixmaps.move_to_end(image_path)
+        while len(self._pixmaps) > self.cache_size:
+            self._pixmaps.popitem(last=False)
+        self.thumbnail_ready.emit(image_path)
+
+    def _failed_task(self, image_path):
+        self._tasks.pop(image_path, None)
+        self._failed[image_path] = _mtime_ns(image_path)
+
+
+def _mtime_ns(image_path):
+    try:
+        return os.stat(image_path).st_mtime_ns
+    except OSError:
+        return None
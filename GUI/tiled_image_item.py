@@ -0,0 +1,155 @@
+import math
+import threading
+import cv2
+import numpy as np
+from PyQt5.QtWidgets import QGraphicsItem
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtCore import QObject, QRectF, pyqtSignal
+from Utils.image_cache import ImageCache
+from Utils.image_handler import to_qimage
+
+# Bok kafelka w pikselach poziomu piramidy
+TILE_SIZE = 512
+
+# Limit pamięci na gotowe kafelki (w bajtach)
+TILE_CACHE_MAX_BYTES = 256 * 2 ** 20
+
+# Formaty QImage, na które można założyć widok NumPy (format -> liczba kanałów)
+ARRAY_CHANNELS = {
+    QImage.Format_Grayscale8: 1,
+    QImage.Format_RGB888: 3,
+    QImage.Format_RGBA8888: 4,
+}
+
+
+class _TileSignals(QObject):
+    # Sygnał z wątku roboczego jest dostarczany w wątku GUI (połączenie kolejkowane)
+    tile_ready = pyqtSignal()
+
+
+class TiledImageItem(QGraphicsItem):
+    """
+    Element sceny rysujący duży obraz z kafelków piramidy rozdzielczości.
+
+    Kolejne poziomy piramidy (każdy dwa razy mniejszy) są budowane dopiero wtedy, gdy są potrzebne.
+    Rysowane są tylko kafelki widoczne w oknie, z poziomu odpowiadającego bieżącemu powiększeniu.
+    Brakujące kafelki są przygotowywane w tle i trzymane w pamięci podręcznej LRU z limitem pamięci;
+    zadania dla kafelków, które zniknęły z okna, są anulowane. Dopóki kafelek nie jest gotowy,
+    widać to, co leży pod elementem (np. obraz w rozdzielczości ekranu).
+    """
+
+    def __init__(self, q_image, parent=None):
+        """
+        :param q_image: Obraz w pełnej rozdzielczości.
+        :param parent: Element nadrzędny.
+        """
+        super().__init__(parent)
+        if q_image.format() not in ARRAY_CHANNELS:
+            q_image = q_image.convertToFormat(QImage.Format_RGBA8888)
+        self._image = q_image  # Utrzymuje przy życiu bufor, na który wskazuje poziom 0
+        self._levels = [_image_array(q_image)]
+        self._levels_lock = threading.Lock()
+        self._width = q_image.width()
+        self._height = q_image.height()
+        self._max_level = max(0, math.ceil(math.log2(max(self._width, self._height) / TILE_SIZE)))
+        self._released = False
+        self._signals = _TileSignals()
+        self._signals.tile_ready.connect(self._tile_ready)
+        self.tiles = ImageCache(self._make_tile, QImage.sizeInBytes, TILE_CACHE_MAX_BYTES,
+                                on_loaded=lambda key: self._signals.tile_ready.emit())
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._width, self._height)
+
+    def paint(self, painter, option, widget=None):
+        level = self._level_for(option.levelOfDetailFromTransform(painter.worldTransform()))
+        visible = self.boundingRect()
+        if widget is not None:
+            # Cały widoczny obszar, a nie tylko odświeżany fragment - inaczej anulowalibyśmy potrzebne kafelki
+            inverse, invertible = painter.worldTransform().inverted()
+            if invertible:
+                visible = visible.intersected(inverse.mapRect(QRectF(widget.rect())))
+
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        missing = []
+        for key in self._visible_tiles(level, visible):
+            tile = self.tiles.peek(key)
+            if tile is None:
+                missing.append(key)
+            else:
+                painter.drawImage(self._tile_rect(key), tile)
+        if missing:
+            self.tiles.prefetch(missing)
+
+    def release(self):
+        """
+        Zatrzymuje przygotowywanie kafelków i zwalnia ich pamięć. Wywoływane przed usunięciem elementu ze sceny.
+        """
+        # Piramida zostaje, dopóki żyje element - zadanie w toku może jeszcze czytać piksele
+        self._released = True
+        self.tiles.shutdown()
+
+    def _tile_ready(self):
+        if not self._released:
+            self.update()
+
+    def _level_for(self, level_of_detail):
+        if level_of_detail <= 0:
+            return self._max_level
+        return min(self._max_level, max(0, int(math.floor(math.log2(1 / level_of_detail)))))
+
+    def _level_size(self, level):
+        width, height = self._width, self._height
+        for _ in range(level):
+            width, height = max(1, width // 2), max(1, height // 2)
+        return width, height
+
+    def _visible_tiles(self, level, rect):
+        level_width, level_height = self._level_size(level)
+        scale_x = level_width / self._width
+        scale_y = level_height / self._height
+        first_col = max(0, int(rect.left() * scale_x) // TILE_SIZE)
+        last_col = min((level_width - 1) // TILE_SIZE, int(rect.right() * scale_x) // TILE_SIZE)
+        first_row = max(0, int(rect.top() * scale_y) // TILE_SIZE)
+        last_row = min((level_height - 1) // TILE_SIZE, int(rect.bottom() * scale_y) // TILE_SIZE)
+        return [(level, col, row) for row in range(first_row, last_row + 1) for col in range(first_col, last_col + 1)]
+
+    def _tile_rect(self, key):
+        level, col, row = key
+        level_width, level_height = self._level_size(level)
+        scale_x = self._width / level_width
+        scale_y = self._height / level_height
+        x, y = col * TILE_SIZE, row * TILE_SIZE
+        width = min(TILE_SIZE, level_width - x)
+        height = min(TILE_SIZE, level_height - y)
+        return QRectF(x * scale_x, y * scale_y, width * scale_x, height * scale_y)
+
+    def _level(self, level):
+        # Poziomy są budowane kolejno, każdy z poprzedniego (INTER_AREA uśrednia bloki 2x2)
+        with self._levels_lock:
+            while len(self._levels) <= level:
+                previous = self._levels[-1]
+                height, width = previous.shape[:2]
+                self._levels.append(cv2.resize(previous, (max(1, width // 2), max(1, height // 2)),
+                                               interpolation=cv2.INTER_AREA))
+            return self._levels[level]
+
+    def _make_tile(self, key):
+        if self._released:
+            return None
+        level, col, row = key
+        pixels = self._level(level)
+        x, y = col * TILE_SIZE, row * TILE_SIZE
+        tile = pixels[y:y + TILE_SIZE, x:x + TILE_SIZE]
+        # Format premultiplied jest rysowany przez silnik rastrowy bez konwersji
+        return to_qimage(tile).convertToFormat(QImage.Format_ARGB32_Premultiplied)
+
+
+def _image_array(q_image):
+    # Widok NumPy na piksele QImage, bez kopiowania - QImage musi żyć dłużej niż widok
+    channels = ARRAY_CHANNELS[q_image.format()]
+    bits = q_image.constBits()
+    bits.setsize(q_image.sizeInBytes())
+    rows = np.frombuffer(bits, dtype=np.uint8).reshape(q_image.height(), q_image.bytesPerLine())
+    pixels = rows[:, :q_image.width() * channels]
+    return pixels if channels == 1 else pixels.reshape(q_image.height(), q_image.width(), channels)
@@ -1,83 +1,539 @@
 import cv2
 import numpy as np
 import os
-import joblib
+import rawpy
 import logging
+import hashlib
+import itertools
+import concurrent.futures
+from collections import deque
+from Utils.blur_cache import BlurCache
+from Utils.file_inspector import inspect_file
+from Utils.image_formats import identify_format, open_image, image_extensions
+from Utils.forest_model import ForestModel
+from Utils import sharpness_features
 
-# Załaduj wytrenowany model
-clf = joblib.load(r'Utils\sharpness_classifier.pkl')
+# Ścieżka do wytrenowanego modelu (las wyeksportowany przez Utils/forest_model.py)
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sharpness_classifier.npz')
+
+# Rozszerzenia plików analizowanych przez inspektora - wszystkie formaty z rejestru dekoderów
+IMAGE_EXTENSIONS = image_extensions()
+
+# Skale analizy (dzielnik rozdzielczości) i odpowiadające im flagi dekodowania OpenCV.
+# Dla JPEG zmniejszenie odbywa się już w dekoderze (skalowanie DCT), więc pełna klatka
+# nigdy nie trafia do pamięci.
+ANALYSIS_SCALES = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# Pierwszy etap kaskady liczy wariancję Laplasjanu na obrazie zmniejszonym tyle razy
+CASCADE_SCALE = 8
+
+# Wersja algorytmu cech - zmiana unieważnia cechy zapisane w pamięci podręcznej
+FEATURE_VERSION = "2"
+
+# Siatka mapy ostrości liczonej na żądanie przeglądarki, gdy folder nie był analizowany kafelkami
+SHARPNESS_MAP_GRID = (6, 8)
+
+_clf = None
+_model_version = None
+
+
+def load_classifier():
+    """
+    Ładuje wytrenowany model. Model jest wczytywany tylko raz na proces.
+
+    :return: Wytrenowany klasyfikator (obiekt ForestModel).
+    """
+    global _clf
+    if _clf is None:
+        _clf = ForestModel.load(MODEL_PATH)
+    return _clf
+
+
+def model_version():
+    """
+    Zwraca skrót pliku modelu, którym oznaczane są werdykty w pamięci podręcznej.
+
+    :return: Wersja modelu (skrót SHA-1 pliku).
+    """
+    global _model_version
+    if _model_version is None:
+        with open(MODEL_PATH, 'rb') as f:
+            _model_version = hashlib.sha1(f.read()).hexdigest()
+    return _model_version
+
+
+def load_gray(image_path, scale=1, record=None):
+    """
+    Wczytuje obraz od razu w skali szarości, w rozdzielczości zmniejszonej podaną liczbę razy.
+    Pliki RAW trafiają do rawpy, formaty obsługiwane przez OpenCV do OpenCV, a pozostałe
+    (np. GIF, HEIF) do Pillow - według formatu rozpoznanego z nagłówka.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :param scale: Dzielnik rozdzielczości (1, 2, 4 lub 8).
+    :param record: Opcjonalny FileRecord tego pliku - obraz jest wtedy dekodowany ze wspólnego bufora.
+    :return: Obraz w skali szarości (tablica NumPy) lub None, jeśli nie udało się go wczytać.
+    """
+    if scale not in ANALYSIS_SCALES:
+        raise ValueError(f"Nieobsługiwana skala analizy: {scale}")
+    image_format = record.format if record is not None else identify_format(image_path)
+    if image_format is not None and image_format.is_raw:
+        return load_raw_gray(image_path, scale, record)
+    if image_format is not None and not image_format.opencv:
+        return _pillow_gray(image_path, scale, image_format, record)
+    if record is not None:
+        if not record.size:
+            return None
+        return cv2.imdecode(np.frombuffer(record.buffer, dtype=np.uint8), ANALYSIS_SCALES[scale])
+    return cv2.imread(image_path, ANALYSIS_SCALES[scale])
+
+
+def load_raw_gray(image_path, scale=1, record=None):
+    """
+    Wczytuje plik RAW w skali szarości na podstawie osadzonego podglądu JPEG.
+    Jeżeli plik nie zawiera podglądu, wykonywane jest szybkie wywołanie w połowie rozdzielczości.
+
+    :param image_path: Ścieżka do pliku RAW.
+    :param scale: Dzielnik rozdzielczości (1, 2, 4 lub 8).
+    :param record: Opcjonalny FileRecord tego pliku - podgląd jest wtedy brany z rekordu.
+    :return: Obraz w skali szarości (tablica NumPy).
+    """
+    if record is not None:
+        image, scale = _raw_gray(record.raw, record.preview, scale)
+    else:
+        with rawpy.imread(image_path) as raw:
+            try:
+                thumbnail = raw.extract_thumb()
+            except (rawpy._rawpy.LibRawNoThumbnailError, rawpy._rawpy.LibRawUnsupportedThumbnailError):
+                thumbnail = None
+            image, scale = _raw_gray(raw, thumbnail, scale)
+
+    if scale > 1:
+        height, width = image.shape
+        image = cv2.resize(image, (width // scale, height // scale), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def _pillow_gray(image_path, scale, image_format, record=None):
+    with open_image(record.stream() if record is not None else image_path, image_format) as image:
+        gray = image.convert('L')
+    if scale > 1:
+        gray = gray.reduce(scale)
+    return np.asarray(gray)
+
+
+def _raw_gray(raw, thumbnail, scale):
+    # Zwraca obraz w skali szarości i dzielnik rozdzielczości, który trzeba jeszcze zastosować
+    if thumbnail is not None and thumbnail.format == rawpy.ThumbFormat.JPEG:
+        # Podgląd JPEG dekodujemy tak samo jak zwykłe pliki JPEG
+        return cv2.imdecode(np.frombuffer(thumbnail.data, dtype=np.uint8), ANALYSIS_SCALES[scale]), 1
+
+    if thumbnail is not None:
+        return cv2.cvtColor(thumbnail.data, cv2.COLOR_RGB2GRAY), scale
+    # half_size pomija demozaikowanie - obraz ma od razu połowę rozdzielczości
+    return cv2.cvtColor(raw.postprocess(half_size=True), cv2.COLOR_RGB2GRAY), max(scale // 2, 1)
+
+
+def sharpness_map(image_path, grid=SHARPNESS_MAP_GRID):
+    """
+    Zwraca mapę ostrości kafelków zdjęcia. Najpierw sprawdzana jest pamięć podręczna folderu
+    (mapa z analizy w trybie kafelków), a gdy jej brak - mapa jest liczona na podglądzie 1/8.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :param grid: Liczba kafelków (wiersze, kolumny) dla mapy liczonej od nowa.
+    :return: Mapa wariancji Laplasjanu (tablica NumPy) lub None, jeśli obrazu nie udało się wczytać.
+    """
+    stat = os.stat(image_path)
+    cache = BlurCache.open_existing(os.path.dirname(image_path))
+    if cache is not None:
+        try:
+            tile_map = cache.tile_map(os.path.basename(image_path), stat.st_size, stat.st_mtime_ns)
+        finally:
+            cache.close()
+        if tile_map is not None:
+            return tile_map
+
+    preview = load_gray(image_path, CASCADE_SCALE)
+    if preview is None:
+        return None
+    return sharpness_features.laplacian_map(preview, grid)
 
 
 class BlurInspector:
-    def __init__(self, directory, batch_size=10):
+    def __init__(self, directory, batch_size=10, workers=None, scale=1, use_cache=True, threshold=0.5,
+                 cascade=False, cascade_band=(20.0, 400.0), tiles=None, top_k=3, subject_threshold=None):
+        if scale not in ANALYSIS_SCALES:
+            raise ValueError(f"Nieobsługiwana skala analizy: {scale}")
         self.directory = directory
         self.blurred_images = []
+        self.scores = {}  # Prawdopodobieństwo rozmycia dla każdego przeanalizowanego pliku
         self.batch_size = batch_size  # Wielkość partii przetwarzania zdjęć
+        self.workers = workers or os.cpu_count() or 1  # Liczba procesów roboczych (1 = tryb sekwencyjny)
+        self.scale = scale  # Dzielnik rozdzielczości, w której liczone są cechy
+        self.use_cache = use_cache  # Czy korzystać z pamięci podręcznej cech w folderze
+        self.threshold = threshold  # Zdjęcia z prawdopodobieństwem rozmycia powyżej progu są nieostre
+        self.cascade = cascade  # Czy najpierw oceniać zdjęcia tanim pierwszym etapem
+        # Zakres niepewności pierwszego etapu (wariancja Laplasjanu w skali 1/CASCADE_SCALE):
+        # poniżej zdjęcie jest rozmyte, powyżej ostre, w środku trafia do pełnej analizy
+        self.cascade_band = cascade_band
+        # Liczba zdjęć rozstrzygniętych przez pamięć podręczną, pierwszy i drugi etap
+        self.stage_counts = {'cache': 0, 'stage1': 0, 'stage2': 0}
+        self.tiles = tiles  # Siatka kafelków (wiersze, kolumny) dla mapy ostrości lub None
+        self.top_k = top_k  # Liczba najostrzejszych kafelków uśrednianych w ostrość obiektu
+        # Ostrość obiektu (wariancja Laplasjanu w skali analizy), powyżej której zdjęcie jest ostre
+        # niezależnie od klasyfikatora - np. portret z rozmytym tłem; None - tylko zapis wyniku
+        self.subject_threshold = subject_threshold
+        self.sharpness_maps = {}  # Mapa ostrości kafelków dla każdego przeanalizowanego pliku
+        self.subject_scores = {}  # Ostrość obiektu (średnia top_k kafelków) dla każdego pliku z mapą
 
     def extract_features(self, image):
         try:
-            image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            laplacian_var = cv2.Laplacian(image_gray, cv2.CV_64F).var()
-            gradient_x = cv2.Sobel(image_gray, cv2.CV_64F, 1, 0, ksize=5)
-            gradient_y = cv2.Sobel(image_gray, cv2.CV_64F, 0, 1, ksize=5)
-            gradient_magnitude = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
-            gradient_mean = np.mean(gradient_magnitude)
-            edges = cv2.Canny(image_gray, 100, 200)
-            edge_hist = np.sum(edges) / (image_gray.shape[0] * image_gray.shape[1])
-            return [laplacian_var, gradient_mean, edge_hist]
+            return sharpness_features.extract_features(image)
         except Exception as e:
             logging.error(f"Błąd podczas wyodrębniania cech obrazu: {e}")
             return None
 
-    def is_blurred(self, image_path):
+    def file_features(self, image_path, record=None):
+        """
+        Wczytuje plik i wyodrębnia z niego cechy ostrości.
+
+        W trybie kafelków cechy dla klasyfikatora się nie zmieniają (model uczono na cechach
+        całej klatki), a mapa kafelków jest zwracana osobno.
+
+        :param image_path: Ścieżka do pliku graficznego.
+        :param record: Opcjonalny FileRecord tego pliku (wspólny bufor zamiast ponownego odczytu).
+        :return: Krotka (lista cech lub None, jeśli obrazu nie udało się przeanalizować,
+                 mapa ostrości kafelków lub None poza trybem kafelków).
+        """
         try:
-            image = cv2.imread(image_path)
+            image = load_gray(image_path, self.scale, record)
             if image is None:
                 logging.warning(f"Nie udało się wczytać obrazu: {image_path}")
-                return False
+                return None, None
+            if not self.tiles:
+                return self.extract_features(image), None
+
+            return sharpness_features.extract_features_with_tiles(image, self.tiles)
+        except Exception as e:
+            logging.error(f"Błąd podczas analizy obrazu {image_path}: {e}")
+            return None, None
 
-            features = self.extract_features(image)
-            if features is None:
-                return False
+    def analyze_file(self, image_path):
+        """
+        Analizuje plik z uwzględnieniem kaskady.
 
-            prediction = clf.predict([features])
-            return prediction[0] == 1  # 1 oznacza rozmyte
+        :param image_path: Ścieżka do pliku graficznego.
+        :return: Krotka (cechy, prawdopodobieństwo z pierwszego etapu, mapa ostrości kafelków).
+                 Jeśli zdjęcie rozstrzygnął pierwszy etap, cechy są None; w przeciwnym razie
+                 None jest drugi element. Mapa jest None poza trybem kafelków.
+        """
+        if not self.cascade:
+            features, tile_map = self.file_features(image_path)
+            return features, None, tile_map
+
+        # Oba etapy kaskady dekodują ten sam plik - odczytujemy go raz
+        try:
+            with inspect_file(image_path) as record:
+                return self._analyze_cascade(image_path, record)
+        except OSError as e:
+            logging.error(f"Błąd podczas analizy obrazu {image_path}: {e}")
+            return None, None, None
+
+    def _analyze_cascade(self, image_path, record):
+        try:
+            preview = load_gray(image_path, CASCADE_SCALE, record)
+            if preview is None:
+                logging.warning(f"Nie udało się wczytać obrazu: {image_path}")
+                return None, None, None
+            if self.tiles:
+                tile_map = sharpness_features.laplacian_map(preview, self.tiles)
+                sharpness = sharpness_features.top_k_mean(tile_map, self.top_k)
+            else:
+                tile_map = None
+                sharpness = sharpness_features.laplacian_variance(preview)
         except Exception as e:
             logging.error(f"Błąd podczas analizy obrazu {image_path}: {e}")
+            return None, None, None
+
+        low, high = self.cascade_band
+        if sharpness < low:
+            return None, 1.0, tile_map
+        if sharpness > high:
+            return None, 0.0, tile_map
+        features, tile_map = self.file_features(image_path, record)
+        return features, None, tile_map
+
+    def blur_probabilities(self, features):
+        """
+        Klasyfikuje całą macierz cech jednym wywołaniem modelu.
+
+        :param features: Lista wektorów cech (elementy None oznaczają nieudaną analizę).
+        :return: Tablica prawdopodobieństw rozmycia; 0 dla obrazów, których nie udało się przeanalizować.
+        """
+        probabilities = np.zeros(len(features))
+        valid = [i for i, f in enumerate(features) if f is not None]
+        if valid:
+            clf = load_classifier()
+            blurred_column = list(clf.classes_).index(1)  # 1 oznacza rozmyte
+            matrix = np.array([features[i] for i in valid], dtype=np.float64)
+            probabilities[valid] = clf.predict_proba(matrix)[:, blurred_column]
+        return probabilities
+
+    def is_blurred(self, image_path):
+        features, early_probability, _ = self.analyze_file(image_path)
+        if early_probability is not None:
+            return early_probability > self.threshold
+        if features is None:
             return False
+        return self.blur_probabilities([features])[0] > self.threshold
+
+    def blurred_at(self, threshold=None):
+        """
+        Zwraca nieostre zdjęcia dla podanego progu na podstawie zapisanych wyników, bez ponownej analizy.
+
+        :param threshold: Próg prawdopodobieństwa rozmycia (domyślnie self.threshold).
+        :return: Lista nazw plików.
+        """
+        if threshold is None:
+            threshold = self.threshold
+        return [file_name for file_name, probability in self.scores.items() if probability > threshold]
+
+    def list_image_files(self):
+        """
+        Zwraca listę plików graficznych z analizowanego folderu.
+
+        :return: Lista nazw plików.
+        """
+        return [
+            f for f in os.listdir(self.directory)
+            if os.path.isfile(os.path.join(self.directory, f)) and
+            f.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+
+    def iter_results(self, image_files=None, cancel_callback=None):
+        """
+        Analizuje zdjęcia i zwraca wyniki strumieniowo, w kolejności plików.
 
-    def analyze_directory(self):
+        Dla workers > 1 dekodowanie i wyodrębnianie cech odbywa się w puli procesów,
+        a liczba zadań w toku jest ograniczona, więc pamięć nie rośnie z wielkością folderu.
+        Klasyfikator jest wywoływany raz na partię batch_size zdjęć. W trybie kaskady zdjęcia
+        wyraźnie ostre lub rozmyte rozstrzyga pierwszy etap, bez liczenia pełnych cech.
+        Pliki niezmienione od poprzedniej analizy są obsługiwane z pamięci podręcznej folderu.
+
+        :param image_files: Lista nazw plików (domyślnie wszystkie zdjęcia z folderu).
+        :param cancel_callback: Funkcja zwracająca True, gdy analizę należy przerwać.
+        :return: Generator par (nazwa pliku, prawdopodobieństwo rozmycia).
+        """
+        if image_files is None:
+            image_files = self.list_image_files()
+        self.stage_counts = {'cache': 0, 'stage1': 0, 'stage2': 0}
+        self.sharpness_maps = {}
+        self.subject_scores = {}
+
+        cache = BlurCache.open(self.directory) if self.use_cache else None
+        try:
+            known, to_analyze, file_stats = self._read_cache(cache, image_files)
+
+            paths = [os.path.join(self.directory, f) for f in to_analyze]
+            if self.workers > 1 and len(paths) > 1:
+                results = self._analyze_parallel(paths, cancel_callback)
+            else:
+                results = self._analyze_serial(paths, cancel_callback)
+
+            batch = []
+            try:
+                for file_name in image_files:
+                    if cancel_callback is not None and cancel_callback():
+                        return
+                    if file_name in known:
+                        # Wyniki muszą zachować kolejność plików, więc najpierw opróżniamy partię
+                        yield from self._classify_batch(batch, cache, file_stats)
+                        batch = []
+                        self.stage_counts['cache'] += 1
+                        yield file_name, known[file_name]
+                        continue
+
+                    result = next(results, _CANCELLED)
+                    if result is _CANCELLED:
+                        return
+                    batch.append((file_name, *result))
+                    if len(batch) >= self.batch_size:
+                        yield from self._classify_batch(batch, cache, file_stats)
+                        batch = []
+
+                yield from self._classify_batch(batch, cache, file_stats)
+            finally:
+                results.close()
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def feature_version(self):
+        version = f"{FEATURE_VERSION}/scale={self.scale}"
+        if self.tiles:
+            version += f"/tiles={self.tiles[0]}x{self.tiles[1]}/top_k={self.top_k}"
+            if self.subject_threshold is not None:
+                version += f"/subject={self.subject_threshold:g}"
+        if self.cascade:
+            low, high = self.cascade_band
+            version += f"/cascade={low:g}-{high:g}"
+        return version
+
+    def _classify_batch(self, batch, cache, file_stats, count=True):
+        # batch: lista krotek (nazwa pliku, cechy, prawdopodobieństwo z pierwszego etapu, mapa kafelków);
+        # count=False - pliki są już liczone gdzie indziej (np. jako wyniki z pamięci podręcznej)
+        if not batch:
+            return []
+
+        probabilities = self.blur_probabilities(
+            [features if early is None else None for _, features, early, _ in batch])
+        entries = []
+        for i, (file_name, features, early, tile_map) in enumerate(batch):
+            if tile_map is not None:
+                self.sharpness_maps[file_name] = tile_map
+                self.subject_scores[file_name] = sharpness_features.top_k_mean(tile_map, self.top_k)
+            if early is not None:
+                probabilities[i] = early
+            elif (tile_map is not None and self.subject_threshold is not None and
+                  self.subject_scores[file_name] > self.subject_threshold):
+                # Ostry obiekt na rozmytym tle - wynik kafelków rozstrzyga obok klasyfikatora, nie w jego cechach
+                probabilities[i] = 0.0
+            if count:
+                self.stage_counts['stage1' if early is not None else 'stage2'] += 1
+            stat = file_stats.get(file_name)
+            # Nieudanych analiz nie zapisujemy - zostaną powtórzone przy następnym uruchomieniu
+            if stat is not None and (features is not None or early is not None):
+                entries.append((file_name, stat.st_size, stat.st_mtime_ns, features,
+                                model_version(), probabilities[i], tile_map))
+        if cache is not None:
+            cache.store(entries, self.feature_version())
+
+        return [(entry[0], float(probability)) for entry, probability in zip(batch, probabilities)]
+
+    def _read_cache(self, cache, image_files):
+        # Dzieli pliki na znane z pamięci podręcznej i wymagające analizy
+        if cache is None:
+            return {}, list(image_files), {}
+
+        entries = cache.load(self.feature_version())
+        current_model = model_version()
+        known = {}
+        stale = []
+        to_analyze = []
+        file_stats = {}
+        for file_name in image_files:
+            try:
+                stat = os.stat(os.path.join(self.directory, file_name))
+            except OSError:
+                to_analyze.append(file_name)
+                continue
+            file_stats[file_name] = stat
+
+            entry = entries.get(file_name)
+            if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+                to_analyze.append(file_name)
+                continue
+            if entry[2] is None or entry[3] == current_model:
+                # Wyniki pierwszego etapu kaskady nie zależą od modelu
+                known[file_name] = entry[4]
+            else:
+                stale.append(file_name)
+            if entry[5] is not None:
+                self.sharpness_maps[file_name] = entry[5]
+                self.subject_scores[file_name] = sharpness_features.top_k_mean(entry[5], self.top_k)
+
+        if stale:
+            # Model się zmienił - prawdopodobieństwa liczymy z zapisanych cech, bez dekodowania obrazów
+            for file_name, probability in self._classify_batch(
+                    [(file_name, entries[file_name][2], None, entries[file_name][5]) for file_name in stale],
+                    cache, file_stats, count=False):
+                known[file_name] = probability
+
+        return known, to_analyze, file_stats
+
+    def _analyze_serial(self, paths, cancel_callback):
+        for path in paths:
+            if cancel_callback is not None and cancel_callback():
+                return
+            yield self.analyze_file(path)
+
+    def _analyze_parallel(self, paths, cancel_callback):
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                          initargs=(self.scale, self.cascade, self.cascade_band,
+                                                                    self.tiles, self.top_k))
+        in_flight = max(self.batch_size, self.workers * 2)
+        remaining = iter(paths)
+        pending = deque(executor.submit(_analyze_file, path) for path in itertools.islice(remaining, in_flight))
+        try:
+            while pending:
+                if cancel_callback is not None and cancel_callback():
+                    return
+                result = pending.popleft().result()
+                for path in itertools.islice(remaining, 1):
+                    pending.append(executor.submit(_analyze_file, path))
+                yield result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def analyze_directory(self, progress_callback=None, status_callback=None, cancel_callback=None):
         try:
             self.blurred_images = []
+            self.scores = {}
 
             # Lista plików w folderze
-            image_files = [
-                f for f in os.listdir(self.directory)
-                if os.path.isfile(os.path.join(self.directory, f)) and
-                f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.arw', '.nef', '.cr2', '.dng', '.raw'))
-            ]
+            image_files = self.list_image_files()
 
             if not image_files:
                 logging.info("Brak zdjęć do analizy w folderze.")
                 return self.blurred_images
 
-            logging.info(f"Znaleziono {len(image_files)} zdjęć do analizy.")
+            total_files = len(image_files)
+            logging.info(f"Znaleziono {total_files} zdjęć do analizy.")
+
+            for i, (file_name, probability) in enumerate(self.iter_results(image_files, cancel_callback)):
+                self.scores[file_name] = probability
+                if probability > self.threshold:
+                    self.blurred_images.append(file_name)
 
-            # Przetwarzanie wsadowe
-            for i in range(0, len(image_files), self.batch_size):
-                batch_files = image_files[i:i + self.batch_size]
-                for file_name in batch_files:
-                    file_path = os.path.join(self.directory, file_name)
-                    if self.is_blurred(file_path):
-                        self.blurred_images.append(file_name)
+                if status_callback:
+                    status_callback(file_name)
+                if progress_callback:
+                    progress_callback(int((i + 1) / total_files * 100))
+                if (i + 1) % self.batch_size == 0 or i + 1 == total_files:
+                    logging.info(f"Przetworzono {i + 1}/{total_files} zdjęć.")
 
-                logging.info(f"Przetworzono {min(i + self.batch_size, len(image_files))}/{len(image_files)} zdjęć.")
+            logging.info(f"Z pamięci podręcznej: {self.stage_counts['cache']}, "
+                         f"rozstrzygnięte w pierwszym etapie: {self.stage_counts['stage1']}, "
+                         f"w drugim etapie: {self.stage_counts['stage2']}.")
 
             return self.blurred_images
         except Exception as e:
             logging.error(f"Błąd podczas analizy katalogu: {e}")
             return []
 
+
+# Znacznik przerwanej analizy w strumieniu wyników (None oznacza nieudaną analizę pliku)
+_CANCELLED = object()
+
+_worker_inspector = None
+
+
+def _init_worker(scale, cascade, cascade_band, tiles, top_k):
+    # OpenCV nie uruchamia własnych wątków, żeby procesy nie konkurowały o rdzenie
+    global _worker_inspector
+    cv2.setNumThreads(1)
+    _worker_inspector = BlurInspector(None, workers=1, scale=scale, use_cache=False,
+                                      cascade=cascade, cascade_band=cascade_band, tiles=tiles, top_k=top_k)
+
+
+def _analyze_file(file_path):
+    return _worker_inspector.analyze_file(file_path)
+
+
 # Testowanie funkcji
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
@@ -0,0 +1,148 @@
+import os
+import sqlite3
+import logging
+import numpy as np
+
+# Nazwa pliku pamięci podręcznej zapisywanego w analizowanym folderze
+CACHE_FILE_NAME = ".blur_cache.sqlite"
+
+# Wersja układu tabeli - pliki zapisane w starszym układzie są zakładane od nowa
+SCHEMA_VERSION = 4
+
+
+class BlurCache:
+    """
+    Trwała pamięć podręczna cech ostrości i wyników klasyfikatora dla jednego folderu.
+
+    Wpis jest ważny, dopóki zgadzają się rozmiar i czas modyfikacji pliku oraz wersja cech.
+    Wynik zapisany dla innej wersji modelu można wyliczyć ponownie z zapisanych cech,
+    bez dekodowania obrazu. Zdjęcia rozstrzygnięte przez pierwszy etap kaskady nie mają cech.
+    W trybie kafelków zapisywana jest też mapa ostrości, z której korzysta przeglądarka zdjęć.
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, CACHE_FILE_NAME)
+        self.connection = sqlite3.connect(self.path)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS features")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            " file_name TEXT NOT NULL,"
+            " feature_version TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " laplacian_var REAL,"
+            " gradient_mean REAL,"
+            " edge_hist REAL,"
+            " model_version TEXT NOT NULL,"
+            " blur_probability REAL NOT NULL,"
+            " tile_rows INTEGER,"
+            " tile_cols INTEGER,"
+            " tile_map BLOB,"
+            " PRIMARY KEY (file_name, feature_version))"
+        )
+        self.connection.commit()
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Otwiera pamięć podręczną folderu. Zwraca None, jeżeli folder jest tylko do odczytu
+        albo plik bazy jest uszkodzony - analiza działa wtedy bez pamięci podręcznej.
+
+        :param directory: Analizowany folder.
+        :return: Obiekt BlurCache lub None.
+        """
+        try:
+            return cls(directory)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Nie można otworzyć pamięci podręcznej w {directory}: {e}")
+            return None
+
+    @classmethod
+    def open_existing(cls, directory):
+        """
+        Otwiera pamięć podręczną tylko wtedy, gdy folder był już analizowany.
+
+        :param directory: Folder ze zdjęciami.
+        :return: Obiekt BlurCache lub None.
+        """
+        if not os.path.exists(os.path.join(directory, CACHE_FILE_NAME)):
+            return None
+        return cls.open(directory)
+
+    def load(self, feature_version):
+        """
+        Wczytuje wszystkie wpisy dla danej wersji cech.
+
+        :param feature_version: Wersja algorytmu cech (razem ze skalą analizy).
+        :return: Słownik {nazwa pliku: (rozmiar, mtime_ns, cechy, wersja modelu, prawdopodobieństwo rozmycia,
+                 mapa ostrości kafelków)}.
+        """
+        rows = self.connection.execute(
+            "SELECT file_name, size, mtime_ns, laplacian_var, gradient_mean, edge_hist, model_version,"
+            " blur_probability, tile_rows, tile_cols, tile_map"
+            " FROM features WHERE feature_version = ?",
+            (feature_version,)
+        )
+        return {
+            row[0]: (row[1], row[2], None if row[3] is None else [row[3], row[4], row[5]], row[6], row[7],
+                     _decode_tile_map(row[8], row[9], row[10]))
+            for row in rows
+        }
+
+    def store(self, entries, feature_version):
+        """
+        Zapisuje wyniki analizy.
+
+        :param entries: Lista krotek (nazwa pliku, rozmiar, mtime_ns, cechy lub None, wersja modelu,
+                        prawdopodobieństwo rozmycia, mapa ostrości kafelków lub None).
+        :param feature_version: Wersja algorytmu cech (razem ze skalą analizy).
+        """
+        if not entries:
+            return
+        try:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (file_name, feature_version, size, mtime_ns,
+                     *([float(f) for f in features] if features is not None else [None] * 3),
+                     model_version, float(probability), *_encode_tile_map(tile_map))
+                    for file_name, size, mtime_ns, features, model_version, probability, tile_map in entries
+                ]
+            )
+            self.connection.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Nie udało się zapisać pamięci podręcznej {self.path}: {e}")
+
+    def tile_map(self, file_name, size, mtime_ns):
+        """
+        Zwraca zapisaną mapę ostrości kafelków dla aktualnej wersji pliku.
+
+        :param file_name: Nazwa pliku w folderze.
+        :param size: Rozmiar pliku w bajtach.
+        :param mtime_ns: Czas modyfikacji pliku w nanosekundach.
+        :return: Mapa ostrości (tablica NumPy) lub None.
+        """
+        row = self.connection.execute(
+            "SELECT tile_rows, tile_cols, tile_map FROM features"
+            " WHERE file_name = ? AND size = ? AND mtime_ns = ? AND tile_map IS NOT NULL LIMIT 1",
+            (file_name, size, mtime_ns)
+        ).fetchone()
+        return _decode_tile_map(*row) if row else None
+
+    def close(self):
+        self.connection.close()
+
+
+def _encode_tile_map(tile_map):
+    if tile_map is None:
+        return None, None, None
+    rows, cols = tile_map.shape
+    return rows, cols, np.asarray(tile_map, dtype=np.float32).tobytes()
+
+
+def _decode_tile_map(rows, cols, data):
+    if data is None:
+        return None
+    return np.frombuffer(data, dtype=np.float32).reshape(rows, cols).astype(np.float64)
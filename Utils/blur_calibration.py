@@ -0,0 +1,122 @@
+import argparse
+import logging
+import time
+from Utils.blur import BlurInspector, ANALYSIS_SCALES
+
+
+def calibrate_scales(directory, scales=(2, 4, 8), limit=None):
+    """
+    Porównuje werdykty klasyfikatora dla zmniejszonych rozdzielczości z werdyktami
+    dla pełnej rozdzielczości i mierzy czas analizy w każdej skali.
+
+    :param directory: Folder ze zdjęciami wzorcowymi.
+    :param scales: Sprawdzane dzielniki rozdzielczości.
+    :param limit: Maksymalna liczba analizowanych zdjęć (domyślnie wszystkie).
+    :return: Lista słowników z kluczami 'scale', 'agreement' i 'seconds_per_image'.
+    """
+    image_files = BlurInspector(directory).list_image_files()[:limit]
+    if not image_files:
+        return []
+
+    reference, reference_time = _run_scale(directory, image_files, 1)
+    report = [{'scale': 1, 'agreement': 1.0, 'seconds_per_image': reference_time}]
+
+    for scale in scales:
+        if scale == 1:
+            continue
+        verdicts, seconds_per_image = _run_scale(directory, image_files, scale)
+        matching = sum(1 for a, b in zip(reference, verdicts) if a == b)
+        report.append({
+            'scale': scale,
+            'agreement': matching / len(reference),
+            'seconds_per_image': seconds_per_image,
+        })
+
+    return report
+
+
+def calibrate_cascade(directory, cascade_band, scale=1, limit=None):
+    """
+    Porównuje werdykty trybu kaskadowego z pełną analizą i podaje, ile zdjęć rozstrzygnął każdy etap.
+
+    :param directory: Folder ze zdjęciami wzorcowymi.
+    :param cascade_band: Zakres niepewności pierwszego etapu (dolna, górna granica).
+    :param scale: Dzielnik rozdzielczości drugiego etapu.
+    :param limit: Maksymalna liczba analizowanych zdjęć (domyślnie wszystkie).
+    :return: Słownik z kluczami 'agreement', 'stage1', 'stage2', 'seconds_per_image'
+             i 'reference_seconds_per_image' lub None, jeśli folder nie zawiera zdjęć.
+    """
+    image_files = BlurInspector(directory).list_image_files()[:limit]
+    if not image_files:
+        return None
+
+    reference, reference_time = _run_scale(directory, image_files, scale)
+    inspector = BlurInspector(directory, workers=1, scale=scale, use_cache=False,
+                              cascade=True, cascade_band=cascade_band)
+    verdicts, seconds_per_image = _run_inspector(inspector, image_files)
+    matching = sum(1 for a, b in zip(reference, verdicts) if a == b)
+    return {
+        'agreement': matching / len(reference),
+        'stage1': inspector.stage_counts['stage1'],
+        'stage2': inspector.stage_counts['stage2'],
+        'seconds_per_image': seconds_per_image,
+        'reference_seconds_per_image': reference_time,
+    }
+
+
+def recommend_scale(report, min_agreement=0.98):
+    """
+    Wybiera najszybszą skalę, której zgodność z pełną rozdzielczością jest wystarczająca.
+
+    :param report: Wynik funkcji calibrate_scales.
+    :param min_agreement: Minimalny odsetek zgodnych werdyktów (0-1).
+    :return: Dzielnik rozdzielczości.
+    """
+    accepted = [entry for entry in report if entry['agreement'] >= min_agreement]
+    if not accepted:
+        return 1
+    return min(accepted, key=lambda entry: entry['seconds_per_image'])['scale']
+
+
+def _run_scale(directory, image_files, scale):
+    # Pomiar w jednym procesie, żeby czasy nie zależały od obciążenia puli
+    return _run_inspector(BlurInspector(directory, workers=1, scale=scale, use_cache=False), image_files)
+
+
+def _run_inspector(inspector, image_files):
+    start = time.perf_counter()
+    verdicts = [probability > inspector.threshold for _, probability in inspector.iter_results(image_files)]
+    elapsed = time.perf_counter() - start
+    return verdicts, elapsed / len(image_files)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Kalibracja rozdzielczości analizy ostrości.")
+    parser.add_argument("directory", help="Folder ze zdjęciami wzorcowymi")
+    parser.add_argument("--scales", type=int, nargs="+", default=[2, 4, 8], choices=sorted(ANALYSIS_SCALES))
+    parser.add_argument("--limit", type=int, default=None, help="Maksymalna liczba zdjęć")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Wymagana zgodność (0-1)")
+    parser.add_argument("--cascade", type=float, nargs=2, metavar=("LOW", "HIGH"),
+                        help="Sprawdź tryb kaskadowy z podanym zakresem niepewności")
+    args = parser.parse_args()
+
+    if args.cascade:
+        result = calibrate_cascade(args.directory, tuple(args.cascade), limit=args.limit)
+        if result is None:
+            raise SystemExit("Brak zdjęć do kalibracji w folderze.")
+        logging.info(f"Kaskada {args.cascade[0]:g}-{args.cascade[1]:g}: zgodność {result['agreement'] * 100:.2f}%, "
+                     f"pierwszy etap: {result['stage1']}, drugi etap: {result['stage2']}, "
+                     f"{result['seconds_per_image'] * 1000:.1f} ms/zdjęcie "
+                     f"(pełna analiza {result['reference_seconds_per_image'] * 1000:.1f} ms/zdjęcie)")
+        raise SystemExit(0)
+
+    report = calibrate_scales(args.directory, args.scales, args.limit)
+    if not report:
+        logging.info("Brak zdjęć do kalibracji w folderze.")
+    else:
+        for entry in report:
+            logging.info(f"Skala 1/{entry['scale']}: zgodność {entry['agreement'] * 100:.2f}%, "
+                         f"{entry['seconds_per_image'] * 1000:.1f} ms/zdjęcie")
+        logging.info(f"Zalecana skala: 1/{recommend_scale(report, args.min_agreement)}")
@@ -7,19 +7,29 @@ from PyQt5.QtCore import QRect, Qt, QSortFilterProxyModel
 class ColorHandler:
     def __init__(self):
         self.colors = {}
+        self._loaded = None  # (folder, czas modyfikacji colors.json) dla wczytanych kolorów
 
     def load_colors(self, directory):
+        # Plik jest wczytywany ponownie tylko po zmianie folderu lub pliku - get_color jest wołane przy rysowaniu
         json_path = os.path.join(directory, "colors.json")
-        if os.path.exists(json_path):
+        try:
+            mtime_ns = os.stat(json_path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if self._loaded == (directory, mtime_ns):
+            return
+        if mtime_ns is not None:
             with open(json_path, 'r') as f:
                 self.colors = json.load(f)
         else:
             self.colors = {}
+        self._loaded = (directory, mtime_ns)
 
     def save_colors(self, directory):
         json_path = os.path.join(directory, "colors.json")
         with open(json_path, 'w') as f:
             json.dump(self.colors, f)
+        self._loaded = (directory, os.stat(json_path).st_mtime_ns)
 
     def set_color(self, image_path, color):
         directory = os.path.dirname(image_path)
@@ -1,61 +1,131 @@
 import exifread
+from exifread.tags import DEFAULT_STOP_TAG
+
+# Liczba bajtów z początku pliku czytanych jednym odczytem przy odczycie wybranych pól EXIF.
+# EXIF w JPEG mieści się w segmencie APP1 (do 64 kB), a w plikach RAW katalogi EXIF i MakerNote
+# leżą zwykle na początku pliku; dalsze fragmenty są doczytywane tylko w razie potrzeby
+EXIF_HEADER_BYTES = 64 * 1024
+
+# Głębokość odczytu metadanych: pierwszy katalog (IFD0), katalog EXIF, MakerNote producenta
+IFD0, EXIF_IFD, MAKER_NOTE = range(3)
+
+# Znacznik ExifOffset - wskazuje katalog EXIF, więc odczyt IFD0 nie może się przed nim zatrzymać
+EXIF_OFFSET_TAG = 0x8769
+
+# Pola dostępne w read_exif_fields: nazwa -> (głębokość odczytu, numer i nazwa znacznika w katalogu, klucze exifread)
+EXIF_FIELDS = {
+    'Make': (IFD0, 0x010F, 'Make', ('Image Make',)),
+    'Model': (IFD0, 0x0110, 'Model', ('Image Model',)),
+    'Orientation': (IFD0, 0x0112, 'Orientation', ('Image Orientation',)),
+    'DateTime': (IFD0, 0x0132, 'DateTime', ('Image DateTime',)),
+    'ExposureTime': (EXIF_IFD, 0x829A, 'ExposureTime', ('EXIF ExposureTime',)),
+    'FNumber': (EXIF_IFD, 0x829D, 'FNumber', ('EXIF FNumber',)),
+    'ISO': (EXIF_IFD, 0x8827, 'ISOSpeedRatings', ('EXIF ISOSpeedRatings',)),
+    'DateTimeOriginal': (EXIF_IFD, 0x9003, 'DateTimeOriginal', ('EXIF DateTimeOriginal',)),
+    'FocalLength': (EXIF_IFD, 0x920A, 'FocalLength', ('EXIF FocalLength',)),
+    'ExifImageWidth': (EXIF_IFD, 0xA002, 'ExifImageWidth', ('EXIF ExifImageWidth',)),
+    'ExifImageLength': (EXIF_IFD, 0xA003, 'ExifImageLength', ('EXIF ExifImageLength',)),
+    'SerialNumber': (EXIF_IFD, 0xA431, 'BodySerialNumber', ('EXIF BodySerialNumber',)),
+    'LensModel': (EXIF_IFD, 0xA434, 'LensModel', ('EXIF LensModel',)),
+    'MakerSerialNumber': (MAKER_NOTE, 0x927C, 'MakerNote', ('MakerNote SerialNumber',)),
+    'ShutterCount': (MAKER_NOTE, 0x927C, 'MakerNote', ()),  # Znacznik zależy od producenta - patrz get_shutter_count
+}
+
+# Znaczniki licznika migawki według producenta (pierwsze słowo znacznika Make, małymi literami).
+# Nienazwane znaczniki exifread zapisuje jako 'Tag 0x' z wielkimi literami szesnastkowymi
+SHUTTER_COUNT_TAGS = {
+    'canon': ('MakerNote Tag 0x0093', 'MakerNote Tag 0x0095'),
+    'nikon': ('MakerNote Tag 0x00A7', 'MakerNote TotalShutterReleases'),
+    'sony': ('MakerNote Tag 0x9404', 'MakerNote Tag 0x9405'),
+    'fujifilm': ('MakerNote Tag 0x00B4',),
+}
+
+# Znaczniki licznika migawki sprawdzane dla wszystkich producentów
+GENERIC_SHUTTER_COUNT_TAGS = (
+    'MakerNote ShutterCount',
+    'EXIF ShutterCount',  # Najczęstszy tag dla liczników migawki
+    'Image ImageNumber',  # Alternatywny tag dla liczników migawki
+)
 
 
 def get_shutter_count(tags):
     """
-    Próbuje odczytać wartość licznika migawki z danych EXIF.
+    Próbuje odczytać wartość licznika migawki z danych EXIF. Znaczniki MakerNote są wybierane
+    według producenta aparatu (znacznik Make), bo ten sam numer u różnych producentów oznacza co innego.
 
     :param tags: Słownik z tagami EXIF.
     :return: Wartość licznika migawki lub 'Not Available' jeśli nie znaleziono.
     """
-    # Specyficzne tagi dla różnych marek aparatów
-    shutter_count_tags = {
-        'Canon': ['MakerNote ShutterCount', 'MakerNote Tag 0x0093', 'MakerNote Tag 0x0095'],
-        'Nikon': ['MakerNote ShutterCount', 'MakerNote Tag 0x00a7', 'MakerNote TotalShutterReleases'],
-        'Sony': ['MakerNote ShutterCount', 'MakerNote Tag 0x9404', 'MakerNote Tag 0x9405'],
-        'Fujifilm': ['MakerNote ShutterCount', 'MakerNote Tag 0x00b4'],
-        'Panasonic': ['MakerNote ShutterCount'],
-        'Olympus': ['MakerNote ShutterCount'],
-        'Leica': ['MakerNote ShutterCount'],
-        'Pentax': ['MakerNote ShutterCount'],
-        'Sigma': ['MakerNote ShutterCount'],
-        'Hasselblad': ['MakerNote ShutterCount'],
-        'Ricoh': ['MakerNote ShutterCount'],
-        'Casio': ['MakerNote ShutterCount'],
-        'Kodak': ['MakerNote ShutterCount'],
-        'Samsung': ['MakerNote ShutterCount'],
-        'GoPro': ['MakerNote ShutterCount'],
-        'DJI': ['MakerNote ShutterCount'],
-    }
-
-    # Próba odczytu liczników migawki dla różnych marek
-    for brand, tags_list in shutter_count_tags.items():
-        for tag in tags_list:
-            if tag in tags:
-                return str(tags[tag])
-
-    # Ogólne tagi dla liczników migawki, jeśli specyficzne tagi nie zostały znalezione
-    generic_tags = [
-        'EXIF ShutterCount',  # Najczęstszy tag dla liczników migawki
-        'Image ImageNumber',  # Alternatywny tag dla liczników migawki
-    ]
-
-    for tag in generic_tags:
+    make = str(tags.get('Image Make', '')).strip().lower()
+    brand = make.split()[0] if make else ''
+    for tag in SHUTTER_COUNT_TAGS.get(brand, ()) + GENERIC_SHUTTER_COUNT_TAGS:
         if tag in tags:
             return str(tags[tag])
 
     return 'Not Available'
 
 
-def get_exif_data(image_path):
+def read_exif_fields(image_path, fields, record=None):
+    """
+    Odczytuje tylko wybrane pola EXIF. Czytane są wyłącznie potrzebne katalogi: bez MakerNote
+    (details=False), jeśli żadne pole jej nie wymaga, z przerwaniem katalogu po ostatnim potrzebnym
+    znaczniku (stop_tag) i bez miniatury. Plik jest czytany jednym ograniczonym odczytem początku
+    (EXIF_HEADER_BYTES), więc masowy odczyt folderu czyta kilobajty na plik, a nie całe pliki.
+
+    :param image_path: Ścieżka do pliku obrazu.
+    :param fields: Nazwy pól z EXIF_FIELDS, np. ('Make', 'Model', 'SerialNumber', 'ShutterCount').
+    :param record: Opcjonalny FileRecord tego pliku - metadane są wtedy czytane ze wspólnego bufora.
+    :return: Słownik {nazwa pola: wartość tekstowa lub None}.
+    """
+    if not fields:
+        return {}
+    specs = {field: EXIF_FIELDS[field] for field in fields}
+    depth = max((spec[0] for spec in specs.values()), default=IFD0)
+    if MAKER_NOTE in (spec[0] for spec in specs.values()):
+        specs.setdefault('Make', EXIF_FIELDS['Make'])  # Potrzebny do wyboru znacznika licznika migawki
+
+    # Znaczniki w katalogu są posortowane rosnąco, więc można przerwać po najwyższym potrzebnym
+    # (stop_tag działa w każdym katalogu). W katalogu EXIF tylko wtedy, gdy znacznik leży za
+    # ExifOffset - inaczej odczyt IFD0 mógłby się zatrzymać przed wskazaniem katalogu EXIF
+    stop_levels = (IFD0,) if depth == IFD0 else (EXIF_IFD, MAKER_NOTE)
+    _, stop_number, stop_name, _ = max((spec for spec in specs.values() if spec[0] in stop_levels),
+                                       key=lambda spec: spec[1])
+    stop_tag = stop_name if depth == IFD0 or stop_number > EXIF_OFFSET_TAG else DEFAULT_STOP_TAG
+
+    options = dict(stop_tag=stop_tag, details=(depth == MAKER_NOTE), extract_thumbnail=False)
+    if record is not None:
+        tags = exifread.process_file(record.stream(), **options)
+    else:
+        # Bufor o rozmiarze EXIF_HEADER_BYTES - początek pliku jest czytany jednym odczytem,
+        # a skoki exifread w jego obrębie nie sięgają już do dysku
+        with open(image_path, 'rb', buffering=EXIF_HEADER_BYTES) as image_file:
+            tags = exifread.process_file(image_file, **options)
+
+    result = {}
+    for field in fields:
+        if field == 'ShutterCount':
+            shutter_count = get_shutter_count(tags)
+            result[field] = shutter_count if shutter_count != 'Not Available' else None
+            continue
+        keys = [key for key in EXIF_FIELDS[field][3] if key in tags]
+        result[field] = str(tags[keys[0]]) if keys else None
+    return result
+
+
+def get_exif_data(image_path, record=None):
     """
     Odczytuje dane EXIF z podanego pliku obrazu.
 
     :param image_path: Ścieżka do pliku obrazu.
+    :param record: Opcjonalny FileRecord tego pliku - znaczniki są wtedy brane z rekordu
+                   (odczytane raz dla wszystkich odbiorców).
     :return: Słownik z danymi EXIF.
     """
-    with open(image_path, 'rb') as image_file:
-        tags = exifread.process_file(image_file)
+    if record is not None:
+        tags = record.tags
+    else:
+        with open(image_path, 'rb') as image_file:
+            tags = exifread.process_file(image_file)
 
     exif_data = {tag: str(tags[tag]) for tag in tags}
 
@@ -0,0 +1,159 @@
+import os
+import logging
+import itertools
+import concurrent.futures
+from PIL import Image
+from Utils.image_handler import develop_raw, exif_orientation, fit_image, is_transposed, ORIENTATION_TAG, \
+    ORIENTATION_TRANSPOSE, RAW_FLIP_ORIENTATION, RAW_FAST, RAW_FULL
+from Utils.file_inspector import inspect_file
+from Utils.image_formats import identify_format, open_image, image_extensions
+
+# Domyślna jakość zapisu JPEG (1-100)
+DEFAULT_QUALITY = 90
+
+# Rozszerzenia plików, które można eksportować - wszystkie formaty z rejestru dekoderów
+EXPORT_EXTENSIONS = image_extensions()
+
+
+def export_targets(image_paths, output_dir):
+    """
+    Ustala nazwy plików wynikowych, unikalne w całej partii i względem plików, które już są
+    w folderze wynikowym - równoległe zadania nie piszą do tego samego pliku, a wcześniejsze
+    eksporty nie są nadpisywane. Pliki o tej samej nazwie i różnych rozszerzeniach (np. zdjecie.nef
+    i zdjecie.jpg) dostają w nazwie rozszerzenie oryginału; pozostałe powtórzenia (np. IMG_0001.JPG
+    z dwóch kart) - kolejny numer (IMG_0001_2.jpg). Nazwy są porównywane bez rozróżniania wielkości liter.
+
+    :param image_paths: Lista ścieżek do eksportowanych plików.
+    :param output_dir: Folder wynikowy.
+    :return: Lista ścieżek plików JPEG w folderze wynikowym, w kolejności image_paths.
+    """
+    stems = [os.path.splitext(os.path.basename(path)) for path in image_paths]
+    extensions = {}
+    for stem, extension in stems:
+        extensions.setdefault(stem.lower(), set()).add(extension.lower())
+    taken = {name.lower() for name in os.listdir(output_dir)} if os.path.isdir(output_dir) else set()
+
+    targets = []
+    for stem, extension in stems:
+        base = stem if len(extensions[stem.lower()]) == 1 else f"{stem}_{extension[1:]}"
+        name, number = f"{base}.jpg", 2
+        while name.lower() in taken or f"{name}.tmp".lower() in taken:
+            name, number = f"{base}_{number}.jpg", number + 1
+        taken.add(name.lower())
+        targets.append(os.path.join(output_dir, name))
+    return targets
+
+
+def raw_export_tier(raw, max_size):
+    """
+    Wybiera jakość wywołania pliku RAW do eksportu: wywołanie w połowie rozdzielczości (half_size)
+    wystarcza, gdy zdjęcie i tak zostanie zmniejszone co najmniej dwukrotnie.
+
+    :param raw: Plik RAW otwarty przez rawpy.
+    :param max_size: Rozmiar, w którym ma się zmieścić zdjęcie (szerokość, wysokość); None - pełna rozdzielczość.
+    :return: RAW_FAST lub RAW_FULL.
+    """
+    if not max_size:
+        return RAW_FULL
+    width, height = raw.sizes.width, raw.sizes.height
+    if is_transposed(RAW_FLIP_ORIENTATION.get(raw.sizes.flip, 1)):
+        width, height = height, width
+    return RAW_FAST if min(max_size[0] / width, max_size[1] / height) <= 0.5 else RAW_FULL
+
+
+def export_image(image_path, target_path, max_size=None, quality=DEFAULT_QUALITY, raw_tier=None):
+    """
+    Zapisuje zdjęcie jako JPEG, opcjonalnie zmniejszone. Oryginał nie jest zmieniany.
+
+    JPEG jest dekodowany od razu w zmniejszonej skali (draft), a końcowe skalowanie używa filtru
+    Lanczosa. Orientacja EXIF jest nanoszona na piksele bezstratnie (transpose), a znacznik
+    Orientation usuwany z zapisanych metadanych. Plik wynikowy pojawia się dopiero po pełnym zapisie.
+
+    :param image_path: Ścieżka do pliku graficznego (także RAW).
+    :param target_path: Ścieżka pliku wynikowego.
+    :param max_size: Rozmiar, w którym ma się zmieścić zdjęcie (szerokość, wysokość); None - pełna rozdzielczość.
+    :param quality: Jakość JPEG (1-100).
+    :param raw_tier: Jakość wywołania plików RAW; None - dobierana do max_size (patrz raw_export_tier).
+    :return: Ścieżka pliku wynikowego.
+    """
+    if os.path.abspath(image_path) == os.path.abspath(target_path):
+        raise ValueError(f"Eksport nadpisałby oryginał: {image_path}")
+
+    image_format = identify_format(image_path)
+    if image_format is not None and image_format.is_raw:
+        # Wywołanie na potrzeby eksportu nie trafia do pamięci podręcznej na dysku
+        with inspect_file(image_path) as record:
+            tier = raw_tier or raw_export_tier(record.raw, max_size)
+            image = develop_raw(image_path, tier, use_cache=False, record=record)
+    else:
+        image = open_image(image_path, image_format)
+
+    with image:
+        orientation = exif_orientation(image)
+        exif = image.getexif()
+        exif.pop(ORIENTATION_TAG, None)
+        icc_profile = image.info.get('icc_profile')
+
+        resized = fit_image(image, max_size, orientation, Image.LANCZOS)
+        if resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        if orientation in ORIENTATION_TRANSPOSE:
+            resized = resized.transpose(ORIENTATION_TRANSPOSE[orientation])
+
+        temporary_path = target_path + ".tmp"
+        try:
+            resized.save(temporary_path, 'JPEG', quality=quality, exif=exif.tobytes(), icc_profile=icc_profile)
+            os.replace(temporary_path, target_path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+    return target_path
+
+
+def export_images(image_paths, output_dir, max_size=None, quality=DEFAULT_QUALITY, workers=None,
+                  cancel_callback=None):
+    """
+    Eksportuje zdjęcia do osobnego folderu w puli procesów (domyślnie na wszystkich rdzeniach).
+
+    Liczba zadań w toku jest ograniczona, więc pamięć nie rośnie z liczbą plików. Błąd jednego pliku
+    nie przerywa eksportu. Oryginały nie są zmieniane - folder wynikowy musi być inny niż foldery źródłowe.
+
+    :param image_paths: Lista ścieżek do eksportowanych plików.
+    :param output_dir: Folder wynikowy (zostanie utworzony, jeśli nie istnieje).
+    :param max_size: Rozmiar, w którym ma się zmieścić zdjęcie (szerokość, wysokość); None - pełna rozdzielczość.
+    :param quality: Jakość JPEG (1-100).
+    :param workers: Liczba procesów (domyślnie liczba rdzeni).
+    :param cancel_callback: Funkcja zwracająca True, gdy eksport należy przerwać.
+    :return: Generator krotek (ścieżka źródłowa, ścieżka wynikowa lub None, komunikat błędu lub None)
+             w kolejności zakończenia.
+    """
+    output_dir = os.path.abspath(output_dir)
+    if any(os.path.dirname(os.path.abspath(path)) == output_dir for path in image_paths):
+        raise ValueError("Folder wynikowy musi być inny niż folder ze zdjęciami.")
+    os.makedirs(output_dir, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    targets = export_targets(image_paths, output_dir)
+    # Zadania z tym samym plikiem wynikowym nadpisywałyby się nawzajem (wspólny plik .tmp)
+    if len({target.lower() for target in targets}) != len(targets):
+        raise ValueError("Nazwy plików wynikowych się powtarzają.")
+    jobs = zip(image_paths, targets)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(export_image, path, target, max_size, quality): path
+                   for path, target in itertools.islice(jobs, workers * 2)}
+        while pending:
+            if cancel_callback is not None and cancel_callback():
+                return
+            done, _ = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                for next_path, next_target in itertools.islice(jobs, 1):
+                    pending[executor.submit(export_image, next_path, next_target, max_size, quality)] = next_path
+                try:
+                    yield path, future.result(), None
+                except Exception as e:
+                    logging.warning(f"Nie udało się wyeksportować {path}: {e}")
+                    yield path, None, str(e)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -4,7 +4,8 @@ import logging
 import concurrent.futures
 from PIL import Image, UnidentifiedImageError
 from PIL.ExifTags import TAGS
-import exifread
+from Utils.file_inspector import inspect_file
+from Utils.exif_handler import read_exif_fields
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -14,9 +15,12 @@ class FileContinuityChecker:
         self.progress_callback = progress_callback
         self.status_callback = status_callback
 
-    def get_exif_data(self, image_path):
+    def get_exif_data(self, image_path, record=None):
         try:
-            image = Image.open(image_path)
+            if record is not None:
+                image = Image.open(record.stream())  # Tylko nagłówek, ze wspólnego bufora
+            else:
+                image = Image.open(image_path)
             exif_data = image.tag_v2 if hasattr(image, 'tag_v2') else image._getexif()
 
             if not exif_data:
@@ -30,22 +34,17 @@ class FileContinuityChecker:
             logging.error(f"Error reading EXIF data from {image_path}: {e}")
             return "Unknown Model", "Unknown Serial Number"
 
-    def get_exif_data_raw(self, image_path):
+    def get_exif_data_raw(self, image_path, record=None):
         try:
-            with open(image_path, 'rb') as f:
-                tags = exifread.process_file(f)
-                model = tags.get('Image Model', 'Unknown Model')
-                serial_number = tags.get('EXIF BodySerialNumber', 'Unknown Serial Number')
-
-                if 'Image Make' in tags and 'Sony' in tags['Image Make'].values:
-                    model = tags.get('Image Model', 'Unknown Model')
-                    serial_number = tags.get('MakerNote SerialNumber', 'Unknown Serial Number')
-
-                if isinstance(model, exifread.classes.IfdTag):
-                    model = model.printable
-                if isinstance(serial_number, exifread.classes.IfdTag):
-                    serial_number = serial_number.printable
-                return model, serial_number
+            # Tylko potrzebne pola - bez MakerNote i bez czytania całego pliku
+            fields = read_exif_fields(image_path, ('Make', 'Model', 'SerialNumber'), record)
+            model = fields['Model'] or 'Unknown Model'
+            serial_number = fields['SerialNumber'] or 'Unknown Serial Number'
+
+            if fields['Make'] and 'Sony' in fields['Make']:
+                serial_number = read_exif_fields(image_path, ('MakerSerialNumber',), record)['MakerSerialNumber'] \
+                    or 'Unknown Serial Number'
+            return model, serial_number
         except Exception as e:
             logging.error(f"Error reading EXIF data from {image_path}: {e}")
             return "Unknown Model", "Unknown Serial Number"
@@ -60,10 +59,18 @@ class FileContinuityChecker:
             return None  # Ignoruj pliki nie będące obrazami
 
         ext = os.path.splitext(file)[1].lower()
-        if ext in ['.raw', '.nef', '.cr2', '.arw', '.dng', '.tiff']:
-            model, serial_number = self.get_exif_data_raw(os.path.join(self.directory, file))
-        else:
-            model, serial_number = self.get_exif_data(os.path.join(self.directory, file))
+        file_path = os.path.join(self.directory, file)
+        try:
+            record = inspect_file(file_path)
+        except OSError as e:
+            logging.error(f"Error reading EXIF data from {file_path}: {e}")
+            return (file, "Unknown Model", "Unknown Serial Number", ext)
+        with record:
+            # Kontenery TIFF (także RAW) czyta exifread; format rozpoznany z nagłówka
+            if record.is_raw or (record.format is not None and record.format.name == 'tiff'):
+                model, serial_number = self.get_exif_data_raw(file_path, record)
+            else:
+                model, serial_number = self.get_exif_data(file_path, record)
         return (file, model, serial_number, ext)
 
     def check_continuity(self):
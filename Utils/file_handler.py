@@ -1,11 +1,13 @@
 import rawpy
-from PIL import Image
 import os
+from Utils import image_handler
+from Utils.image_handler import develop_raw, RAW_FULL
 
 
 def load_image(file_path):
     """
     Ładuje obraz z podanej ścieżki do pliku. Obsługuje formaty RAW, JPEG, PNG i GIF.
+    Format jest rozpoznawany z nagłówka pliku (Utils.image_formats), pliki RAW są wywoływane w pełnej jakości.
 
     :param file_path: Ścieżka do pliku graficznego.
     :return: Obiekt Image z biblioteki PIL.
@@ -18,44 +20,28 @@ def load_image(file_path):
     if not os.access(file_path, os.R_OK):
         raise PermissionError(f"Brak uprawnień do odczytu pliku: {file_path}")
 
-    # Pobierz rozszerzenie pliku i zamień na małe litery
-    extension = os.path.splitext(file_path)[1].lower()
+    # Wybór dekodera (rawpy lub Pillow) należy do wspólnego rejestru formatów
+    return image_handler.load_image(file_path, RAW_FULL, use_cache=False)
 
-    # Sprawdź, czy rozszerzenie jest jednym z obsługiwanych formatów RAW
-    if extension in ['.raw', '.nef', '.cr2', '.arw', '.dng', '.tiff']:  # Popularne rozszerzenia plików RAW
-        return load_raw_image(file_path)
-    else:
-        # Otwórz plik za pomocą biblioteki Pillow
-        return Image.open(file_path)
 
-    # Odczytaj dane EXIF
-    exif_data = get_exif_data(file_path)
-
-
-
-def load_raw_image(file_path):
+def load_raw_image(file_path, tier=RAW_FULL):
     """
     Ładuje i przetwarza plik obrazu RAW.
 
     :param file_path: Ścieżka do pliku obrazu RAW.
+    :param tier: Jakość wywołania (RAW_PREVIEW, RAW_FAST lub RAW_FULL).
     :return: Obiekt Image z biblioteki PIL.
     """
     # Dodaj debugowanie
     print(f"Próba otwarcia pliku RAW: {file_path}")
 
-    # Otwórz plik RAW za pomocą biblioteki rawpy
+    # Otwórz i wywołaj plik RAW za pomocą biblioteki rawpy
     try:
-        raw = rawpy.imread(file_path)
+        return develop_raw(file_path, tier, use_cache=False)
     except rawpy._rawpy.LibRawIOError as e:
         print(f"Błąd podczas otwierania pliku RAW: {e}")
         raise
 
-    # Przetwórz obraz do formatu RGB
-    rgb_image = raw.postprocess()
-
-    # Konwertuj przetworzony obraz na obiekt Image z Pillow
-    return Image.fromarray(rgb_image)
-
 
 def save_image(image, path):
     """
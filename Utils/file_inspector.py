@@ -0,0 +1,211 @@
+import os
+import io
+import mmap
+import logging
+import exifread
+import rawpy
+from PIL import UnidentifiedImageError
+from Utils.image_handler import RAW_FLIP_ORIENTATION, exif_orientation
+from Utils.image_formats import identify_format, open_image, SNIFF_BYTES
+
+
+class _BufferReader(io.RawIOBase):
+    # Strumień tylko do odczytu na wspólnym buforze, z własną pozycją - odbiorcy sobie nie przeszkadzają
+    def __init__(self, buffer):
+        super().__init__()
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, target):
+        chunk = self._view[self._position:self._position + len(target)]
+        target[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+class FileRecord:
+    """
+    Jednokrotny odczyt pliku graficznego, wspólny dla kroków, które przetwarzają plik w jednym
+    przebiegu: obu etapów kaskady ostrości, sprawdzania ciągłości i indeksu metadanych.
+    Przeglądarka zdjęć i miniatury z niego nie korzystają - podgląd, obraz ekranowy i tabela EXIF
+    są wczytywane w różnych wątkach i w różnym czasie, a rekord nie jest bezpieczny wątkowo;
+    miniatura zwykle pochodzi z pamięci podręcznej na dysku, więc plik nie jest nawet otwierany.
+
+    Plik jest mapowany do pamięci (mmap), więc z dysku czytane są tylko fragmenty, których
+    ktoś faktycznie potrzebuje (np. same nagłówki przy odczycie EXIF), a kolejni odbiorcy
+    korzystają z tego samego bufora zamiast otwierać plik od nowa. Wyjątkiem są pliki RAW:
+    LibRaw otwiera je po ścieżce i sam czyta potrzebne fragmenty (strony odczytane już przez
+    mapę pochodzą z pamięci podręcznej systemu). Metadane, osadzony podgląd i wymiary są
+    wyznaczane przy pierwszym użyciu i zapamiętywane.
+
+    Obiekt nie jest bezpieczny wątkowo. Obrazy PIL otwarte na buforze muszą zostać wczytane
+    (load) przed zamknięciem rekordu.
+    """
+
+    def __init__(self, image_path):
+        """
+        :param image_path: Ścieżka do pliku graficznego.
+        """
+        self.path = image_path
+        self._file = open(image_path, 'rb')
+        try:
+            stat = os.fstat(self._file.fileno())
+            self.size = stat.st_size
+            self.mtime_ns = stat.st_mtime_ns
+            # Pustego pliku nie da się zmapować
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+        # Format jest rozpoznawany z nagłówka w buforze, więc nie wymaga osobnego odczytu
+        self.format = identify_format(image_path, self.buffer[:SNIFF_BYTES])
+        self.is_raw = self.format is not None and self.format.is_raw
+        self._streams = []  # Strumienie zamykane razem z rekordem (widoki blokują zamknięcie mmap)
+        self._tags = None
+        self._raw = None
+        self._header = None
+        self._preview = None
+        self._preview_read = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def stream(self):
+        """
+        Zwraca nowy obiekt plikowy na wspólnym buforze, ustawiony na początek - bez kopiowania danych.
+        Każdy odbiorca dostaje własny strumień z niezależną pozycją.
+
+        :return: Obiekt plikowy tylko do odczytu.
+        """
+        stream = io.BufferedReader(_BufferReader(self.buffer))
+        self._streams.append(stream)
+        return stream
+
+    @property
+    def tags(self):
+        """
+        Znaczniki EXIF odczytane przez exifread (razem z MakerNote).
+
+        :return: Słownik {nazwa znacznika: IfdTag}; pusty, jeśli pliku nie udało się odczytać.
+        """
+        if self._tags is None:
+            try:
+                self._tags = exifread.process_file(self.stream())
+            except Exception as e:
+                logging.debug(f"Nie udało się odczytać EXIF z {self.path}: {e}")
+                self._tags = {}
+        return self._tags
+
+    @property
+    def raw(self):
+        """
+        Plik RAW otwarty przez rawpy (tylko dla plików RAW). Przekazanie bufora kopiowałoby cały
+        plik, więc LibRaw otwiera go po ścieżce i czyta tylko to, czego potrzebuje.
+
+        :return: Obiekt rawpy.RawPy.
+        """
+        if self._raw is None:
+            self._raw = rawpy.imread(self.path)
+        return self._raw
+
+    @property
+    def preview(self):
+        """
+        Osadzony podgląd pliku RAW.
+
+        :return: Obiekt rawpy Thumbnail lub None (brak podglądu albo plik nie jest RAW).
+        """
+        if not self._preview_read:
+            self._preview_read = True
+            if self.is_raw:
+                try:
+                    self._preview = self.raw.extract_thumb()
+                except (rawpy._rawpy.LibRawNoThumbnailError, rawpy._rawpy.LibRawUnsupportedThumbnailError):
+                    self._preview = None
+        return self._preview
+
+    @property
+    def dimensions(self):
+        """
+        Wymiary pełnego obrazu w orientacji aparatu, odczytane z nagłówka (bez dekodowania pikseli).
+
+        :return: Krotka (szerokość, wysokość) lub None.
+        """
+        if self.is_raw:
+            return self.raw.sizes.width, self.raw.sizes.height
+        header = self._image_header()
+        return header.size if header is not None else None
+
+    @property
+    def orientation(self):
+        """
+        Orientacja zdjęcia jako wartość znacznika EXIF Orientation (dla RAW - orientacja z LibRaw).
+
+        :return: Wartość znacznika lub None.
+        """
+        if self.is_raw:
+            return RAW_FLIP_ORIENTATION.get(self.raw.sizes.flip, 1)
+        header = self._image_header()
+        return exif_orientation(header) if header is not None else None
+
+    def close(self):
+        if self._raw is not None:
+            self._raw.close()
+            self._raw = None
+        if self._header is not None:
+            self._header.close()
+            self._header = None
+        for stream in self._streams:
+            stream.close()
+        self._streams = []
+        if self.size:
+            try:
+                self.buffer.close()
+            except BufferError:
+                # Odbiorca wciąż trzyma widok na bufor (np. tablicę NumPy) - mapa zniknie razem z nim
+                logging.debug(f"Bufor pliku {self.path} jest nadal używany")
+        self._file.close()
+
+    def _image_header(self):
+        # Otwarcie czyta tylko nagłówek; piksele nie są dekodowane
+        if self._header is None:
+            try:
+                self._header = open_image(self.stream(), self.format)
+            except (UnidentifiedImageError, OSError) as e:
+                logging.debug(f"Nie udało się odczytać nagłówka {self.path}: {e}")
+                return None
+        return self._header
+
+
+def inspect_file(image_path):
+    """
+    Otwiera plik do jednokrotnego odczytu przez kolejne kroki jego przetwarzania. Najlepiej używać w bloku with.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :return: Obiekt FileRecord.
+    """
+    return FileRecord(image_path)
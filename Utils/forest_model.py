@@ -0,0 +1,167 @@
+import argparse
+import logging
+import numpy as np
+
+# Wersja układu tablic w pliku .npz
+FORMAT_VERSION = 1
+
+
+class ForestModel:
+    """
+    Las decyzyjny zapisany jako płaskie tablice NumPy.
+
+    Wszystkie drzewa są sklejone w jedną tablicę węzłów. Liście wskazują same na siebie,
+    dzięki czemu cała macierz cech przechodzi przez wszystkie drzewa naraz, w stałej
+    liczbie kroków równej głębokości lasu. Do działania wystarcza NumPy.
+    """
+
+    def __init__(self, feature, threshold, children_left, children_right, value, roots, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = _forest_depth(children_left, children_right, roots)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Wczytuje model z pliku .npz zapisanego przez export_forest.
+
+        :param path: Ścieżka do pliku .npz.
+        :return: Obiekt ForestModel.
+        """
+        with np.load(path) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"Nieobsługiwana wersja pliku modelu: {path}")
+            return cls(data['feature'], data['threshold'], data['children_left'], data['children_right'],
+                       data['value'], data['roots'], data['classes'])
+
+    def predict_proba(self, X):
+        """
+        Oblicza prawdopodobieństwa klas dla całej macierzy cech.
+
+        :param X: Macierz cech o wymiarach (liczba próbek, liczba cech).
+        :return: Macierz prawdopodobieństw o wymiarach (liczba próbek, liczba klas).
+        """
+        # scikit-learn porównuje cechy w float32, więc robimy to samo
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.children_left[nodes], self.children_right[nodes])
+        return self.value[nodes].mean(axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def export_forest(clf, path):
+    """
+    Spłaszcza wytrenowany RandomForestClassifier do tablic NumPy i zapisuje je jako .npz.
+
+    :param clf: Wytrenowany klasyfikator scikit-learn.
+    :param path: Ścieżka do pliku wynikowego .npz.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in clf.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        # Liście wskazują same na siebie i sprawdzają dowolną cechę (wynik porównania nie ma znaczenia)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+        value = tree.value[:, 0, :].astype(np.float64)
+        values.append(value / value.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        offset += tree.node_count
+
+    np.savez(
+        path,
+        format_version=FORMAT_VERSION,
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=np.concatenate(thresholds),
+        children_left=np.concatenate(lefts).astype(np.intp),
+        children_right=np.concatenate(rights).astype(np.intp),
+        value=np.concatenate(values),
+        roots=np.array(roots, dtype=np.intp),
+        classes=np.asarray(clf.classes_),
+    )
+
+
+def verify_equivalence(clf, model, X):
+    """
+    Porównuje wyniki modelu NumPy z predict_proba oryginalnego klasyfikatora.
+
+    :param clf: Wytrenowany klasyfikator scikit-learn.
+    :param model: Obiekt ForestModel wyeksportowany z tego klasyfikatora.
+    :param X: Macierz cech do porównania.
+    :return: Największa bezwzględna różnica prawdopodobieństw.
+    """
+    if not np.array_equal(np.asarray(clf.classes_), model.classes_):
+        raise ValueError("Klasy modeli nie są zgodne.")
+    return float(np.max(np.abs(clf.predict_proba(X) - model.predict_proba(X))))
+
+
+def _forest_depth(children_left, children_right, roots):
+    # Głębokość najgłębszego drzewa; liście wskazują same na siebie
+    depth = 0
+    nodes = np.asarray(roots)
+    while True:
+        inner = nodes[children_left[nodes] != nodes]
+        if len(inner) == 0:
+            return depth
+        nodes = np.concatenate([children_left[inner], children_right[inner]])
+        depth += 1
+
+
+def _sample_features(clf, count, seed=0):
+    # Próbki pokrywające progi wszystkich drzew, w tym wartości dokładnie równe progom
+    rng = np.random.default_rng(seed)
+    n_features = clf.n_features_in_
+    thresholds = [[] for _ in range(n_features)]
+    for estimator in clf.estimators_:
+        tree = estimator.tree_
+        for f, t in zip(tree.feature, tree.threshold):
+            if f >= 0:
+                thresholds[f].append(t)
+
+    X = np.empty((count, n_features))
+    for f in range(n_features):
+        values = np.asarray(thresholds[f]) if thresholds[f] else np.zeros(1)
+        low, high = values.min(), values.max()
+        span = max(high - low, 1.0)
+        X[:, f] = rng.uniform(low - span, high + span, count)
+        X[:count // 4, f] = rng.choice(values, count // 4)
+    return X
+
+
+if __name__ == "__main__":
+    import joblib
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Eksport klasyfikatora ostrości do tablic NumPy.")
+    parser.add_argument("source", help="Plik .pkl z klasyfikatorem scikit-learn")
+    parser.add_argument("target", help="Plik wynikowy .npz")
+    parser.add_argument("--samples", type=int, default=100000, help="Liczba próbek do sprawdzenia zgodności")
+    args = parser.parse_args()
+
+    clf = joblib.load(args.source)
+    export_forest(clf, args.target)
+    model = ForestModel.load(args.target)
+
+    difference = verify_equivalence(clf, model, _sample_features(clf, args.samples))
+    logging.info(f"Zapisano {args.target}: {len(model.roots)} drzew, {len(model.feature)} węzłów, "
+                 f"głębokość {model.max_depth}.")
+    logging.info(f"Największa różnica względem predict_proba: {difference:.2e}")
+    if difference > 1e-9:
+        raise SystemExit("Model NumPy nie jest zgodny z oryginalnym klasyfikatorem.")
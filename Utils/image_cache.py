@@ -0,0 +1,160 @@
+import logging
+import threading
+import concurrent.futures
+from collections import OrderedDict
+
+# Domyślny limit pamięci na zdekodowane obrazy (w bajtach)
+DEFAULT_MAX_BYTES = 1024 * 2 ** 20
+
+
+class ImageCache:
+    """
+    Pamięć podręczna LRU zdekodowanych obrazów z limitem pamięci i wczytywaniem w tle.
+
+    Obrazy są wczytywane przez podaną funkcję w puli wątków. Gdy suma rozmiarów przekracza
+    limit, usuwane są najdawniej używane obrazy. Obraz większy niż cały limit nie jest odrzucany
+    (zdekodowany na próżno) - zostaje w pamięci sam, do czasu zapisania kolejnego. Obraz, który
+    jest jeszcze wczytywany w tle, nie jest dekodowany drugi raz - get czeka na wynik rozpoczętego zadania.
+    """
+
+    def __init__(self, loader, size_of, max_bytes=DEFAULT_MAX_BYTES, workers=2, on_loaded=None):
+        """
+        :param loader: Funkcja wczytująca obraz na podstawie klucza (np. ścieżki); może zwrócić None.
+        :param size_of: Funkcja zwracająca rozmiar obrazu w bajtach.
+        :param max_bytes: Limit pamięci na przechowywane obrazy.
+        :param workers: Liczba wątków wczytujących obrazy w tle.
+        :param on_loaded: Opcjonalna funkcja wywoływana z kluczem po wczytaniu obrazu w tle
+                          (z wątku roboczego, nie z wątku GUI).
+        """
+        self.loader = loader
+        self.size_of = size_of
+        self.max_bytes = max_bytes
+        self.on_loaded = on_loaded
+        self._items = OrderedDict()  # {klucz: (obraz, rozmiar w bajtach)}
+        self._pending = {}  # {klucz: Future} dla obrazów wczytywanych w tle
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def get(self, key):
+        """
+        Zwraca obraz z pamięci podręcznej albo wczytuje go (czekając na zadanie w tle, jeśli już trwa).
+
+        :param key: Klucz obrazu.
+        :return: Obraz zwrócony przez funkcję wczytującą.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item[0]
+            future = self._pending.get(key)
+
+        if future is not None and not future.cancel():
+            return future.result()
+
+        image = self.loader(key)
+        self._put(key, image)
+        return image
+
+    def peek(self, key):
+        """
+        Zwraca obraz tylko wtedy, gdy jest już w pamięci podręcznej - nigdy nie czeka na wczytanie.
+
+        :param key: Klucz obrazu.
+        :return: Obraz lub None.
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def is_pending(self, key):
+        with self._lock:
+            return key in self._pending
+
+    def prefetch(self, keys):
+        """
+        Wczytuje podane obrazy w tle. Zadania dla obrazów spoza listy, które jeszcze się nie zaczęły,
+        są anulowane - przy szybkim przeglądaniu pula nie zajmuje się zdjęciami, które już minęły.
+
+        :param keys: Klucze obrazów w kolejności ważności.
+        """
+        # Anulowanie wywołuje funkcje zwrotne od razu, więc odbywa się poza blokadą
+        with self._lock:
+            stale = [self._pending.pop(key) for key in list(self._pending) if key not in keys]
+        for future in stale:
+            future.cancel()
+
+        submitted = []
+        with self._lock:
+            for key in keys:
+                if key in self._items or key in self._pending:
+                    continue
+                future = self._executor.submit(self.loader, key)
+                self._pending[key] = future
+                submitted.append((key, future))
+        for key, future in submitted:
+            future.add_done_callback(lambda f, k=key: self._prefetched(k, f))
+
+    def discard(self, key):
+        """
+        Usuwa obraz z pamięci podręcznej, np. po zmianie pliku na dysku.
+
+        :param key: Klucz obrazu.
+        """
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._bytes -= item[1]
+            future = self._pending.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def clear(self):
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._items.clear()
+            self._bytes = 0
+        for future in pending:
+            future.cancel()
+
+    def shutdown(self):
+        """
+        Zatrzymuje wczytywanie w tle i zwalnia pamięć.
+        """
+        self.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prefetched(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is not future:
+                return
+            del self._pending[key]
+        if future.cancelled():
+            return
+        try:
+            image = future.result()
+        except Exception as e:
+            logging.debug(f"Nie udało się wczytać obrazu w tle {key}: {e}")
+            return
+        self._put(key, image)
+        if self.on_loaded is not None and image is not None:
+            self.on_loaded(key)
+
+    def _put(self, key, image):
+        if image is None:
+            return
+        size = self.size_of(image)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (image, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
@@ -0,0 +1,222 @@
+import os
+import struct
+from PIL import Image, UnidentifiedImageError
+
+try:
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+    HEIF_SUPPORTED = True
+except ImportError:
+    HEIF_SUPPORTED = False
+
+# Największy otwierany obraz (w pikselach). Pillow odrzuca obrazy większe niż dwukrotność swojego
+# limitu (DecompressionBombError, domyślnie ok. 179 MP). Ochrona przed plikami-bombami zostaje,
+# ale z granicą ok. 2 GP, żeby otwierały się panoramy gigapikselowe; większe pliki nie są otwierane
+MAX_IMAGE_PIXELS = 2 ** 31
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS // 2
+
+# Liczba bajtów nagłówka czytanych przy rozpoznawaniu formatu (obejmuje pierwszy katalog TIFF)
+SNIFF_BYTES = 4096
+
+# Biblioteki dekodujące
+BACKEND_PILLOW = "pillow"
+BACKEND_RAWPY = "rawpy"
+
+# Szybkie ścieżki podglądu: dekodowanie JPEG w zmniejszonej skali (DCT) i osadzony podgląd pliku RAW
+PREVIEW_DRAFT = "draft"
+PREVIEW_EMBEDDED = "embedded"
+
+# Znacznik DNGVersion - odróżnia DNG od zwykłego pliku TIFF
+DNG_VERSION_TAG = 50706
+
+TIFF_SIGNATURES = ((0, b'II*\x00'), (0, b'MM\x00*'))
+
+
+class ImageFormat:
+    """
+    Opis formatu pliku graficznego w rejestrze dekoderów: jak go rozpoznać i czym go dekodować.
+    """
+
+    def __init__(self, name, backend, signatures=(), brands=(), extensions=(), pillow_format=None,
+                 preview=None, opencv=False, available=True):
+        """
+        :param name: Nazwa formatu.
+        :param backend: Biblioteka dekodująca (BACKEND_PILLOW lub BACKEND_RAWPY).
+        :param signatures: Sygnatury w nagłówku - każda to krotka par (przesunięcie, bajty), które muszą się zgadzać.
+        :param brands: Marki kontenera ISO (pole ftyp), np. b'heic'.
+        :param extensions: Rozszerzenia plików, używane, gdy nagłówka nie udało się rozpoznać.
+        :param pillow_format: Identyfikator formatu w Pillow - Image.open nie próbuje wtedy innych dekoderów.
+        :param preview: Szybka ścieżka podglądu (PREVIEW_DRAFT, PREVIEW_EMBEDDED) lub None.
+        :param opencv: Czy format dekoduje OpenCV (analiza ostrości).
+        :param available: Czy biblioteka dekodująca jest zainstalowana.
+        """
+        self.name = name
+        self.backend = backend
+        self.signatures = signatures
+        self.brands = brands
+        self.extensions = extensions
+        self.pillow_format = pillow_format
+        self.preview = preview
+        self.opencv = opencv
+        self.available = available
+
+    @property
+    def is_raw(self):
+        return self.backend == BACKEND_RAWPY
+
+    def __repr__(self):
+        return f"ImageFormat({self.name!r})"
+
+
+# Rejestr formatów {nazwa: ImageFormat}; nowy format wystarczy dopisać przez register_format
+FORMATS = {}
+
+
+def register_format(image_format):
+    """
+    Dodaje format do rejestru (lub zastępuje format o tej samej nazwie).
+
+    :param image_format: Obiekt ImageFormat.
+    """
+    FORMATS[image_format.name] = image_format
+
+
+register_format(ImageFormat('jpeg', BACKEND_PILLOW, signatures=(((0, b'\xff\xd8\xff'),),),
+                            extensions=('.jpg', '.jpeg'), pillow_format='JPEG', preview=PREVIEW_DRAFT, opencv=True))
+register_format(ImageFormat('png', BACKEND_PILLOW, signatures=(((0, b'\x89PNG\r\n\x1a\n'),),),
+                            extensions=('.png',), pillow_format='PNG', opencv=True))
+register_format(ImageFormat('gif', BACKEND_PILLOW, signatures=(((0, b'GIF87a'),), ((0, b'GIF89a'),)),
+                            extensions=('.gif',), pillow_format='GIF'))
+register_format(ImageFormat('bmp', BACKEND_PILLOW, signatures=(((0, b'BM'),),),
+                            extensions=('.bmp',), pillow_format='BMP', opencv=True))
+register_format(ImageFormat('webp', BACKEND_PILLOW, signatures=(((0, b'RIFF'), (8, b'WEBP')),),
+                            extensions=('.webp',), pillow_format='WEBP', opencv=True))
+register_format(ImageFormat('tiff', BACKEND_PILLOW, signatures=tuple((signature,) for signature in TIFF_SIGNATURES),
+                            extensions=('.tif', '.tiff'), pillow_format='TIFF', opencv=True))
+register_format(ImageFormat('heif', BACKEND_PILLOW, brands=(b'heic', b'heix', b'hevc', b'hevx', b'mif1', b'msf1'),
+                            extensions=('.heic', '.heif'), pillow_format='HEIF', available=HEIF_SUPPORTED))
+# Surowe pliki z aparatów. NEF, ARW, DNG i część innych to kontenery TIFF - rozpoznaje je _sniff_tiff
+register_format(ImageFormat('raw', BACKEND_RAWPY,
+                            signatures=(((0, b'II*\x00'), (8, b'CR')),  # CR2
+                                        ((0, b'IIRO'),), ((0, b'IIRS'),), ((0, b'MMOR'),),  # ORF
+                                        ((0, b'IIU\x00'),),  # RW2
+                                        ((0, b'FUJIFILMCCD-RAW'),)),  # RAF
+                            brands=(b'crx ',),  # CR3
+                            extensions=('.arw', '.nef', '.nrw', '.cr2', '.cr3', '.dng', '.raw', '.orf', '.rw2',
+                                        '.raf', '.pef', '.srw'),
+                            preview=PREVIEW_EMBEDDED))
+
+
+def image_extensions():
+    """
+    Zwraca rozszerzenia plików wszystkich formatów z rejestru, które da się zdekodować -
+    jedyne źródło listy plików otwieranych, analizowanych i eksportowanych przez aplikację.
+
+    :return: Krotka rozszerzeń (małymi literami, z kropką).
+    """
+    return tuple(extension for image_format in FORMATS.values() if image_format.available
+                 for extension in image_format.extensions)
+
+
+def read_header(image_path):
+    """
+    Czyta początek pliku potrzebny do rozpoznania formatu.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :return: Pierwsze SNIFF_BYTES bajtów pliku.
+    """
+    with open(image_path, 'rb') as f:
+        return f.read(SNIFF_BYTES)
+
+
+def identify_format(image_path, header=None):
+    """
+    Rozpoznaje format pliku na podstawie nagłówka, a nie rozszerzenia - pliki o złym rozszerzeniu
+    trafiają do właściwego dekodera. Rozszerzenie jest brane pod uwagę tylko wtedy, gdy nagłówek
+    nie wystarcza (kontener TIFF bez znaczników DNG, nieznana sygnatura).
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :param header: Początek pliku (np. z FileRecord); None - zostanie odczytany z dysku.
+    :return: Obiekt ImageFormat lub None, jeśli formatu nie udało się rozpoznać.
+    """
+    if header is None:
+        header = read_header(image_path)
+    extension = os.path.splitext(image_path)[1].lower()
+
+    best, best_length = None, 0
+    for image_format in FORMATS.values():
+        for signature in image_format.signatures:
+            length = sum(len(magic) for _, magic in signature)
+            if length > best_length and all(header[offset:offset + len(magic)] == magic for offset, magic in signature):
+                best, best_length = image_format, length
+    if best is not None and best.name == 'tiff':
+        return _sniff_tiff(header, extension)
+    if best is not None:
+        return best
+
+    if header[4:8] == b'ftyp':
+        # Kontener ISO (HEIF, CR3): marka główna i marki zgodne
+        box_size = struct.unpack('>I', header[:4])[0]
+        brands = [header[8:12]] + [header[i:i + 4] for i in range(16, min(box_size, len(header)), 4)]
+        for brand in brands:
+            for image_format in FORMATS.values():
+                if brand in image_format.brands:
+                    return image_format
+
+    for image_format in FORMATS.values():
+        if extension in image_format.extensions:
+            return image_format
+    return None
+
+
+def is_raw_file(image_path):
+    """
+    Sprawdza, czy plik jest surowym plikiem z aparatu (dekodowanym przez rawpy).
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :return: True dla plików RAW; False także wtedy, gdy pliku nie da się odczytać.
+    """
+    try:
+        image_format = identify_format(image_path)
+    except OSError:
+        return False
+    return image_format is not None and image_format.is_raw
+
+
+def open_image(source, image_format=None):
+    """
+    Otwiera plik przez Pillow, próbując tylko dekodera rozpoznanego formatu. Dekodowanie pikseli
+    odbywa się dopiero przy pierwszym użyciu (jak w Image.open).
+
+    :param source: Ścieżka do pliku lub obiekt plikowy.
+    :param image_format: Obiekt ImageFormat; None - Pillow sam próbuje wszystkich dekoderów.
+    :return: Obiekt Image z biblioteki PIL.
+    """
+    if image_format is None:
+        return Image.open(source)
+    if not image_format.available:
+        raise UnidentifiedImageError(f"Brak dekodera formatu {image_format.name} (np. pillow-heif dla HEIF)")
+    return Image.open(source, formats=(image_format.pillow_format,))
+
+
+def _sniff_tiff(header, extension):
+    # TIFF jest też kontenerem większości plików RAW; DNG ma własny znacznik w pierwszym katalogu,
+    # a dla pozostałych (NEF, ARW...) rozstrzyga rozszerzenie
+    raw = FORMATS['raw']
+    if DNG_VERSION_TAG in _tiff_tags(header) or extension in raw.extensions:
+        return raw
+    return FORMATS['tiff']
+
+
+def _tiff_tags(header):
+    # Znaczniki pierwszego katalogu (IFD0), o ile mieści się w odczytanym nagłówku
+    byte_order = '<' if header[:2] == b'II' else '>'
+    try:
+        offset = struct.unpack(byte_order + 'I', header[4:8])[0]
+        count = struct.unpack(byte_order + 'H', header[offset:offset + 2])[0]
+    except struct.error:
+        return set()
+    tags = set()
+    for entry in range(offset + 2, min(offset + 2 + count * 12, len(header) - 1), 12):
+        tags.add(struct.unpack(byte_order + 'H', header[entry:entry + 2])[0])
+    return tags
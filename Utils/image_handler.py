@@ -2,83 +2,349 @@ from PIL import Image, ExifTags, UnidentifiedImageError
 import rawpy
 import os
 import io
-from PIL.ImageQt import ImageQt
-from PyQt5.QtGui import QPixmap, QImage
+import hashlib
+import logging
+import numpy as np
+from PyQt5.QtGui import QPixmap, QImage, QTransform
+from PyQt5.QtCore import Qt
+from Utils.thumbnail_store import ThumbnailStore, thumbnail_edge
+from Utils.image_formats import identify_format, open_image
 
-def load_image(image_path):
+# Formaty QImage, w które można bezpośrednio opakować piksele PIL/NumPy (liczba kanałów -> format)
+QIMAGE_FORMATS = {
+    1: QImage.Format_Grayscale8,
+    3: QImage.Format_RGB888,
+    4: QImage.Format_RGBA8888,
+}
+
+# Jakość wywołania plików RAW: osadzony podgląd, szybkie wywołanie w połowie rozdzielczości
+# (bez demozaikowania) i pełne wywołanie AHD
+RAW_PREVIEW = "preview"
+RAW_FAST = "fast"
+RAW_FULL = "full"
+
+# Identyfikator znacznika EXIF Orientation, wyszukany raz przy imporcie modułu
+ORIENTATION_TAG = next(tag for tag, name in ExifTags.TAGS.items() if name == 'Orientation')
+
+# Bezstratne przekształcenia pikseli dla wartości znacznika Orientation (bez przepróbkowania obrazu)
+ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+# Orientacja zapisana przez LibRaw w raw.sizes.flip -> odpowiadająca wartość znacznika Orientation
+RAW_FLIP_ORIENTATION = {0: 1, 3: 3, 5: 8, 6: 6}
+
+# Jakość JPEG miniatur zapisywanych w pamięci podręcznej
+THUMBNAIL_QUALITY = 85
+
+# Folder na wywołane pliki RAW i limit jego rozmiaru (w bajtach)
+RAW_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".reflectionview", "raw_cache")
+RAW_CACHE_MAX_BYTES = 4 * 2 ** 30
+
+def load_image(image_path, raw_tier=RAW_PREVIEW, record=None, image_format=None, use_cache=True):
     """
     Ładuje obraz z podanej ścieżki i zwraca go jako obiekt Image z biblioteki PIL.
+    Dekoder jest wybierany według nagłówka pliku (Utils.image_formats), a nie rozszerzenia.
 
     :param image_path: Ścieżka do pliku graficznego.
+    :param raw_tier: Jakość wywołania plików RAW (RAW_PREVIEW, RAW_FAST lub RAW_FULL).
+    :param record: Opcjonalny FileRecord tego pliku - obraz jest wtedy dekodowany ze wspólnego bufora
+                   (plik RAW - przez rawpy otwarty w rekordzie) i musi zostać wczytany przed zamknięciem rekordu.
+    :param image_format: Rozpoznany już format pliku (ImageFormat); None - zostanie rozpoznany.
+    :param use_cache: False - wywołania RAW nie trafiają do pamięci podręcznej na dysku (patrz develop_raw).
     :return: Obiekt Image z biblioteki PIL.
     """
-    extension = os.path.splitext(image_path)[1].lower()
+    if image_format is None:
+        image_format = record.format if record is not None else identify_format(image_path)
+    if image_format is not None and image_format.is_raw:
+        return develop_raw(image_path, raw_tier, use_cache, record=record)
+    return open_image(record.stream() if record is not None else image_path, image_format)
+
+def develop_raw(image_path, tier=RAW_PREVIEW, use_cache=True, record=None, fallback=True):
+    """
+    Wywołuje plik RAW w podanej jakości. Wyniki szybkiego i pełnego wywołania są zapisywane
+    w pamięci podręcznej na dysku, więc kolejne otwarcie tego samego pliku ich nie powtarza.
+    Plik bez użytecznego podglądu jest wywoływany szybko, w połowie rozdzielczości.
+
+    Rozmiar pełnego wywołania (bez obrotu) jest zapisywany w image.info['raw_size'],
+    żeby wszystkie jakości można było wyświetlać w tych samych współrzędnych, a orientacja
+    aparatu (raw.sizes.flip) - w image.info['orientation'] jako wartość znacznika Orientation.
+
+    :param image_path: Ścieżka do pliku RAW.
+    :param tier: RAW_PREVIEW, RAW_FAST lub RAW_FULL.
+    :param use_cache: False - bez pamięci podręcznej na dysku (np. przy jednorazowym eksporcie wielu plików).
+    :param record: Opcjonalny FileRecord tego pliku - rawpy korzysta wtedy z już otwartego pliku.
+    :param fallback: False - plik bez podglądu nie jest wywoływany, zwracane jest None (tylko dla RAW_PREVIEW).
+    :return: Obiekt Image z biblioteki PIL (lub None, patrz fallback).
+    """
+    if record is not None:
+        return _develop_raw(record.raw, image_path, tier, use_cache, fallback, record)
+    with rawpy.imread(image_path) as raw:
+        return _develop_raw(raw, image_path, tier, use_cache, fallback)
 
-    if extension in ['.arw', '.nef', '.cr2', '.dng', '.raw', '.tiff']:
-        with rawpy.imread(image_path) as raw:
+def _develop_raw(raw, image_path, tier, use_cache, fallback=True, record=None):
+    raw_size = (raw.sizes.width, raw.sizes.height)
+    orientation = RAW_FLIP_ORIENTATION.get(raw.sizes.flip, 1)
+    if tier == RAW_PREVIEW:
+        if record is not None:
+            thumbnail = record.preview
+        else:
             try:
-                # Pobieranie miniatury
                 thumbnail = raw.extract_thumb()
-                if thumbnail.format == rawpy.ThumbFormat.JPEG:
-                    image = Image.open(io.BytesIO(thumbnail.data))
-                else:
-                    image = Image.fromarray(thumbnail.data)
-                return image
-            except rawpy._rawpy.LibRawNoThumbnailError:
-                # Jeżeli nie ma miniatury, przetwarzamy pełny obraz
-                rgb_image = raw.postprocess()
-                return Image.fromarray(rgb_image)
-    else:
-        return Image.open(image_path)
+            except (rawpy._rawpy.LibRawNoThumbnailError, rawpy._rawpy.LibRawUnsupportedThumbnailError):
+                thumbnail = None
+        if thumbnail is not None:
+            if thumbnail.format == rawpy.ThumbFormat.JPEG:
+                image = Image.open(io.BytesIO(thumbnail.data), formats=('JPEG',))
+            else:
+                image = Image.fromarray(thumbnail.data)
+            image.info['raw_size'] = raw_size
+            image.info['orientation'] = orientation
+            return image
+        if not fallback:
+            return None
+        tier = RAW_FAST
+
+    cache_path = _raw_cache_path(image_path, tier) if use_cache else None
+    try:
+        pixels = np.load(cache_path) if cache_path else None
+    except (OSError, ValueError):
+        pixels = None
+    if pixels is None:
+        # user_flip=0 - wywołanie ma tę samą orientację co osadzony podgląd
+        pixels = raw.postprocess(half_size=(tier == RAW_FAST), user_flip=0)
+        if cache_path:
+            _raw_cache_store(cache_path, pixels)
 
-def get_image_with_orientation(image_path):
+    image = Image.fromarray(pixels)
+    image.info['raw_size'] = raw_size
+    image.info['orientation'] = orientation
+    return image
+
+def get_image_with_orientation(image_path, raw_tier=RAW_PREVIEW):
     """
     Ładuje obraz i uwzględnia orientację EXIF.
 
     :param image_path: Ścieżka do pliku graficznego.
+    :param raw_tier: Jakość wywołania plików RAW.
     :return: Obiekt Image z uwzględnioną orientacją.
     """
-    image = load_image(image_path)
+    return apply_exif_orientation(load_image(image_path, raw_tier))
+
+def full_image_size(image):
+    """
+    Zwraca rozmiar obrazu w pełnej rozdzielczości - dla plików RAW rozmiar pełnego wywołania,
+    także wtedy, gdy obraz jest podglądem lub szybkim wywołaniem.
+
+    :param image: Obiekt Image zwrócony przez load_image.
+    :return: Krotka (szerokość, wysokość).
+    """
+    return image.info.get('raw_size', image.size)
+
+def _raw_cache_path(image_path, tier):
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{stat.st_size}|{stat.st_mtime_ns}|{tier}"
+    return os.path.join(RAW_CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".npy")
+
+def _raw_cache_store(cache_path, pixels):
     try:
-        for orientation in ExifTags.TAGS.keys():
-            if ExifTags.TAGS[orientation] == 'Orientation':
+        os.makedirs(RAW_CACHE_DIR, exist_ok=True)
+        temporary_path = cache_path + ".tmp"
+        with open(temporary_path, 'wb') as f:
+            np.save(f, pixels)
+        os.replace(temporary_path, cache_path)
+
+        # Najdawniej zapisane wywołania są usuwane po przekroczeniu limitu
+        entries = [entry for entry in os.scandir(RAW_CACHE_DIR) if entry.name.endswith(".npy")]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime):
+            if total <= RAW_CACHE_MAX_BYTES:
                 break
-        exif = image._getexif()
-        if exif is not None:
-            exif = dict(exif.items())
-            orientation = exif.get(orientation, None)
-
-            if orientation == 3:
-                image = image.rotate(180, expand=True)
-            elif orientation == 6:
-                image = image.rotate(270, expand=True)
-            elif orientation == 8:
-                image = image.rotate(90, expand=True)
-    except (AttributeError, KeyError, IndexError):
-        pass
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+    except OSError as e:
+        logging.warning(f"Nie udało się zapisać wywołanego pliku RAW w pamięci podręcznej: {e}")
 
-    return image
+def apply_exif_orientation(image):
+    """
+    Obraca obraz zgodnie z orientacją zapisaną w EXIF. Piksele są tylko przestawiane (transpose),
+    bez przepróbkowania. Do wyświetlania lepiej użyć orientation_transform, które niczego nie kopiuje.
 
-def rotate_image(image, angle):
+    :param image: Obiekt Image z biblioteki PIL.
+    :return: Obiekt Image z uwzględnioną orientacją.
     """
-    Obraca obraz o podany kąt.
+    method = ORIENTATION_TRANSPOSE.get(exif_orientation(image))
+    if method is None:
+        return image
+    return image.transpose(method)
+
+def exif_orientation(image):
+    """
+    Odczytuje orientację zapisaną w EXIF (dla plików RAW - orientację z LibRaw).
 
     :param image: Obiekt Image z biblioteki PIL.
-    :param angle: Kąt obrotu w stopniach.
-    :return: Obrócony obiekt Image.
+    :return: Wartość znacznika Orientation lub None.
     """
-    return image.rotate(angle, expand=True)
+    if 'orientation' in image.info:
+        return image.info['orientation']
+    try:
+        return image.getexif().get(ORIENTATION_TAG)
+    except (AttributeError, KeyError, IndexError, ValueError, OSError):
+        return None
+
+def is_transposed(orientation):
+    """
+    Sprawdza, czy orientacja zamienia szerokość z wysokością.
+
+    :param orientation: Wartość znacznika Orientation.
+    :return: True dla obrotów o 90 stopni (także z odbiciem).
+    """
+    return orientation in (5, 6, 7, 8)
+
+def orientation_transform(orientation, width, height):
+    """
+    Zwraca przekształcenie, które wyświetla obraz zapisany w orientacji aparatu tak,
+    jak wskazuje znacznik Orientation. Przekształcenie działa w widoku, bez kopiowania pikseli.
+
+    :param orientation: Wartość znacznika Orientation (None lub 1 - bez zmian).
+    :param width: Szerokość obrazu przed obrotem.
+    :param height: Wysokość obrazu przed obrotem.
+    :return: Obiekt QTransform odwzorowujący prostokąt (0, 0, width, height) na obraz po obrocie.
+    """
+    # QTransform(m11, m12, m21, m22, dx, dy): x' = m11 * x + m21 * y + dx, y' = m12 * x + m22 * y + dy
+    matrices = {
+        2: (-1, 0, 0, 1, width, 0),
+        3: (-1, 0, 0, -1, width, height),
+        4: (1, 0, 0, -1, 0, height),
+        5: (0, 1, 1, 0, 0, 0),
+        6: (0, 1, -1, 0, height, 0),
+        7: (0, -1, -1, 0, height, width),
+        8: (0, -1, 1, 0, 0, width),
+    }
+    return QTransform(*matrices.get(orientation, (1, 0, 0, 1, 0, 0)))
+
+def load_fitted(image_path, max_size=None, raw_tier=RAW_PREVIEW):
+    """
+    Wczytuje zdjęcie zmniejszone tak, żeby po obrocie zgodnie z EXIF mieściło się w podanym
+    rozmiarze (np. ekranu). Piksele pozostają w orientacji aparatu - obrót wykonuje widok
+    (orientation_transform), więc zdjęcia pionowe nie są kopiowane ani przepróbkowywane.
+
+    JPEG jest dekodowany od razu w zmniejszonej skali (draft), a resztę zmniejszenia wykonuje
+    szybka redukcja o całkowity dzielnik przed końcowym skalowaniem (reducing_gap).
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :param max_size: Rozmiar, w którym ma się zmieścić zdjęcie po obrocie (szerokość, wysokość);
+                     None - bez zmniejszania.
+    :param raw_tier: Jakość wywołania plików RAW.
+    :return: Krotka (obraz, rozmiar pełnego obrazu przed obrotem, orientacja EXIF).
+    """
+    image = load_image(image_path, raw_tier)
+    orientation = exif_orientation(image)
+    full_size = full_image_size(image)
+    return fit_image(image, max_size, orientation), full_size, orientation
+
+def fit_image(image, max_size, orientation=None, resample=Image.BILINEAR):
+    """
+    Zmniejsza obraz tak, żeby po obrocie zgodnie z EXIF mieścił się w podanym rozmiarze.
+    Obraz jeszcze niezdekodowany (JPEG) jest od razu dekodowany w zmniejszonej skali (draft).
 
-def resize_image(image_path, new_size):
+    :param image: Obiekt Image z biblioteki PIL, w orientacji aparatu.
+    :param max_size: Rozmiar, w którym ma się zmieścić obraz po obrocie (szerokość, wysokość); None - bez zmian.
+    :param orientation: Wartość znacznika Orientation.
+    :param resample: Filtr końcowego skalowania (np. Image.LANCZOS dla eksportu).
+    :return: Obiekt Image w orientacji aparatu.
     """
-    Zmienia rozmiar obrazu do podanych wymiarów i zapisuje wynik.
+    box = max_size
+    if box and is_transposed(orientation):
+        # Obraz zostanie obrócony o 90 stopni, więc dopasowujemy go do obróconego prostokąta
+        box = (box[1], box[0])
+    scale = min(box[0] / image.width, box[1] / image.height) if box else 1
+    if scale < 1:
+        target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image.draft(None, target)
+        image = image.resize(target, resample, reducing_gap=2.0)
+    return image
+
+def load_preview(image_path, max_size):
+    """
+    Szybko wczytuje podgląd zdjęcia w zmniejszonej rozdzielczości, w orientacji aparatu
+    (tak jak load_fitted).
+
+    JPEG (także osadzony podgląd pliku RAW) jest dekodowany od razu w zmniejszonej skali (draft),
+    więc pełna klatka nie jest dekodowana. Formaty bez taniego podglądu (ani pliki RAW bez podglądu
+    JPEG) nie są w ogóle dekodowane - zdjęcie wczyta od razu load_fitted.
 
     :param image_path: Ścieżka do pliku graficznego.
-    :param new_size: Nowe wymiary (szerokość, wysokość).
+    :param max_size: Najmniejszy akceptowany rozmiar podglądu (szerokość, wysokość).
+    :return: Krotka (podgląd, rozmiar pełnego obrazu przed obrotem, orientacja EXIF) lub (None, None, None).
     """
-    image = Image.open(image_path)
-    resized_image = image.resize(new_size)
-    resized_image.save(image_path)
+    image_format = identify_format(image_path)
+    if image_format is None or image_format.preview is None:
+        return None, None, None
+    if image_format.is_raw:
+        image = develop_raw(image_path, RAW_PREVIEW, fallback=False)
+    else:
+        image = open_image(image_path, image_format)
+    if image is None or image.format != 'JPEG':
+        return None, None, None
+    orientation = exif_orientation(image)
+    full_size = full_image_size(image)
+    image.draft('RGB', max_size)
+    return image, full_size, orientation
+
+def to_qimage(image):
+    """
+    Tworzy QImage bezpośrednio na buforze pikseli, bez konwersji do RGBA i bez dodatkowych kopii.
+
+    Obrazy RGB, RGBA i w skali szarości są opakowywane z właściwym formatem i długością wiersza.
+    Pozostałe tryby PIL są najpierw konwertowane do RGB (lub RGBA, jeśli mają przezroczystość).
+    Zwrócony QImage nie jest właścicielem pikseli: bufor żyje tylko tak długo jak ten obiekt
+    Pythona (atrybut buffer). Kopie QImage (sygnały Qt, konstruktor kopiujący, pamięci podręczne
+    trzymające sam obiekt C++) wskazują na ten sam bufor i po zwolnieniu obiektu czytają zwolnioną
+    pamięć. Wynik można więc przekazywać między wątkami tylko jako ten sam obiekt Pythona; przed
+    wysłaniem sygnałem lub zapisaniem na dłużej trzeba wykonać copy() albo convertToFormat().
+
+    :param image: Obiekt Image z biblioteki PIL lub tablica NumPy uint8 (wysokość, szerokość[, kanały]).
+    :return: Obiekt QImage.
+    """
+    if isinstance(image, Image.Image):
+        if image.mode not in ('L', 'RGB', 'RGBA'):
+            has_alpha = 'A' in image.mode or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        height, width = image.height, image.width
+        channels = len(image.getbands())
+        buffer = image.tobytes()
+        bytes_per_line = width * channels
+    else:
+        buffer = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = buffer.shape[:2]
+        channels = 1 if buffer.ndim == 2 else buffer.shape[2]
+        bytes_per_line = buffer.strides[0]
+
+    q_image = QImage(buffer, width, height, bytes_per_line, QIMAGE_FORMATS[channels])
+    q_image.buffer = buffer  # QImage nie przejmuje bufora - referencja utrzymuje go przy życiu
+    return q_image
+
+def rotate_image(image, angle):
+    """
+    Obraca obraz o podany kąt. Obroty o wielokrotność 90 stopni są bezstratne (transpose).
+
+    :param image: Obiekt Image z biblioteki PIL.
+    :param angle: Kąt obrotu w stopniach (przeciwnie do ruchu wskazówek zegara).
+    :return: Obrócony obiekt Image.
+    """
+    quarter_turns = {90: Image.ROTATE_90, 180: Image.ROTATE_180, 270: Image.ROTATE_270}
+    if angle % 360 == 0:
+        return image
+    if angle % 360 in quarter_turns:
+        return image.transpose(quarter_turns[angle % 360])
+    return image.rotate(angle, expand=True)
 
 def load_image_thumbnail(image_path, size=(100, 100)):
     """
@@ -88,29 +354,45 @@ def load_image_thumbnail(image_path, size=(100, 100)):
     :param size: Rozmiar miniatury (domyślnie 100x100 pikseli).
     :return: Miniatura obrazu jako obiekt QPixmap.
     """
+    return QPixmap.fromImage(load_thumbnail_image(image_path, size))
 
-    # Pobierz rozszerzenie pliku
-    extension = os.path.splitext(image_path)[1].lower()
+def load_thumbnail_image(image_path, size=(100, 100)):
+    """
+    Zwraca miniaturę zdjęcia z uwzględnieniem orientacji EXIF jako QImage. Funkcja może działać
+    poza wątkiem GUI.
 
-    if extension in ['.arw', '.nef', '.cr2', '.dng', '.raw', '.tiff']:  # Obsługiwane formaty plików RAW
-        # Otwórz plik RAW za pomocą rawpy
-        with rawpy.imread(image_path) as raw:
-            try:
-                # Pobieranie miniatury
-                thumbnail = raw.extract_thumb()
-                if thumbnail.format == rawpy.ThumbFormat.JPEG:
-                    image = Image.open(io.BytesIO(thumbnail.data))
-                else:
-                    image = Image.fromarray(thumbnail.data)
-            except rawpy._rawpy.LibRawNoThumbnailError:
-                # Jeżeli nie ma miniatury, przetwarzamy pełny obraz
-                rgb_image = raw.postprocess()
-                image = Image.fromarray(rgb_image)
-    else:
-        # Otwórz plik za pomocą biblioteki Pillow
-        image = Image.open(image_path)
+    Miniatury są zapisywane na dysku (ThumbnailStore) w kilku stałych rozmiarach, więc ponowne
+    otwarcie folderu nie dekoduje zdjęć. Zmieniony plik dostaje nową miniaturę.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :param size: Rozmiar, w którym ma się zmieścić miniatura (szerokość, wysokość).
+    :return: Obiekt QImage.
+    """
+    image_path = os.path.abspath(image_path)
+    edge = thumbnail_edge(size)
+    stat = os.stat(image_path)
+    file_size, mtime_ns = stat.st_size, stat.st_mtime_ns
+    store = ThumbnailStore.shared()
+
+    q_image = None
+    data = store.get(image_path, file_size, mtime_ns, edge) if store else None
+    if data is not None:
+        q_image = QImage.fromData(data, 'JPEG')
+    if q_image is None or q_image.isNull():
+        # Pliki RAW bez miniatury są wywoływane szybko, w połowie rozdzielczości - bez zapisu na dysku,
+        # żeby nie wypierały wywołań przeglądarki z pamięci podręcznej
+        image = load_image(image_path, use_cache=False)
+        image.thumbnail((edge, edge))  # JPEG jest od razu dekodowany w zmniejszonej skali
+        image = apply_exif_orientation(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if store:
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=THUMBNAIL_QUALITY)
+            store.put(image_path, file_size, mtime_ns, edge, buffer.getvalue())
+        # Kopia ma własne piksele - wynik jest przekazywany między wątkami, a bufor to_qimage zniknąłby z tym wątkiem
+        q_image = to_qimage(image).copy()
 
-    # Utwórz miniaturę
-    image.thumbnail(size)
-    qt_image = ImageQt(image)
-    return QPixmap.fromImage(qt_image)
+    if q_image.width() > size[0] or q_image.height() > size[1]:
+        q_image = q_image.scaled(size[0], size[1], Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return q_image
@@ -0,0 +1,324 @@
+import os
+import sqlite3
+import logging
+import itertools
+import threading
+import concurrent.futures
+from fractions import Fraction
+from exifread.tags.exif import EXIF_TAGS
+from Utils.exif_handler import read_exif_fields
+from Utils.file_inspector import inspect_file
+from Utils.image_formats import image_extensions
+from Utils.image_handler import ORIENTATION_TAG, is_transposed
+
+# Plik indeksu metadanych wszystkich przeglądanych folderów
+LIBRARY_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".reflectionview", "library.sqlite")
+
+# Wersja układu tabeli - pliki zapisane w starszym układzie są zakładane od nowa
+SCHEMA_VERSION = 1
+
+# Rozszerzenia indeksowanych plików - wszystkie formaty z rejestru dekoderów
+INDEX_EXTENSIONS = image_extensions()
+
+# Kolumny metadanych, po których można filtrować i sortować (każda ma indeks)
+INDEX_COLUMNS = ('camera', 'lens', 'serial', 'captured', 'iso', 'aperture', 'exposure', 'width', 'height', 'color')
+
+# Pola EXIF czytane przy indeksowaniu (bez MakerNote, tylko nagłówek pliku)
+INDEX_FIELDS = ('Model', 'LensModel', 'SerialNumber', 'DateTimeOriginal', 'DateTime', 'ISO', 'FNumber', 'ExposureTime',
+                'ExifImageWidth', 'ExifImageLength', 'Orientation')
+
+# Opisy orientacji zwracane przez exifread -> wartość znacznika Orientation
+ORIENTATION_VALUES = {name: value for value, name in EXIF_TAGS[ORIENTATION_TAG][1].items()}
+
+# Liczba wierszy zapisywanych w jednej transakcji podczas skanowania
+INDEX_BATCH_SIZE = 500
+
+
+def read_metadata(image_path):
+    """
+    Odczytuje metadane zdjęcia do indeksu: tylko wybrane pola EXIF i wymiary z nagłówka, bez dekodowania pikseli.
+    Wymiary plików RAW pochodzą ze znaczników EXIF; LibRaw jest używany tylko wtedy, gdy ich brakuje.
+
+    :param image_path: Ścieżka do pliku graficznego.
+    :return: Krotka (aparat, obiektyw, numer seryjny, data wykonania, ISO, przysłona, czas naświetlania,
+             szerokość, wysokość); szerokość i wysokość po obrocie zgodnie z EXIF.
+    """
+    with inspect_file(image_path) as record:
+        fields = read_exif_fields(image_path, INDEX_FIELDS, record)
+        width, height = _number(fields['ExifImageWidth'], int), _number(fields['ExifImageLength'], int)
+        orientation = ORIENTATION_VALUES.get(fields['Orientation'])
+        if not record.is_raw:
+            # Nagłówek Pillow podaje rzeczywiste wymiary (EXIF bywa nieaktualny po zmianie rozmiaru)
+            dimensions = record.dimensions
+            width, height = dimensions if dimensions else (None, None)
+        elif width is None or height is None:
+            try:
+                width, height = record.dimensions
+                if orientation is None:
+                    orientation = record.orientation
+            except Exception as e:
+                # Błąd LibRaw nie może przekreślić odczytanych już pól EXIF
+                logging.debug(f"Nie udało się odczytać wymiarów {image_path}: {e}")
+                width, height = None, None
+    if is_transposed(orientation):
+        width, height = height, width
+    captured = fields['DateTimeOriginal'] or fields['DateTime']
+    return (fields['Model'], fields['LensModel'], fields['SerialNumber'], captured, _number(fields['ISO'], int),
+            _number(fields['FNumber']), _number(fields['ExposureTime']), width, height)
+
+
+class LibraryIndex:
+    """
+    Indeks metadanych zdjęć (aparat, obiektyw, numer seryjny, data, ISO, przysłona, czas naświetlania,
+    wymiary, kolor) w jednej bazie SQLite. Filtrowanie i sortowanie to zapytania po indeksowanych
+    kolumnach, więc nie wymagają otwierania plików.
+
+    Wpis jest aktualny, dopóki zgadzają się rozmiar i czas modyfikacji pliku - scan_directory
+    odczytuje ponownie tylko zmienione pliki. Obiekt można używać z wielu wątków.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path=LIBRARY_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL - zapytania interfejsu nie czekają na zapisy skanera
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS photos")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS photos ("
+            " path TEXT PRIMARY KEY,"
+            " directory TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " camera TEXT, lens TEXT, serial TEXT, captured TEXT,"
+            " iso INTEGER, aperture REAL, exposure REAL, width INTEGER, height INTEGER,"
+            " color TEXT)"
+        )
+        # Indeksy (kolumna, folder) obsługują filtry w całej bibliotece i w jednym folderze
+        self.connection.execute("CREATE INDEX IF NOT EXISTS photos_directory ON photos (directory)")
+        for column in INDEX_COLUMNS:
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS photos_{column} ON photos ({column}, directory)")
+        self.connection.commit()
+
+    @classmethod
+    def open(cls, path=LIBRARY_INDEX_PATH):
+        """
+        Otwiera indeks metadanych. Zwraca None, jeżeli nie da się go utworzyć
+        (np. katalog domowy jest tylko do odczytu).
+
+        :param path: Ścieżka pliku bazy.
+        :return: Obiekt LibraryIndex lub None.
+        """
+        try:
+            return cls(path)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Nie można otworzyć indeksu metadanych {path}: {e}")
+            return None
+
+    @classmethod
+    def shared(cls):
+        """
+        Zwraca wspólny indeks metadanych aplikacji (otwierany przy pierwszym użyciu).
+
+        :return: Obiekt LibraryIndex lub None.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.open() or False
+            return cls._shared or None
+
+    def entries(self, directory):
+        """
+        Zwraca zapisane pliki folderu z rozmiarem i czasem modyfikacji (do porównania z dyskiem).
+
+        :param directory: Ścieżka folderu.
+        :return: Słownik {ścieżka: (rozmiar, czas modyfikacji w nanosekundach)}.
+        """
+        with self._lock:
+            rows = self.connection.execute("SELECT path, size, mtime_ns FROM photos WHERE directory = ?",
+                                           (os.path.abspath(directory),)).fetchall()
+        return {path: (size, mtime_ns) for path, size, mtime_ns in rows}
+
+    def put(self, rows):
+        """
+        Zapisuje (lub zastępuje) wpisy w jednej transakcji. Kolor pliku jest zachowywany.
+
+        :param rows: Lista krotek (ścieżka, rozmiar, czas modyfikacji, *metadane z read_metadata).
+        """
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO photos (path, directory, size, mtime_ns, camera, lens, serial, captured, iso, aperture,"
+                " exposure, width, height) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns,"
+                " camera = excluded.camera, lens = excluded.lens, serial = excluded.serial,"
+                " captured = excluded.captured, iso = excluded.iso, aperture = excluded.aperture,"
+                " exposure = excluded.exposure, width = excluded.width, height = excluded.height",
+                [(row[0], os.path.dirname(row[0])) + tuple(row[1:]) for row in rows]
+            )
+
+    def remove(self, paths):
+        """
+        Usuwa wpisy plików (np. usuniętych z dysku).
+
+        :param paths: Lista ścieżek.
+        """
+        with self._lock, self.connection:
+            self.connection.executemany("DELETE FROM photos WHERE path = ?", [(path,) for path in paths])
+
+    def set_colors(self, directory, colors):
+        """
+        Zapisuje kolory plików folderu (np. z ColorHandler). Pliki spoza słownika tracą kolor.
+
+        :param directory: Ścieżka folderu.
+        :param colors: Słownik {nazwa pliku: kolor}.
+        """
+        directory = os.path.abspath(directory)
+        with self._lock, self.connection:
+            self.connection.execute("UPDATE photos SET color = NULL WHERE directory = ? AND color IS NOT NULL",
+                                    (directory,))
+            self.connection.executemany("UPDATE photos SET color = ? WHERE path = ?",
+                                        [(color, os.path.join(directory, name)) for name, color in colors.items()])
+
+    def query(self, directory=None, filters=None, order_by=None, descending=False):
+        """
+        Wyszukuje zdjęcia po indeksowanych kolumnach.
+
+        :param directory: Ścieżka folderu; None - cała biblioteka.
+        :param filters: Słownik {kolumna: wartość}; wartość (od, do) oznacza przedział (None - bez ograniczenia).
+        :param order_by: Kolumna sortowania; None - kolejność nieokreślona. Pliki bez wartości są na końcu.
+        :param descending: Sortowanie malejące.
+        :return: Lista ścieżek.
+        """
+        conditions, parameters = [], []
+        if directory is not None:
+            conditions.append("directory = ?")
+            parameters.append(os.path.abspath(directory))
+        for column, value in (filters or {}).items():
+            _check_column(column)
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    conditions.append(f"{column} >= ?")
+                    parameters.append(low)
+                if high is not None:
+                    conditions.append(f"{column} <= ?")
+                    parameters.append(high)
+            else:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+
+        sql = "SELECT path FROM photos"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if order_by is not None:
+            _check_column(order_by)
+            sql += f" ORDER BY {order_by} IS NULL, {order_by} {'DESC' if descending else 'ASC'}"
+        with self._lock:
+            return [row[0] for row in self.connection.execute(sql, parameters)]
+
+    def distinct(self, column, directory=None):
+        """
+        Zwraca różne wartości kolumny (np. do listy filtrów).
+
+        :param column: Kolumna z INDEX_COLUMNS.
+        :param directory: Ścieżka folderu; None - cała biblioteka.
+        :return: Posortowana lista wartości (bez pustych).
+        """
+        _check_column(column)
+        sql = f"SELECT DISTINCT {column} FROM photos WHERE {column} IS NOT NULL"
+        parameters = ()
+        if directory is not None:
+            sql += " AND directory = ?"
+            parameters = (os.path.abspath(directory),)
+        with self._lock:
+            return [row[0] for row in self.connection.execute(sql + f" ORDER BY {column}", parameters)]
+
+    def close(self):
+        with self._lock:
+            # Aktualizuje statystyki planera zapytań, jeśli dane znacząco się zmieniły
+            self.connection.execute("PRAGMA optimize")
+            self.connection.close()
+
+
+def scan_directory(index, directory, workers=None, cancel_callback=None):
+    """
+    Aktualizuje indeks dla plików folderu. Odczytywane są tylko pliki nowe i zmienione
+    (inny rozmiar lub czas modyfikacji), w puli procesów; wpisy usuniętych plików są usuwane.
+
+    :param index: Obiekt LibraryIndex.
+    :param directory: Ścieżka folderu.
+    :param workers: Liczba procesów (domyślnie liczba rdzeni).
+    :param cancel_callback: Funkcja zwracająca True, gdy skanowanie należy przerwać.
+    :return: Generator krotek (ścieżka, komunikat błędu lub None) dla odczytanych plików,
+             w kolejności zakończenia.
+    """
+    directory = os.path.abspath(directory)
+    known = index.entries(directory)
+    changed = []
+    seen = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(INDEX_EXTENSIONS) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            seen.add(entry.path)
+            if known.get(entry.path) != (stat.st_size, stat.st_mtime_ns):
+                changed.append((entry.path, stat.st_size, stat.st_mtime_ns))
+    removed = [path for path in known if path not in seen]
+    if removed:
+        index.remove(removed)
+    if not changed:
+        return
+
+    workers = workers or os.cpu_count() or 1
+    jobs = iter(changed)
+    rows = []
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {executor.submit(read_metadata, job[0]): job for job in itertools.islice(jobs, workers * 4)}
+        while pending:
+            if cancel_callback is not None and cancel_callback():
+                return
+            done, _ = concurrent.futures.wait(pending, timeout=0.2, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                path, size, mtime_ns = pending.pop(future)
+                for job in itertools.islice(jobs, 1):
+                    pending[executor.submit(read_metadata, job[0])] = job
+                try:
+                    metadata, error = future.result(), None
+                except Exception as e:
+                    # Plik trafia do indeksu bez metadanych, żeby nie był odczytywany przy każdym skanowaniu
+                    logging.warning(f"Nie udało się odczytać metadanych {path}: {e}")
+                    metadata, error = (None,) * 9, str(e)
+                rows.append((path, size, mtime_ns) + tuple(metadata))
+                if len(rows) >= INDEX_BATCH_SIZE:
+                    index.put(rows)
+                    rows = []
+                yield path, error
+    finally:
+        if rows:
+            index.put(rows)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _check_column(column):
+    # Nazwy kolumn trafiają do treści zapytania, więc dopuszczamy tylko znane
+    if column not in INDEX_COLUMNS:
+        raise ValueError(f"Nieznana kolumna indeksu: {column}")
+
+
+def _number(value, kind=float):
+    # Wartości exifread są tekstowe, np. '400', '28/10', '1/250'
+    if value is None:
+        return None
+    try:
+        return kind(Fraction(value.strip()))
+    except (ValueError, ZeroDivisionError):
+        return None
@@ -0,0 +1,226 @@
+import argparse
+import threading
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+
+class FeatureExtractor:
+    """
+    Liczy cechy ostrości (wariancja Laplasjanu, średni gradient Sobela, gęstość krawędzi Canny'ego)
+    w float32, we wcześniej przydzielonych buforach.
+
+    Bufory są używane ponownie dla kolejnych obrazów o tym samym rozmiarze, a statystyki
+    liczy OpenCV z akumulacją w double - nie powstają żadne pełnoklatkowe tablice tymczasowe.
+    """
+
+    def __init__(self):
+        self._shape = None
+        self._laplacian = None
+        self._gradient_x = None
+        self._gradient_y = None
+        self._edges = None
+
+    def _buffers(self, shape):
+        if shape != self._shape:
+            self._shape = shape
+            self._laplacian = np.empty(shape, dtype=np.float32)
+            self._gradient_x = np.empty(shape, dtype=np.float32)
+            self._gradient_y = np.empty(shape, dtype=np.float32)
+            self._edges = np.empty(shape, dtype=np.uint8)
+        return self._laplacian, self._gradient_x, self._gradient_y, self._edges
+
+    def extract(self, image):
+        """
+        Wyodrębnia cechy ostrości z obrazu.
+
+        :param image: Obraz BGR lub w skali szarości (tablica NumPy uint8).
+        :return: Lista [wariancja Laplasjanu, średnia wartość gradientu, gęstość krawędzi].
+        """
+        return self._extract(image, None)[0]
+
+    def extract_with_tiles(self, image, grid):
+        """
+        Wyodrębnia cechy ostrości i mapę ostrości kafelków z jednego przebiegu Laplasjanu.
+
+        :param image: Obraz BGR lub w skali szarości (tablica NumPy uint8).
+        :param grid: Liczba kafelków (wiersze, kolumny).
+        :return: Krotka (lista cech, mapa wariancji Laplasjanu o wymiarach grid).
+        """
+        return self._extract(image, grid)
+
+    def _extract(self, image, grid):
+        if image.ndim == 3:
+            image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            image_gray = image
+        laplacian, gradient_x, gradient_y, edges = self._buffers(image_gray.shape)
+
+        cv2.Laplacian(image_gray, cv2.CV_32F, dst=laplacian)
+        _, laplacian_std = cv2.meanStdDev(laplacian)
+        laplacian_var = float(laplacian_std[0, 0]) ** 2
+        # Bufor gradientu jest jeszcze wolny, więc służy za miejsce na kwadraty Laplasjanu
+        tile_map = tile_variances(laplacian, grid, scratch=gradient_x) if grid else None
+
+        cv2.Sobel(image_gray, cv2.CV_32F, 1, 0, dst=gradient_x, ksize=5)
+        cv2.Sobel(image_gray, cv2.CV_32F, 0, 1, dst=gradient_y, ksize=5)
+        cv2.magnitude(gradient_x, gradient_y, magnitude=gradient_x)
+        gradient_mean = cv2.mean(gradient_x)[0]
+
+        # Canny zwraca 0 lub 255, więc suma pikseli to 255 * liczba krawędzi
+        cv2.Canny(image_gray, 100, 200, edges=edges)
+        edge_hist = 255.0 * cv2.countNonZero(edges) / (image_gray.shape[0] * image_gray.shape[1])
+
+        return [laplacian_var, gradient_mean, edge_hist], tile_map
+
+
+def tile_variances(laplacian, grid, scratch=None):
+    """
+    Liczy wariancję Laplasjanu osobno w każdym kafelku siatki.
+
+    Wszystkie kafelki są liczone naraz: średnie wartości i średnie kwadraty daje jedno
+    zmniejszenie INTER_AREA do rozmiaru siatki (OpenCV dzieli je między wątki).
+    Brzegi obrazu, które nie mieszczą się w pełnych kafelkach, są pomijane.
+
+    :param laplacian: Laplasjan obrazu (tablica NumPy float32).
+    :param grid: Liczba kafelków (wiersze, kolumny).
+    :param scratch: Opcjonalny bufor float32 tego samego rozmiaru na kwadraty wartości.
+    :return: Tablica float64 o wymiarach grid z wariancją w każdym kafelku.
+    """
+    rows, cols = grid
+    tile_height = laplacian.shape[0] // rows
+    tile_width = laplacian.shape[1] // cols
+    if tile_height == 0 or tile_width == 0:
+        raise ValueError(f"Obraz {laplacian.shape[1]}x{laplacian.shape[0]} jest za mały na siatkę {rows}x{cols}")
+
+    region = laplacian[:tile_height * rows, :tile_width * cols]
+    if scratch is not None:
+        squares = cv2.multiply(region, region, dst=scratch[:tile_height * rows, :tile_width * cols])
+    else:
+        squares = cv2.multiply(region, region)
+    means = cv2.resize(region, (cols, rows), interpolation=cv2.INTER_AREA).astype(np.float64)
+    mean_squares = cv2.resize(squares, (cols, rows), interpolation=cv2.INTER_AREA).astype(np.float64)
+    return np.maximum(mean_squares - means ** 2, 0.0)
+
+
+def top_k_mean(tile_map, k):
+    """
+    Średnia z k najostrzejszych kafelków - miara ostrości obiektu, na który ustawiono ostrość.
+
+    :param tile_map: Mapa wariancji Laplasjanu kafelków.
+    :param k: Liczba uwzględnianych kafelków.
+    :return: Średnia wariancja k najostrzejszych kafelków.
+    """
+    values = np.sort(tile_map, axis=None)
+    return float(values[-min(k, values.size):].mean())
+
+
+def laplacian_map(image_gray, grid):
+    """
+    Liczy mapę ostrości kafelków (wariancja Laplasjanu) dla obrazu w skali szarości.
+
+    :param image_gray: Obraz w skali szarości (tablica NumPy uint8).
+    :param grid: Liczba kafelków (wiersze, kolumny).
+    :return: Tablica o wymiarach grid z wariancją Laplasjanu w każdym kafelku.
+    """
+    return tile_variances(cv2.Laplacian(image_gray, cv2.CV_32F), grid)
+
+
+def laplacian_variance(image_gray):
+    """
+    Liczy samą wariancję Laplasjanu - najtańszą z cech ostrości.
+
+    :param image_gray: Obraz w skali szarości (tablica NumPy uint8).
+    :return: Wariancja Laplasjanu.
+    """
+    _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(image_gray, cv2.CV_32F))
+    return float(laplacian_std[0, 0]) ** 2
+
+
+_local = threading.local()
+
+
+def extract_features(image):
+    """
+    Wyodrębnia cechy ostrości, używając buforów przypisanych do bieżącego wątku.
+
+    :param image: Obraz BGR lub w skali szarości (tablica NumPy uint8).
+    :return: Lista [wariancja Laplasjanu, średnia wartość gradientu, gęstość krawędzi].
+    """
+    return _extractor().extract(image)
+
+
+def extract_features_with_tiles(image, grid):
+    """
+    Wyodrębnia cechy ostrości i mapę ostrości kafelków, używając buforów bieżącego wątku.
+
+    :param image: Obraz BGR lub w skali szarości (tablica NumPy uint8).
+    :param grid: Liczba kafelków (wiersze, kolumny).
+    :return: Krotka (lista cech, mapa wariancji Laplasjanu o wymiarach grid).
+    """
+    return _extractor().extract_with_tiles(image, grid)
+
+
+def _extractor():
+    extractor = getattr(_local, 'extractor', None)
+    if extractor is None:
+        extractor = _local.extractor = FeatureExtractor()
+    return extractor
+
+
+def reference_features(image):
+    """
+    Pierwotna implementacja cech w float64 - punkt odniesienia dla testu zgodności i pomiarów.
+
+    :param image: Obraz BGR lub w skali szarości (tablica NumPy uint8).
+    :return: Lista [wariancja Laplasjanu, średnia wartość gradientu, gęstość krawędzi].
+    """
+    image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    laplacian_var = cv2.Laplacian(image_gray, cv2.CV_64F).var()
+    gradient_x = cv2.Sobel(image_gray, cv2.CV_64F, 1, 0, ksize=5)
+    gradient_y = cv2.Sobel(image_gray, cv2.CV_64F, 0, 1, ksize=5)
+    gradient_magnitude = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
+    gradient_mean = np.mean(gradient_magnitude)
+    edges = cv2.Canny(image_gray, 100, 200)
+    edge_hist = np.sum(edges) / (image_gray.shape[0] * image_gray.shape[1])
+    return [laplacian_var, gradient_mean, edge_hist]
+
+
+def _measure(function, image, repeats):
+    function(image)  # Rozgrzewka (i przydział buforów wielokrotnego użytku)
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function(image)
+    elapsed = (time.perf_counter() - start) / repeats
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Porównanie cech ostrości float32 z implementacją float64.")
+    parser.add_argument("image", nargs="?", help="Zdjęcie testowe (domyślnie syntetyczne 24 MP)")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.image:
+        test_image = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+        if test_image is None:
+            raise SystemExit(f"Nie udało się wczytać obrazu: {args.image}")
+    else:
+        rng = np.random.default_rng(0)
+        test_image = cv2.GaussianBlur(rng.integers(0, 256, (4000, 6000), dtype=np.uint8), (0, 0), 2)
+
+    expected, reference_time, reference_peak = _measure(reference_features, test_image, args.repeats)
+    actual, fused_time, fused_peak = _measure(extract_features, test_image, args.repeats)
+
+    print(f"Obraz: {test_image.shape[1]}x{test_image.shape[0]}")
+    print(f"float64: {reference_time * 1000:.1f} ms/obraz, szczyt pamięci {reference_peak / 2 ** 20:.1f} MB")
+    buffers = sum(b.nbytes for b in _local.extractor._buffers(test_image.shape))
+    print(f"float32: {fused_time * 1000:.1f} ms/obraz, szczyt pamięci {fused_peak / 2 ** 20:.1f} MB "
+          f"+ stałe bufory {buffers / 2 ** 20:.1f} MB")
+    print(f"Przyspieszenie: {reference_time / fused_time:.2f}x")
+    for name, a, b in zip(("laplacian_var", "gradient_mean", "edge_hist"), expected, actual):
+        print(f"{name}: {a:.6f} / {b:.6f} (różnica względna {abs(a - b) / max(abs(a), 1e-12):.2e})")
@@ -0,0 +1,167 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+# Plik z miniaturami wszystkich przeglądanych folderów
+THUMBNAIL_STORE_PATH = os.path.join(os.path.expanduser("~"), ".reflectionview", "thumbnails.sqlite")
+
+# Limit rozmiaru zapisanych miniatur (w bajtach); po jego przekroczeniu usuwane są najdawniej używane
+THUMBNAIL_STORE_MAX_BYTES = 512 * 2 ** 20
+
+# Zapisywane rozmiary miniatur (dłuższy bok w pikselach); mniejsze miniatury są zmniejszane z najbliższej większej
+THUMBNAIL_SIZES = (128, 256, 512)
+
+# Odstęp (w sekundach), po którym odczyt miniatury odświeża czas jej użycia - odczyty zwykle nic nie zapisują
+TOUCH_INTERVAL = 3600
+
+# Wersja układu tabeli - pliki zapisane w starszym układzie są zakładane od nowa
+SCHEMA_VERSION = 1
+
+
+def thumbnail_edge(size):
+    """
+    Dobiera zapisywany rozmiar miniatury dla żądanego rozmiaru.
+
+    :param size: Żądany rozmiar miniatury (szerokość, wysokość).
+    :return: Najmniejszy z THUMBNAIL_SIZES, który go pokrywa (albo największy z nich).
+    """
+    longest = max(size)
+    for edge in THUMBNAIL_SIZES:
+        if edge >= longest:
+            return edge
+    return THUMBNAIL_SIZES[-1]
+
+
+class ThumbnailStore:
+    """
+    Trwała pamięć podręczna miniatur (zakodowanych jako JPEG) w jednej bazie SQLite.
+
+    Wpis jest ważny, dopóki zgadzają się rozmiar i czas modyfikacji pliku. Gdy suma rozmiarów
+    miniatur przekracza limit, usuwane są najdawniej używane. Obiekt można używać z wielu wątków.
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path=THUMBNAIL_STORE_PATH, max_bytes=THUMBNAIL_STORE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL - odczyty nie czekają na zapisy, a zatwierdzenie nie wymusza zapisu na dysk za każdym razem
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS thumbnails")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            " path TEXT NOT NULL,"
+            " edge INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " last_used INTEGER NOT NULL,"
+            " data BLOB NOT NULL,"
+            " PRIMARY KEY (path, edge))"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS thumbnails_last_used ON thumbnails (last_used)")
+        self.connection.commit()
+        self._bytes = self.connection.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM thumbnails").fetchone()[0]
+
+    @classmethod
+    def open(cls, path=THUMBNAIL_STORE_PATH, max_bytes=THUMBNAIL_STORE_MAX_BYTES):
+        """
+        Otwiera pamięć podręczną miniatur. Zwraca None, jeżeli nie da się jej utworzyć
+        (np. katalog domowy jest tylko do odczytu) - miniatury są wtedy tylko generowane.
+
+        :param path: Ścieżka pliku bazy.
+        :param max_bytes: Limit rozmiaru zapisanych miniatur.
+        :return: Obiekt ThumbnailStore lub None.
+        """
+        try:
+            return cls(path, max_bytes)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning(f"Nie można otworzyć pamięci podręcznej miniatur {path}: {e}")
+            return None
+
+    @classmethod
+    def shared(cls):
+        """
+        Zwraca wspólną pamięć podręczną miniatur aplikacji (otwieraną przy pierwszym użyciu).
+
+        :return: Obiekt ThumbnailStore lub None.
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.open() or False
+            return cls._shared or None
+
+    def get(self, image_path, size, mtime_ns, edge):
+        """
+        Zwraca zapisaną miniaturę, jeżeli plik się nie zmienił.
+
+        :param image_path: Ścieżka do pliku graficznego.
+        :param size: Rozmiar pliku w bajtach.
+        :param mtime_ns: Czas modyfikacji pliku w nanosekundach.
+        :param edge: Rozmiar miniatury (jeden z THUMBNAIL_SIZES).
+        :return: Dane JPEG miniatury lub None.
+        """
+        try:
+            with self._lock:
+                row = self.connection.execute(
+                    "SELECT data, last_used FROM thumbnails WHERE path = ? AND edge = ? AND size = ? AND mtime_ns = ?",
+                    (image_path, edge, size, mtime_ns)
+                ).fetchone()
+                if row is None:
+                    return None
+                now = int(time.time())
+                if now - row[1] > TOUCH_INTERVAL:
+                    self.connection.execute("UPDATE thumbnails SET last_used = ? WHERE path = ? AND edge = ?",
+                                            (now, image_path, edge))
+                    self.connection.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            logging.warning(f"Nie udało się odczytać miniatury {image_path}: {e}")
+            return None
+
+    def put(self, image_path, size, mtime_ns, edge, data):
+        """
+        Zapisuje miniaturę (zastępując poprzednią wersję) i w razie potrzeby usuwa najdawniej używane.
+
+        :param image_path: Ścieżka do pliku graficznego.
+        :param size: Rozmiar pliku w bajtach.
+        :param mtime_ns: Czas modyfikacji pliku w nanosekundach.
+        :param edge: Rozmiar miniatury (jeden z THUMBNAIL_SIZES).
+        :param data: Dane JPEG miniatury.
+        """
+        try:
+            with self._lock:
+                old = self.connection.execute("SELECT LENGTH(data) FROM thumbnails WHERE path = ? AND edge = ?",
+                                              (image_path, edge)).fetchone()
+                self.connection.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?)",
+                                        (image_path, edge, size, mtime_ns, int(time.time()), data))
+                self._bytes += len(data) - (old[0] if old else 0)
+                if self._bytes > self.max_bytes:
+                    self._evict()
+                self.connection.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Nie udało się zapisać miniatury {image_path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _evict(self):
+        # Usuwamy z zapasem (do 90% limitu), żeby nie sprzątać przy każdym kolejnym zapisie
+        target = self.max_bytes * 0.9
+        rows = self.connection.execute("SELECT path, edge, LENGTH(data) FROM thumbnails ORDER BY last_used")
+        evicted = []
+        for path, edge, length in rows:
+            if self._bytes <= target:
+                break
+            evicted.append((path, edge))
+            self._bytes -= length
+        self.connection.executemany("DELETE FROM thumbnails WHERE path = ? AND edge = ?", evicted)
@@ -1,56 +1,282 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
 import cv2
 import numpy as np
-import os
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.metrics import accuracy_score
-import joblib  # Do zapisu i wczytania modelu
-
-# Funkcja używana do wykrycia cech na zdjęciach
-def extract_features(image):
-    image_gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    laplacian_var = cv2.Laplacian(image_gray, cv2.CV_64F).var()
-    gradient_x = cv2.Sobel(image_gray, cv2.CV_64F, 1, 0, ksize=5)
-    gradient_y = cv2.Sobel(image_gray, cv2.CV_64F, 0, 1, ksize=5)
-    gradient_magnitude = np.sqrt(gradient_x ** 2 + gradient_y ** 2)
-    gradient_mean = np.mean(gradient_magnitude)
-    edges = cv2.Canny(image_gray, 100, 200)
-    edge_hist = np.sum(edges) / (image_gray.shape[0] * image_gray.shape[1])
-    return [laplacian_var, gradient_mean, edge_hist]
-
-# Ścieżki do folderów z ostrymi i nieostrymi zdjęciami
-sharp_images_dir = "D:/MAGISTERKA - TEST/szybki test - podzial/sharp"
-blurry_images_dir = "D:/MAGISTERKA - TEST/szybki test - podzial/blur"
-
-features = []
-labels = []
-
-# Ekstrakcja cech dla ostrych obrazów
-for filename in os.listdir(sharp_images_dir):
-    image_path = os.path.join(sharp_images_dir, filename)
-    image = cv2.imread(image_path)
-    if image is not None:
-        features.append(extract_features(image))
-        labels.append(0)  # 0 oznacza ostre
-
-# Ekstrakcja cech dla rozmytych obrazów
-for filename in os.listdir(blurry_images_dir):
-    image_path = os.path.join(blurry_images_dir, filename)
-    image = cv2.imread(image_path)
-    if image is not None:
-        features.append(extract_features(image))
-        labels.append(1)  # 1 oznacza rozmyte
-
-# Podział danych na zestaw treningowy i testowy
-X_train, X_test, y_train, y_test = train_test_split(features, labels, test_size=0.2, random_state=42)
-
-# Trening klasyfikatora
-clf = RandomForestClassifier(n_estimators=100, random_state=42)
-clf.fit(X_train, y_train)
-
-# Ocena modelu
-y_pred = clf.predict(X_test)
-print(f"Dokładność modelu: {accuracy_score(y_test, y_pred) * 100:.2f}%")
-
-# Zapisanie modelu
-joblib.dump(clf, 'sharpness_classifier.pkl')
+from Utils.blur import BlurInspector, IMAGE_EXTENSIONS, ANALYSIS_SCALES, MODEL_PATH
+from Utils.forest_model import export_forest, verify_equivalence, ForestModel
+
+# Etykiety klas klasyfikatora
+SHARP_LABEL = 0
+BLURRY_LABEL = 1
+
+# Domyślny plik z cechami zdjęć treningowych
+DATASET_PATH = "sharpness_dataset.npz"
+
+# Wersja układu pliku z cechami - starszy plik jest liczony od nowa
+DATASET_VERSION = 1
+
+
+class FeatureDataset:
+    """
+    Cechy ostrości zdjęć treningowych zapisane w pliku .npz, indeksowane skrótem zawartości pliku.
+
+    Dzięki skrótom dodanie nowych zdjęć do zbioru wymaga analizy tylko tych zdjęć, a przeniesienie
+    lub zmiana nazwy pliku nie powoduje ponownej analizy. Skróty niezmienionych plików (ta sama
+    ścieżka, rozmiar i czas modyfikacji) nie są liczone ponownie.
+    """
+
+    def __init__(self, path, feature_version):
+        self.path = path
+        self.feature_version = feature_version
+        self.features = {}  # {skrót pliku: cechy}
+        self.hashes = {}  # {ścieżka: (rozmiar, mtime_ns, skrót pliku)}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                if int(data['dataset_version']) != DATASET_VERSION or str(data['feature_version']) != self.feature_version:
+                    logging.info(f"Plik {self.path} zawiera cechy innej wersji - zostaną policzone od nowa.")
+                    return
+                self.features = dict(zip(data['feature_hashes'].tolist(), data['features']))
+                self.hashes = {
+                    path: (int(size), int(mtime_ns), file_hash)
+                    for path, size, mtime_ns, file_hash
+                    in zip(data['paths'].tolist(), data['sizes'], data['mtimes'], data['path_hashes'].tolist())
+                }
+        except (OSError, KeyError, ValueError) as e:
+            logging.warning(f"Nie można wczytać pliku z cechami {self.path}: {e}")
+
+    def save(self):
+        """
+        Zapisuje zbiór cech. Plik jest podmieniany dopiero po pełnym zapisie.
+        """
+        paths = list(self.hashes)
+        feature_hashes = list(self.features)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, 'wb') as f:
+            np.savez(
+                f,
+                dataset_version=DATASET_VERSION,
+                feature_version=self.feature_version,
+                paths=np.array(paths, dtype=str),
+                sizes=np.array([self.hashes[p][0] for p in paths], dtype=np.int64),
+                mtimes=np.array([self.hashes[p][1] for p in paths], dtype=np.int64),
+                path_hashes=np.array([self.hashes[p][2] for p in paths], dtype=str),
+                feature_hashes=np.array(feature_hashes, dtype=str),
+                features=np.array([self.features[h] for h in feature_hashes], dtype=np.float64).reshape(-1, 3),
+            )
+        os.replace(temporary_path, self.path)
+
+    def file_hash(self, path):
+        """
+        Zwraca skrót SHA-1 zawartości pliku, korzystając z zapamiętanego skrótu, jeśli plik się nie zmienił.
+
+        :param path: Ścieżka do pliku.
+        :return: Skrót pliku (tekst szesnastkowy).
+        """
+        stat = os.stat(path)
+        known = self.hashes.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        file_hash = _hash_file(path)
+        self.hashes[path] = (stat.st_size, stat.st_mtime_ns, file_hash)
+        return file_hash
+
+
+def list_labelled_files(sharp_dir, blurry_dir):
+    """
+    Zwraca listę zdjęć treningowych z etykietami.
+
+    :param sharp_dir: Folder z ostrymi zdjęciami.
+    :param blurry_dir: Folder z rozmytymi zdjęciami.
+    :return: Lista krotek (ścieżka bezwzględna, etykieta).
+    """
+    files = []
+    for directory, label in ((sharp_dir, SHARP_LABEL), (blurry_dir, BLURRY_LABEL)):
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                files.append((os.path.abspath(os.path.join(directory, file_name)), label))
+    return files
+
+
+def build_dataset(sharp_dir, blurry_dir, dataset_path=DATASET_PATH, workers=None, scale=1):
+    """
+    Buduje macierz cech i etykiet, analizując tylko zdjęcia, których nie ma jeszcze w pliku z cechami.
+
+    Cechy są liczone tak samo jak w BlurInspector z tymi samymi ustawieniami, w puli procesów.
+
+    :param sharp_dir: Folder z ostrymi zdjęciami.
+    :param blurry_dir: Folder z rozmytymi zdjęciami.
+    :param dataset_path: Plik .npz z zapamiętanymi cechami.
+    :param workers: Liczba procesów roboczych (domyślnie liczba rdzeni).
+    :param scale: Dzielnik rozdzielczości analizy.
+    :return: Krotka (macierz cech X, wektor etykiet y, wersja cech).
+    """
+    feature_version = BlurInspector(None, scale=scale).feature_version()
+    dataset = FeatureDataset(dataset_path, feature_version)
+    files = list_labelled_files(sharp_dir, blurry_dir)
+    workers = workers or os.cpu_count() or 1
+
+    # Czytanie plików do skrótów zwalnia GIL, więc wystarczą wątki
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        file_hashes = list(executor.map(dataset.file_hash, [path for path, _ in files]))
+
+    missing = {}
+    for (path, _), file_hash in zip(files, file_hashes):
+        if file_hash not in dataset.features:
+            missing.setdefault(file_hash, path)
+    logging.info(f"Zdjęć treningowych: {len(files)}, do analizy: {len(missing)}.")
+
+    if missing:
+        start = time.perf_counter()
+        paths = list(missing.values())
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                    initargs=(scale,)) as executor:
+            chunk_size = max(1, min(32, len(paths) // (workers * 4)))
+            for file_hash, features in zip(missing, executor.map(_extract, paths, chunksize=chunk_size)):
+                if features is not None:
+                    dataset.features[file_hash] = features
+        logging.info(f"Analiza {len(paths)} zdjęć: {time.perf_counter() - start:.1f} s.")
+    dataset.save()
+
+    X, y = [], []
+    for (path, label), file_hash in zip(files, file_hashes):
+        features = dataset.features.get(file_hash)
+        if features is None:
+            logging.warning(f"Pominięto zdjęcie, którego nie udało się przeanalizować: {path}")
+            continue
+        X.append(features)
+        y.append(label)
+    return np.array(X, dtype=np.float64).reshape(-1, 3), np.array(y), feature_version
+
+
+def train_classifier(X, y, n_estimators=100, n_jobs=-1, random_state=42):
+    """
+    Trenuje las losowy na całym zbiorze.
+
+    :param X: Macierz cech.
+    :param y: Wektor etykiet.
+    :param n_estimators: Liczba drzew.
+    :param n_jobs: Liczba wątków scikit-learn (-1 = wszystkie rdzenie).
+    :param random_state: Ziarno losowości.
+    :return: Wytrenowany RandomForestClassifier.
+    """
+    clf = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs, random_state=random_state)
+    clf.fit(X, y)
+    return clf
+
+
+def cross_validate(X, y, folds=5, n_estimators=100, n_jobs=-1, random_state=42):
+    """
+    Ocenia klasyfikator walidacją krzyżową; foldy są trenowane równolegle.
+
+    :param X: Macierz cech.
+    :param y: Wektor etykiet.
+    :param folds: Liczba foldów.
+    :param n_estimators: Liczba drzew.
+    :param n_jobs: Liczba równolegle trenowanych foldów (-1 = wszystkie rdzenie).
+    :param random_state: Ziarno losowości.
+    :return: Tablica dokładności dla każdego foldu.
+    """
+    clf = RandomForestClassifier(n_estimators=n_estimators, random_state=random_state)
+    return cross_val_score(clf, X, y, cv=folds, scoring='accuracy', n_jobs=n_jobs)
+
+
+def save_model(clf, output_dir, metadata):
+    """
+    Zapisuje model jako wersjonowany plik .npz (sharpness_classifier-RRRRMMDD-GGMMSS.npz)
+    razem z opisem treningu w pliku .json o tej samej nazwie.
+
+    :param clf: Wytrenowany klasyfikator.
+    :param output_dir: Folder na pliki modelu.
+    :param metadata: Słownik z opisem treningu (wersja cech, liczba zdjęć, dokładność).
+    :return: Ścieżka do zapisanego pliku .npz.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"sharpness_classifier-{time.strftime('%Y%m%d-%H%M%S')}"
+    path = os.path.join(output_dir, name + ".npz")
+    export_forest(clf, path)
+    with open(path, 'rb') as f:
+        metadata = dict(metadata, model_version=hashlib.sha1(f.read()).hexdigest())
+    with open(os.path.join(output_dir, name + ".json"), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def _hash_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_worker_inspector = None
+
+
+def _init_worker(scale):
+    global _worker_inspector
+    cv2.setNumThreads(1)  # Równoległość zapewniają procesy
+    _worker_inspector = BlurInspector(None, workers=1, scale=scale)
+
+
+def _extract(path):
+    return _worker_inspector.file_features(path)[0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Trening klasyfikatora ostrości zdjęć.")
+    parser.add_argument("sharp_dir", help="Folder z ostrymi zdjęciami")
+    parser.add_argument("blurry_dir", help="Folder z rozmytymi zdjęciami")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Plik .npz z zapamiętanymi cechami")
+    parser.add_argument("--output-dir", default="models", help="Folder na wersjonowane pliki modelu")
+    parser.add_argument("--workers", type=int, default=None, help="Liczba procesów analizy zdjęć")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Liczba wątków treningu i walidacji")
+    parser.add_argument("--trees", type=int, default=100, help="Liczba drzew w lesie")
+    parser.add_argument("--cv", type=int, default=0, metavar="FOLDS", help="Walidacja krzyżowa z podaną liczbą foldów")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Część zdjęć odłożona do oceny modelu")
+    parser.add_argument("--scale", type=int, default=1, choices=sorted(ANALYSIS_SCALES))
+    parser.add_argument("--install", action="store_true", help=f"Skopiuj model do {MODEL_PATH}")
+    args = parser.parse_args()
+
+    X, y, feature_version = build_dataset(args.sharp_dir, args.blurry_dir, args.dataset, args.workers, args.scale)
+    if len(set(y)) < 2:
+        raise SystemExit("Potrzebne są zdjęcia obu klas.")
+
+    metadata = {'feature_version': feature_version, 'samples': int(len(y)), 'trees': args.trees}
+    if args.cv:
+        scores = cross_validate(X, y, args.cv, args.trees, args.n_jobs)
+        logging.info(f"Walidacja krzyżowa ({args.cv} foldów): {scores.mean() * 100:.2f}% ± {scores.std() * 100:.2f}%")
+        metadata['cv_accuracy'] = float(scores.mean())
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=args.test_size, random_state=42, stratify=y)
+    clf = train_classifier(X_train, y_train, args.trees, args.n_jobs)
+    accuracy = accuracy_score(y_test, clf.predict(X_test))
+    logging.info(f"Dokładność modelu: {accuracy * 100:.2f}%")
+    metadata['test_accuracy'] = float(accuracy)
+
+    # Model końcowy jest trenowany na wszystkich zdjęciach
+    clf = train_classifier(X, y, args.trees, args.n_jobs)
+    model_path = save_model(clf, args.output_dir, metadata)
+    difference = verify_equivalence(clf, ForestModel.load(model_path), X)
+    if difference > 1e-9:
+        raise SystemExit("Model NumPy nie jest zgodny z wytrenowanym klasyfikatorem.")
+    logging.info(f"Zapisano model: {model_path}")
+
+    if args.install:
+        shutil.copyfile(model_path, MODEL_PATH)
+        logging.info(f"Zainstalowano model w {MODEL_PATH}")